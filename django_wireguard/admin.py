@@ -1,21 +1,50 @@
 from django.contrib import admin
+from django.db.models import Count
+from django.template.defaultfilters import filesizeformat
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
+from django.utils.translation import ugettext_lazy as _
 
+from django_wireguard.export import export_response
 from django_wireguard.models import WireguardPeer, WireguardInterface
 from django_wireguard.forms import WireguardPeerForm
-
-
-class WireguardPeerInlineAdmin(admin.StackedInline):
-    model = WireguardPeer
-    show_change_link = True
-    extra = 1
+from django_wireguard.utils import clean_comma_separated_list
 
 
 @admin.register(WireguardInterface)
 class WireguardInterfaceAdmin(admin.ModelAdmin):
     model = WireguardInterface
-    list_display = ('name', 'address', 'listen_port', 'public_key')
-    inlines = [WireguardPeerInlineAdmin]
+    list_display = ('name', 'address', 'listen_port', 'public_key', 'peer_count')
+    search_fields = ('name',)
+    # peers are listed in their own paginated changelist, an inline would render one form per peer
+    readonly_fields = ('peer_summary', 'allowed_ips_summary')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(peer_count=Count('peers'))
+
+    def peer_count(self, obj):
+        return obj.peer_count
+    peer_count.short_description = _('Peers')
+    peer_count.admin_order_field = 'peer_count'
+
+    def peer_summary(self, obj):
+        if obj.pk is None:
+            return '-'
+        url = reverse('admin:django_wireguard_wireguardpeer_changelist')
+        pools = format_html_join(', ', '{} ({} of {} allocated)',
+                                 ((usage['network'], usage['allocated'], usage['size'])
+                                  for usage in obj.get_address_pool_usage()))
+        return format_html('<a href="{}?interface__id__exact={}">{}</a><br>{}',
+                           url, obj.pk, _('%(count)d peers') % {'count': obj.peer_count}, pools)
+    peer_summary.short_description = _('Peers')
+
+    def allowed_ips_summary(self, obj):
+        if obj.pk is None:
+            return '-'
+        return _('%(listed)d AllowedIPs entries listed by the peers, %(programmed)d programmed in the kernel once '
+                 'collapsed, %(saved)d saved.') % obj.get_allowed_ips_usage()
+    allowed_ips_summary.short_description = _('AllowedIPs')
 
 
 @admin.register(WireguardPeer)
@@ -23,9 +52,67 @@ class WireguardPeerAdmin(admin.ModelAdmin):
     model = WireguardPeer
     form = WireguardPeerForm
     change_form_template = 'django_wireguard/wireguardpeer_change_form.html'
-    list_display = ('name', 'address', 'public_key')
-    list_filter = ()
+    list_display = ('name', 'interface', 'address', 'public_key', 'last_handshake')
+    list_select_related = ('interface', 'status')
+    list_filter = ('interface',)
+    # matched with indexed lookups only, see WireguardPeerQuerySet.search
+    search_fields = ('name', 'address', 'public_key')
+    ordering = ('interface', 'name')
+    show_full_result_count = False
+    autocomplete_fields = ('interface',)
+    readonly_fields = ('endpoint', 'last_handshake', 'transfer', 'kernel_allowed_ips')
+    actions = ('export_configs_zip', 'export_configs_tar')
+
+    def get_search_results(self, request, queryset, search_term):
+        return queryset.search(search_term), False
+
+    def render_change_form(self, request, context, add=False, change=False, form_url='', obj=None):
+        # rendered once for both the download link and the text area
+        context['config'] = obj and obj.get_config()
+        return super().render_change_form(request, context, add, change, form_url, obj)
 
     def config(self, obj):
         return mark_safe(f'<pre>{obj.get_config()}</pre>')
     config.short_description = 'Config'
+
+    def export_configs_zip(self, request, queryset):
+        return export_response(queryset, 'zip')
+    export_configs_zip.short_description = _('Download configurations (ZIP)')
+    # the configurations hold private keys
+    export_configs_zip.allowed_permissions = ('change',)
+
+    def export_configs_tar(self, request, queryset):
+        return export_response(queryset, 'tar.gz')
+    export_configs_tar.short_description = _('Download configurations (tar.gz)')
+    export_configs_tar.allowed_permissions = ('change',)
+
+    def kernel_allowed_ips(self, obj):
+        try:
+            allowed_ips = obj.get_interface_allowed_ips()
+        except ValueError:
+            return '-'
+        listed = len(clean_comma_separated_list(obj.interface_allowed_ips)) + bool(obj.address)
+        return _('%(allowed_ips)s (%(listed)d entries collapsed to %(programmed)d)') % {
+            'allowed_ips': ', '.join(allowed_ips) or '-',
+            'listed': listed,
+            'programmed': len(allowed_ips),
+        }
+    kernel_allowed_ips.short_description = _('Kernel AllowedIPs')
+
+    def endpoint(self, obj):
+        status = obj.get_status()
+        return status and status.endpoint
+    endpoint.short_description = _('Endpoint')
+
+    def last_handshake(self, obj):
+        status = obj.get_status()
+        return status and status.last_handshake
+    last_handshake.short_description = _('Last Handshake')
+
+    def transfer(self, obj):
+        status = obj.get_status()
+        if status is None:
+            return None
+        return _('%(rx)s received, %(tx)s sent') % {'rx': filesizeformat(status.rx_bytes),
+                                                      'tx': filesizeformat(status.tx_bytes)}
+    transfer.short_description = _('Transfer')
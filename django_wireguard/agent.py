@@ -0,0 +1,55 @@
+"""
+Kernel agent for controller mode, see ``manage.py wg_agent``.
+
+Processes running with ``WIREGUARD_MODE = 'controller'`` bump the revision of the interfaces their
+committed changes affect. The agent runs on the WireGuard host, polls the revisions and reconciles the
+interfaces whose revision changed since its last pass.
+"""
+import logging
+import time
+from typing import Dict, List, Optional
+
+from django.db import DEFAULT_DB_ALIAS
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardInterface
+from django_wireguard.sync_wg import reconcile_interfaces
+
+logger = logging.getLogger(__name__)
+
+
+class Agent:
+    def __init__(self, using: str = DEFAULT_DB_ALIAS,
+                 full_sync_interval: Optional[float] = None):
+        """
+        :param full_sync_interval: seconds between reconciliations of every interface,
+                                   defaults to ``WIREGUARD_AGENT_FULL_SYNC_INTERVAL``.
+        """
+        self.using = using
+        if full_sync_interval is None:
+            full_sync_interval = settings.WIREGUARD_AGENT_FULL_SYNC_INTERVAL
+        self.full_sync_interval = full_sync_interval
+        # revision of each interface as of its last reconciliation
+        self.revisions: Dict[str, int] = {}
+        self.last_full_sync: Optional[float] = None
+
+    def poll(self) -> List[str]:
+        """
+        Reconcile the interfaces whose revision changed, or all of them when a full sync is due.
+
+        :return: names of the reconciled interfaces.
+        """
+        # revisions are read first: bumps made while reconciling are seen by the next poll
+        revisions = dict(WireguardInterface.objects.using(self.using).values_list('name', 'revision'))
+        full = self.last_full_sync is None or time.monotonic() - self.last_full_sync >= self.full_sync_interval
+        if full:
+            changed = list(revisions)
+            self.last_full_sync = time.monotonic()
+        else:
+            changed = [name for name, revision in revisions.items() if self.revisions.get(name) != revision]
+
+        if changed:
+            reconcile_interfaces(WireguardInterface.objects.using(self.using).filter(name__in=changed))
+            logger.info("Reconciled %s.", ', '.join(changed))
+        self.revisions = revisions
+        return changed
@@ -1,6 +1,5 @@
 
 from django.apps import AppConfig
-from django.db import OperationalError
 
 
 class DjangoWireguardConfig(AppConfig):
@@ -8,12 +7,8 @@ class DjangoWireguardConfig(AppConfig):
     verbose_name = "Django WireGuard"
 
     def ready(self):
-        # noinspection PyUnresolvedReferences
-        from django_wireguard.sync_wg import sync_wireguard_interfaces
-        try:
-            sync_wireguard_interfaces()
-        except OperationalError:
-            pass
+        from django_wireguard.startup import startup_sync
+        startup_sync()
 
 
 class DjangoWireguardWagtailConfig(AppConfig):
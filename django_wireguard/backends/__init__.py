@@ -0,0 +1,103 @@
+"""
+WireGuard device backends.
+
+:class:`~django_wireguard.wireguard.WireGuard` handles delegate every device operation to the backend
+selected by ``WIREGUARD_BACKEND``:
+
+* :class:`django_wireguard.backends.netlink.NetlinkBackend`, the default, programs the kernel module
+  through pyroute2 and needs ``CAP_NET_ADMIN``;
+* :class:`django_wireguard.backends.memory.MemoryBackend` keeps devices in process memory with the
+  same semantics, for tests and benchmarks.
+
+Backends report failures with :class:`~django_wireguard.wireguard.BackendError`, carrying the errno
+the kernel would have returned, e.g. ``ENODEV`` for a missing device.
+"""
+import threading
+from typing import List, Optional
+
+from django.utils.module_loading import import_string
+
+from django_wireguard import settings
+
+
+class BaseBackend:
+    def link_lookup(self, interface_name: str) -> Optional[int]:
+        """Index of the device named ``interface_name``, None if it does not exist."""
+        raise NotImplementedError
+
+    def link_create(self, interface_name: str):
+        raise NotImplementedError
+
+    def link_delete(self, interface_index: int):
+        raise NotImplementedError
+
+    def get_addresses(self, interface_index: int) -> List[str]:
+        """Addresses of the device, as ``address/prefixlen`` strings."""
+        raise NotImplementedError
+
+    def add_address(self, interface_index: int, address: str, prefixlen: int):
+        raise NotImplementedError
+
+    def delete_address(self, interface_index: int, address: str, prefixlen: int):
+        raise NotImplementedError
+
+    def get_device(self, interface_name: str) -> dict:
+        """Device state, in the format returned by :meth:`WireGuard.dump`."""
+        raise NotImplementedError
+
+    def set_device(self, interface_name: str, private_key: Optional[str] = None,
+                   listen_port: Optional[int] = None, fwmark: Optional[int] = None):
+        """Update the device attributes that are not None."""
+        raise NotImplementedError
+
+    def set_peers(self, interface_name: str, peers: List[dict]):
+        """
+        Apply ``peers`` in a single request.
+
+        :param peers: peer dicts as accepted by :meth:`WireGuard.update_peers`.
+        """
+        raise NotImplementedError
+
+    def sync_config(self, interface_name: str, path: str):
+        """
+        Apply the ``wg(8)`` configuration file at ``path`` to the device as a whole, like ``wg syncconf``.
+
+        The default implementation diffs the file against :meth:`get_device` and sends the differences
+        through :meth:`set_device` and :meth:`set_peers`.
+        """
+        from django_wireguard.syncconf import apply_config, read_config
+
+        apply_config(self, interface_name, read_config(path))
+
+    def close(self):
+        """Release the sockets or other resources held by the backend, it may be used again afterwards."""
+
+
+_backend: Optional[BaseBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> BaseBackend:
+    """Backend instance shared by the whole process, built from ``WIREGUARD_BACKEND`` on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.WIREGUARD_BACKEND)()
+    return _backend
+
+
+def set_backend(backend: Optional[BaseBackend]):
+    """
+    Replace the process wide backend, dropping the cached device handles.
+
+    :param backend: the new backend, None to build it again from ``WIREGUARD_BACKEND``.
+    """
+    global _backend
+    from django_wireguard.wireguard import WireGuard
+
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    if previous is not None and previous is not backend:
+        previous.close()
+    WireGuard.invalidate()
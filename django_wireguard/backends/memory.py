@@ -0,0 +1,166 @@
+"""
+In-memory backend.
+
+Devices, addresses and peers live in process memory and follow the kernel semantics: an AllowedIP
+belongs to one peer per device and moves to whichever peer claims it last, ``update_only`` peers are
+never created and missing devices fail with ``ENODEV``. No privileges are needed and nothing reaches
+the network, so tests, benchmarks and load tests can run at any scale on a regular machine.
+Whole-device applies with :meth:`MemoryBackend.sync_config` are atomic.
+"""
+import errno
+import ipaddress
+import threading
+from typing import Dict, List, Optional
+
+from django_wireguard.backends import BaseBackend
+from django_wireguard.wireguard import BackendError
+
+
+class MemoryDevice:
+    __slots__ = ('name', 'index', 'private_key', 'listen_port', 'fwmark', 'addresses', 'peers', 'owners')
+
+    def __init__(self, name: str, index: int):
+        self.name = name
+        self.index = index
+        self.private_key: Optional[str] = None
+        self.listen_port: Optional[int] = None
+        self.fwmark: Optional[int] = None
+        self.addresses: List[str] = []
+        # public key -> peer state, in the format of WireGuard.dump
+        self.peers: Dict[str, dict] = {}
+        # allowed ip -> public key of the peer owning it
+        self.owners: Dict[str, str] = {}
+
+    def release_allowed_ips(self, state: dict):
+        for allowed_ip in state['allowed_ips']:
+            self.owners.pop(allowed_ip, None)
+        state['allowed_ips'] = []
+
+    def set_peer(self, peer: dict):
+        public_key = str(peer['public_key'])
+        state = self.peers.get(public_key)
+        if peer.get('remove'):
+            if state is not None:
+                self.release_allowed_ips(state)
+                del self.peers[public_key]
+            return
+        if state is None:
+            if peer.get('update_only'):
+                return
+            state = self.peers[public_key] = {
+                'public_key': public_key,
+                'allowed_ips': [],
+                'endpoint': None,
+                'persistent_keepalive': 0,
+                'last_handshake': 0,
+                'rx_bytes': 0,
+                'tx_bytes': 0,
+            }
+
+        if 'persistent_keepalive' in peer:
+            state['persistent_keepalive'] = peer['persistent_keepalive']
+        if 'endpoint_addr' in peer:
+            state['endpoint'] = f"{peer['endpoint_addr']}:{peer['endpoint_port']}"
+        if peer.get('replace_allowed_ips'):
+            self.release_allowed_ips(state)
+
+        for allowed_ip in peer.get('allowed_ips') or []:
+            allowed_ip = str(ipaddress.ip_interface(allowed_ip).network)
+            owner = self.owners.get(allowed_ip)
+            if owner == public_key:
+                continue
+            if owner is not None:
+                self.peers[owner]['allowed_ips'].remove(allowed_ip)
+            self.owners[allowed_ip] = public_key
+            state['allowed_ips'].append(allowed_ip)
+
+
+class MemoryBackend(BaseBackend):
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.devices: Dict[str, MemoryDevice] = {}
+        self.next_index = 1
+
+    def __get_device(self, interface_name: str) -> MemoryDevice:
+        device = self.devices.get(interface_name)
+        if device is None:
+            raise BackendError(errno.ENODEV, f"No such device {interface_name}")
+        return device
+
+    def __get_device_by_index(self, interface_index: int) -> MemoryDevice:
+        for device in self.devices.values():
+            if device.index == interface_index:
+                return device
+        raise BackendError(errno.ENODEV, f"No such device with index {interface_index}")
+
+    def link_lookup(self, interface_name: str) -> Optional[int]:
+        with self.lock:
+            device = self.devices.get(interface_name)
+            return device.index if device else None
+
+    def link_create(self, interface_name: str):
+        with self.lock:
+            if interface_name in self.devices:
+                raise BackendError(errno.EEXIST, f"Device {interface_name} exists")
+            # indexes are never reused, like the kernel's
+            self.devices[interface_name] = MemoryDevice(interface_name, self.next_index)
+            self.next_index += 1
+
+    def link_delete(self, interface_index: int):
+        with self.lock:
+            del self.devices[self.__get_device_by_index(interface_index).name]
+
+    def get_addresses(self, interface_index: int) -> List[str]:
+        with self.lock:
+            return list(self.__get_device_by_index(interface_index).addresses)
+
+    def add_address(self, interface_index: int, address: str, prefixlen: int):
+        with self.lock:
+            device = self.__get_device_by_index(interface_index)
+            address = f"{address}/{prefixlen}"
+            if address in device.addresses:
+                raise BackendError(errno.EEXIST, f"Address {address} exists")
+            device.addresses.append(address)
+
+    def delete_address(self, interface_index: int, address: str, prefixlen: int):
+        with self.lock:
+            device = self.__get_device_by_index(interface_index)
+            address = f"{address}/{prefixlen}"
+            if address not in device.addresses:
+                raise BackendError(errno.EADDRNOTAVAIL, f"Address {address} not found")
+            device.addresses.remove(address)
+
+    def get_device(self, interface_name: str) -> dict:
+        with self.lock:
+            device = self.__get_device(interface_name)
+            return {
+                'private_key': device.private_key,
+                'listen_port': device.listen_port,
+                'peers': {public_key: {**state, 'allowed_ips': list(state['allowed_ips'])}
+                          for public_key, state in device.peers.items()},
+            }
+
+    def set_device(self, interface_name: str, private_key: Optional[str] = None,
+                   listen_port: Optional[int] = None, fwmark: Optional[int] = None):
+        with self.lock:
+            device = self.__get_device(interface_name)
+            if private_key is not None:
+                device.private_key = private_key
+            if listen_port is not None:
+                device.listen_port = listen_port
+            if fwmark is not None:
+                device.fwmark = fwmark
+
+    def set_peers(self, interface_name: str, peers: List[dict]):
+        for peer in peers:
+            if 'public_key' not in peer:
+                raise ValueError("Peer Public key required")
+        with self.lock:
+            device = self.__get_device(interface_name)
+            for peer in peers:
+                device.set_peer(peer)
+
+    def sync_config(self, interface_name: str, path: str):
+        # nobody sees the device half way through
+        with self.lock:
+            super().sync_config(interface_name, path)
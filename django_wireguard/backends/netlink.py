@@ -0,0 +1,200 @@
+"""
+Kernel backend, talking to the WireGuard module over netlink through pyroute2.
+"""
+import ipaddress
+import threading
+from contextlib import contextmanager
+from socket import AF_INET, AF_INET6
+from typing import Dict, List, Optional, Union
+
+from pyroute2 import WireGuard as PyRouteWireGuard, IPRoute
+from pyroute2.netlink import NLM_F_REQUEST, NLM_F_ACK
+from pyroute2.netlink.exceptions import NetlinkError
+from pyroute2.netlink.generic.wireguard import wgmsg, WG_CMD_SET_DEVICE, WG_GENL_VERSION, \
+    WGPEER_F_REMOVE_ME, WGPEER_F_UPDATE_ONLY, WGPEER_F_REPLACE_ALLOWEDIPS
+
+from django_wireguard.backends import BaseBackend
+from django_wireguard.wireguard import BackendError
+
+
+def _decode_key(value: Union[str, bytes]) -> str:
+    if isinstance(value, bytes):
+        value = value.decode('ascii')
+    return value
+
+
+@contextmanager
+def _netlink_errors():
+    try:
+        yield
+    except NetlinkError as e:
+        raise BackendError(e.code, str(e)) from e
+
+
+class NetlinkBackend(BaseBackend):
+    """
+    Each thread opens its own sockets on first use, as concurrent requests on a shared netlink socket
+    would get each other's replies. Sockets of finished threads are closed when a new thread opens
+    its own, and every socket by :meth:`close`.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__sockets: Dict[threading.Thread, dict] = {}
+
+    def __thread_sockets(self) -> dict:
+        thread = threading.current_thread()
+        sockets = self.__sockets.get(thread)
+        if sockets is None:
+            with self.__lock:
+                for other in [other for other in self.__sockets if not other.is_alive()]:
+                    self.__close_sockets(self.__sockets.pop(other))
+                sockets = self.__sockets[thread] = {}
+        return sockets
+
+    @staticmethod
+    def __close_sockets(sockets: dict):
+        for socket in sockets.values():
+            socket.close()
+
+    @property
+    def wg(self) -> PyRouteWireGuard:
+        sockets = self.__thread_sockets()
+        if 'wg' not in sockets:
+            sockets['wg'] = PyRouteWireGuard()
+        return sockets['wg']
+
+    @property
+    def ipr(self) -> IPRoute:
+        sockets = self.__thread_sockets()
+        if 'ipr' not in sockets:
+            sockets['ipr'] = IPRoute()
+        return sockets['ipr']
+
+    def close(self):
+        with self.__lock:
+            sockets, self.__sockets = self.__sockets, {}
+        for thread_sockets in sockets.values():
+            self.__close_sockets(thread_sockets)
+
+    def link_lookup(self, interface_name: str) -> Optional[int]:
+        with _netlink_errors():
+            interface: list = self.ipr.link_lookup(ifname=interface_name)
+        if not interface:
+            return None
+        return interface[0]
+
+    def link_create(self, interface_name: str):
+        with _netlink_errors():
+            self.ipr.link('add', ifname=interface_name, kind='wireguard')
+
+    def link_delete(self, interface_index: int):
+        with _netlink_errors():
+            self.ipr.link('del', index=interface_index)
+
+    def get_addresses(self, interface_index: int) -> List[str]:
+        with _netlink_errors():
+            interface_data = self.ipr.get_addr(index=interface_index)
+        return list(map(
+            lambda i: dict(i['attrs'])['IFA_ADDRESS'] + '/' + str(i['prefixlen']),
+            interface_data
+        ))
+
+    def add_address(self, interface_index: int, address: str, prefixlen: int):
+        with _netlink_errors():
+            self.ipr.addr('add', interface_index, address=address, mask=prefixlen)
+
+    def delete_address(self, interface_index: int, address: str, prefixlen: int):
+        with _netlink_errors():
+            self.ipr.addr('del', interface_index, address=address, mask=prefixlen)
+
+    def get_device(self, interface_name: str) -> dict:
+        with _netlink_errors():
+            messages = list(self.wg.info(interface_name))
+
+        device = {'private_key': None, 'listen_port': None, 'peers': {}}
+        peers: Dict[str, dict] = device['peers']
+        for msg in messages:
+            private_key = msg.get_attr('WGDEVICE_A_PRIVATE_KEY')
+            if private_key:
+                device['private_key'] = _decode_key(private_key)
+            listen_port = msg.get_attr('WGDEVICE_A_LISTEN_PORT')
+            if listen_port is not None:
+                device['listen_port'] = listen_port
+
+            # peers with many AllowedIPs can span consecutive messages
+            for peer in msg.get_attr('WGDEVICE_A_PEERS') or []:
+                public_key = _decode_key(peer.get_attr('WGPEER_A_PUBLIC_KEY'))
+                state = peers.setdefault(public_key, {
+                    'public_key': public_key,
+                    'allowed_ips': [],
+                    'endpoint': None,
+                    'persistent_keepalive': 0,
+                    'last_handshake': 0,
+                    'rx_bytes': 0,
+                    'tx_bytes': 0,
+                })
+                endpoint = peer.get_attr('WGPEER_A_ENDPOINT')
+                if endpoint:
+                    state['endpoint'] = f"{endpoint['addr']}:{endpoint['port']}"
+                handshake = peer.get_attr('WGPEER_A_LAST_HANDSHAKE_TIME')
+                if handshake:
+                    state['last_handshake'] = handshake['tv_sec']
+                for key, attr in (('persistent_keepalive', 'WGPEER_A_PERSISTENT_KEEPALIVE_INTERVAL'),
+                                  ('rx_bytes', 'WGPEER_A_RX_BYTES'),
+                                  ('tx_bytes', 'WGPEER_A_TX_BYTES')):
+                    value = peer.get_attr(attr)
+                    if value is not None:
+                        state[key] = value
+                state['allowed_ips'].extend(allowed_ip['addr']
+                                            for allowed_ip in peer.get_attr('WGPEER_A_ALLOWEDIPS') or [])
+        return device
+
+    def set_device(self, interface_name: str, private_key: Optional[str] = None,
+                   listen_port: Optional[int] = None, fwmark: Optional[int] = None):
+        with _netlink_errors():
+            self.wg.set(interface_name, private_key=private_key, listen_port=listen_port, fwmark=fwmark)
+
+    def set_peers(self, interface_name: str, peers: List[dict]):
+        msg = wgmsg()
+        msg['cmd'] = WG_CMD_SET_DEVICE
+        msg['version'] = WG_GENL_VERSION
+        msg['attrs'].append(['WGDEVICE_A_IFNAME', interface_name])
+        msg['attrs'].append(['WGDEVICE_A_PEERS', [self.__peer_attrs(peer) for peer in peers]])
+        with _netlink_errors():
+            self.wg.nlm_request(msg, msg_type=self.wg.prid, msg_flags=NLM_F_REQUEST | NLM_F_ACK)
+
+    @staticmethod
+    def __peer_attrs(peer: dict) -> dict:
+        if 'public_key' not in peer:
+            raise ValueError("Peer Public key required")
+
+        attrs = [['WGPEER_A_PUBLIC_KEY', str(peer['public_key'])]]
+        if peer.get('remove'):
+            attrs.append(['WGPEER_A_FLAGS', WGPEER_F_REMOVE_ME])
+            return {'attrs': attrs}
+
+        flags = 0
+        if peer.get('update_only'):
+            flags |= WGPEER_F_UPDATE_ONLY
+        if peer.get('replace_allowed_ips'):
+            flags |= WGPEER_F_REPLACE_ALLOWEDIPS
+        attrs.append(['WGPEER_A_FLAGS', flags])
+
+        if 'preshared_key' in peer:
+            attrs.append(['WGPEER_A_PRESHARED_KEY', peer['preshared_key']])
+        if 'persistent_keepalive' in peer:
+            attrs.append(['WGPEER_A_PERSISTENT_KEEPALIVE_INTERVAL', peer['persistent_keepalive']])
+        if 'endpoint_addr' in peer:
+            attrs.append(['WGPEER_A_ENDPOINT', {'addr': peer['endpoint_addr'],
+                                                'port': peer['endpoint_port']}])
+
+        allowed_ips = []
+        for allowed_ip in peer.get('allowed_ips') or []:
+            network = ipaddress.ip_interface(allowed_ip)
+            family = AF_INET if network.version == 4 else AF_INET6
+            allowed_ips.append({'attrs': [['WGALLOWEDIP_A_FAMILY', family],
+                                          ['WGALLOWEDIP_A_IPADDR', network.ip.packed],
+                                          ['WGALLOWEDIP_A_CIDR_MASK', network.network.prefixlen]]})
+        attrs.append(['WGPEER_A_ALLOWEDIPS', allowed_ips])
+        return {'attrs': attrs}
@@ -0,0 +1,241 @@
+"""
+Benchmarks of the hot paths, see ``manage.py wg_benchmark``.
+
+Each benchmark is a function registered with :func:`benchmark`, taking an interface populated with
+``size`` peers. Everything before its ``return`` is setup. The returned callable is the timed part,
+run while counting queries, so the number of queries is reported next to the wall time, and the throughput
+for benchmarks processing a known number of items.
+Benchmarks run against the in-memory backend, so neither the kernel module nor privileges are needed.
+"""
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import RequestFactory
+
+from django_wireguard.backends import set_backend
+from django_wireguard.backends.memory import MemoryBackend
+from django_wireguard.models import WireguardInterface, WireguardPeer, WireguardPeerNetwork, WireguardPeerStatus, \
+    WireguardPeerTraffic
+from django_wireguard.sync_wg import sync_wireguard_interfaces
+from django_wireguard.utils import purge_private_keys
+
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+INTERFACE_NAME = 'wgbench'
+
+BENCHMARKS: Dict[str, 'Benchmark'] = {}
+
+
+class Benchmark:
+    __slots__ = ('name', 'prepare', 'destructive', 'items')
+
+    def __init__(self, name: str, prepare: Callable, destructive: bool, items: Optional[int]):
+        self.name = name
+        self.prepare = prepare
+        self.destructive = destructive
+        self.items = items
+
+
+def benchmark(name: str, destructive: bool = False, items: Optional[int] = None):
+    """
+    Register a benchmark.
+
+    :param destructive: the timed part changes the peers, so the interface is populated again before each run.
+    :param items: number of items processed by the timed part, to report them per second.
+    """
+    def decorator(prepare):
+        BENCHMARKS[name] = Benchmark(name, prepare, destructive, items)
+        return prepare
+    return decorator
+
+
+def clear():
+    """Delete every interface, skipping the per-peer delete signals which would dominate at scale."""
+    with connection.cursor() as cursor:
+        for model in (WireguardPeerTraffic, WireguardPeerStatus, WireguardPeerNetwork, WireguardPeer):
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+    WireguardInterface.objects.all().delete()
+
+
+def populate(size: int) -> WireguardInterface:
+    """Replace every interface with a single one holding ``size`` peers, on a fresh in-memory backend."""
+    clear()
+    set_backend(MemoryBackend())
+    interface = WireguardInterface.objects.create(name=INTERFACE_NAME, listen_port=51820, address='10.64.0.1/16')
+    WireguardPeer.objects.bulk_create_peers(interface, ({'name': f'peer-{i}'} for i in range(size)))
+    return interface
+
+
+@benchmark('sync')
+def bench_sync(interface: WireguardInterface, size: int):
+    # the device comes back empty, like after a reboot
+    set_backend(MemoryBackend())
+    return lambda: sync_wireguard_interfaces(interface)
+
+
+@benchmark('sync_noop')
+def bench_sync_noop(interface: WireguardInterface, size: int):
+    sync_wireguard_interfaces(interface)
+    return lambda: sync_wireguard_interfaces(interface)
+
+
+@benchmark('peer_save_x100')
+def bench_peer_save(interface: WireguardInterface, size: int):
+    WireguardPeer.objects.filter(interface=interface, name__startswith='saved-').delete()
+
+    def run():
+        for i in range(100):
+            WireguardPeer(interface=interface, name=f'saved-{i}').save()
+    return run
+
+
+CONCURRENT_WORKERS = 8
+CONCURRENT_PEERS = 25
+
+
+@benchmark('concurrent_peer_save_x200', items=CONCURRENT_WORKERS * CONCURRENT_PEERS)
+def bench_concurrent_peer_save(interface: WireguardInterface, size: int):
+    if connection.in_atomic_block or (connection.vendor == 'sqlite' and connection.is_in_memory_db()):
+        # the other threads wouldn't see the peers, or in-memory SQLite at all
+        return None
+    WireguardPeer.objects.filter(interface=interface, name__startswith='concurrent-').delete()
+
+    def create(worker: int, wrappers: list):
+        try:
+            with ExitStack() as stack:
+                # each thread has its own connection, count its queries too
+                for wrapper in wrappers:
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+                for i in range(CONCURRENT_PEERS):
+                    WireguardPeer(interface=interface, name=f'concurrent-{worker}-{i}').save()
+        finally:
+            connections.close_all()
+
+    def run():
+        wrappers = list(connection.execute_wrappers)
+        with ThreadPoolExecutor(max_workers=CONCURRENT_WORKERS) as executor:
+            list(executor.map(create, range(CONCURRENT_WORKERS), [wrappers] * CONCURRENT_WORKERS))
+    return run
+
+
+@benchmark('get_config')
+def bench_get_config(interface: WireguardInterface, size: int):
+    def run():
+        for peer in WireguardPeer.objects.filter(interface=interface).select_related('interface').iterator():
+            peer.get_config()
+    return run
+
+
+@benchmark('audit_allowed_ips')
+def bench_audit_allowed_ips(interface: WireguardInterface, size: int):
+    return lambda: WireguardPeerNetwork.find_conflicts(interface, nested=True)
+
+
+@benchmark('delete_peers', destructive=True)
+def bench_delete_peers(interface: WireguardInterface, size: int):
+    return lambda: call_command('delete_peers', '--all', stderr=io.StringIO())
+
+
+@benchmark('purge_private_keys', destructive=True)
+def bench_purge_private_keys(interface: WireguardInterface, size: int):
+    return purge_private_keys
+
+
+@benchmark('admin_changelist')
+def bench_admin_changelist(interface: WireguardInterface, size: int):
+    if not apps.is_installed('django.contrib.admin'):
+        return None
+
+    from django.contrib import admin
+    from django.contrib.auth import get_user_model
+
+    user = get_user_model().objects.filter(is_superuser=True).first()
+    if user is None:
+        user = get_user_model().objects.create_superuser('wgbench', 'wgbench@example.com', 'wgbench')
+    view = admin.site._registry[WireguardPeer].changelist_view
+
+    def run():
+        request = RequestFactory().get('/')
+        request.user = user
+        view(request).render()
+    return run
+
+
+class QueryCounter:
+    __slots__ = ('count', 'lock')
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_benchmarks(sizes: Iterable[int] = DEFAULT_SIZES, repeat: int = 3,
+                   names: Optional[List[str]] = None) -> Dict[str, Dict[str, dict]]:
+    """
+    Run the benchmarks against the default database, which is emptied.
+
+    :param names: benchmarks to run, all of them by default.
+    :return: ``{benchmark: {size: {'time': best wall time in seconds, 'queries': query count}}}``,
+             with the ``per_second`` throughput of the best run for benchmarks processing a known number of items.
+    """
+    selected = [BENCHMARKS[name] for name in names] if names else list(BENCHMARKS.values())
+    results: Dict[str, Dict[str, dict]] = {}
+    try:
+        for size in sizes:
+            interface = None
+            # destructive benchmarks last, so the others share one population
+            for bench in sorted(selected, key=lambda item: item.destructive):
+                for _ in range(repeat):
+                    if interface is None or bench.destructive:
+                        interface = populate(size)
+                    run = bench.prepare(interface, size)
+                    if run is None:
+                        break
+                    queries = QueryCounter()
+                    with connection.execute_wrapper(queries):
+                        start = time.perf_counter()
+                        run()
+                        elapsed = time.perf_counter() - start
+                    result = results.setdefault(bench.name, {}).setdefault(str(size), {'time': elapsed})
+                    result['time'] = min(result['time'], elapsed)
+                    result['queries'] = queries.count
+                    if bench.items:
+                        result['per_second'] = bench.items / result['time']
+    finally:
+        clear()
+        set_backend(None)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, dict]], baseline: Dict[str, Dict[str, dict]],
+            tolerance: float) -> List[dict]:
+    """
+    Compare ``results`` with a previous run.
+
+    :param tolerance: relative slowdown allowed before a benchmark is a regression, e.g. ``0.25``.
+    :return: one row per result, with the baseline values and a ``regression`` flag.
+    """
+    rows = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            previous = baseline.get(name, {}).get(size)
+            row = {'name': name, 'size': size, **result,
+                   'baseline_time': None, 'baseline_queries': None, 'regression': False}
+            if previous:
+                row['baseline_time'] = previous['time']
+                row['baseline_queries'] = previous['queries']
+                row['regression'] = (result['time'] > previous['time'] * (1 + tolerance)
+                                     or result['queries'] > previous['queries'])
+            rows.append(row)
+    return rows
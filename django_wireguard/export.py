@@ -0,0 +1,167 @@
+import io
+import itertools
+import os
+import tarfile
+import time
+import zipfile
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils.text import slugify
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardPeer
+
+# archive format -> file extension, content type
+ARCHIVE_FORMATS = {
+    'zip': ('.zip', 'application/zip'),
+    'tar': ('.tar', 'application/x-tar'),
+    'tar.gz': ('.tar.gz', 'application/gzip'),
+}
+
+
+def get_config_filename(peer: WireguardPeer, used: Optional[Set[str]] = None) -> str:
+    """
+    Path of the configuration of ``peer`` in an export, ``<interface>/<peer>.conf``.
+
+    Peer names are only unique per interface, and different names may slugify the same:
+    a numbered suffix is added to the paths already in ``used``, which collects the paths handed out.
+    """
+    directory = slugify(peer.interface.name) or f"interface-{peer.interface_id}"
+    stem = slugify(peer.name) or f"peer-{peer.pk}"
+    filename = f"{directory}/{stem}.conf"
+    if used is not None:
+        for suffix in itertools.count(2):
+            if filename not in used:
+                break
+            filename = f"{directory}/{stem}-{suffix}.conf"
+        used.add(filename)
+    return filename
+
+
+def get_archive_format(path: str) -> Optional[str]:
+    """Archive format matching the extension of ``path``, None if it isn't an archive."""
+    if path.endswith('.tgz'):
+        return 'tar.gz'
+    for archive_format, (extension, _) in ARCHIVE_FORMATS.items():
+        if path.endswith(extension):
+            return archive_format
+    return None
+
+
+def iter_export_peers(queryset: QuerySet) -> Iterator[WireguardPeer]:
+    """Stream the peers of ``queryset`` with their interface, ``WIREGUARD_SYNC_CHUNK_SIZE`` rows at a time."""
+    return queryset.select_related('interface').iterator(chunk_size=settings.WIREGUARD_SYNC_CHUNK_SIZE)
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, unseekable file collecting the archive bytes until they are handed to the client."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def pop(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _iter_configs(peers: Iterable[WireguardPeer]) -> Iterator[Tuple[str, bytes]]:
+    used = set()
+    for peer in peers:
+        yield get_config_filename(peer, used), peer.get_config().encode('utf-8')
+
+
+def stream_configs(peers: Iterable[WireguardPeer], archive_format: str = 'zip') -> Iterator[bytes]:
+    """
+    Build an archive of the peer configurations, yielding it a few bytes at a time.
+
+    Each configuration is yielded as soon as it is compressed, so memory stays flat however many peers
+    are exported. Files are readable by their owner only once extracted, as they hold private keys.
+
+    :param archive_format: one of :data:`ARCHIVE_FORMATS`.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format {archive_format}")
+
+    buffer = _StreamBuffer()
+    mtime = time.time()
+    if archive_format == 'zip':
+        archive = zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED)
+
+        def add(filename, data):
+            info = zipfile.ZipInfo(filename, time.localtime(mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o600 << 16
+            archive.writestr(info, data)
+    else:
+        archive = tarfile.open(fileobj=buffer, mode='w|gz' if archive_format == 'tar.gz' else 'w|')
+
+        def add(filename, data):
+            info = tarfile.TarInfo(filename)
+            info.size = len(data)
+            info.mtime = int(mtime)
+            info.mode = 0o600
+            archive.addfile(info, io.BytesIO(data))
+
+    with archive:
+        for filename, data in _iter_configs(peers):
+            add(filename, data)
+            chunk = buffer.pop()
+            if chunk:
+                yield chunk
+    yield buffer.pop()
+
+
+def export_response(queryset: QuerySet, archive_format: str = 'zip',
+                    filename: str = 'wireguard-configs') -> StreamingHttpResponse:
+    """Stream an archive of the configurations of the peers in ``queryset`` as a download."""
+    extension, content_type = ARCHIVE_FORMATS[archive_format]
+    response = StreamingHttpResponse(stream_configs(iter_export_peers(queryset), archive_format),
+                                     content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}{extension}"'
+    return response
+
+
+def write_configs(peers: Iterable[WireguardPeer], destination: str) -> int:
+    """
+    Write the configuration of each peer to a directory or an archive.
+
+    The archive format is picked from ``destination``'s extension: ``.zip``, ``.tar``, ``.tar.gz`` or ``.tgz``.
+    Any other path is used as a directory. Configs are written one at a time as ``peers`` is consumed.
+
+    :return: number of configurations written.
+    """
+    archive_format = get_archive_format(destination)
+    if archive_format:
+        counter = itertools.count()
+        # zip pulls a peer before advancing the counter, which ends up at the number of peers
+        peers = (peer for peer, _ in zip(peers, counter))
+        with open(destination, 'wb') as archive:
+            for chunk in stream_configs(peers, archive_format):
+                archive.write(chunk)
+        return next(counter)
+
+    count = 0
+    os.makedirs(destination, exist_ok=True)
+    for filename, data in _iter_configs(peers):
+        path = os.path.join(destination, *filename.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as config:
+            config.write(data)
+        count += 1
+    return count
@@ -0,0 +1,155 @@
+"""
+Timing hooks around netlink operations, key generation, address allocation and sync steps.
+
+Every instrumented operation, when it ends:
+
+* sends :data:`operation_finished` with ``operation``, ``duration`` (seconds), ``error`` and ``attributes``;
+* logs a ``DEBUG`` record on the ``django_wireguard.instrumentation`` logger,
+  with the same values in its ``wireguard`` extra attribute;
+* closes its OpenTelemetry span, if ``opentelemetry-api`` is installed.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import Signal
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover
+    _tracer = None
+else:
+    # a proxy, spans go to whichever tracer provider gets configured
+    _tracer = trace.get_tracer(__name__)
+
+logger = logging.getLogger(__name__)
+
+operation_finished = Signal()
+
+_local = threading.local()
+
+
+def _get_stack() -> List[str]:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current_operation() -> Optional[str]:
+    """Innermost operation running in the current thread, if any."""
+    stack = _get_stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def instrument(operation: str, **attributes):
+    """
+    Time the enclosed block as ``operation``.
+
+    :param attributes: extra details like the interface name or the number of peers.
+    """
+    stack = _get_stack()
+    stack.append(operation)
+    error = None
+    start = time.perf_counter()
+    try:
+        with ExitStack() as span:
+            if _tracer is not None:
+                span.enter_context(_tracer.start_as_current_span(f'wireguard.{operation}', attributes=attributes))
+            yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s took %.3fms", operation, duration * 1000,
+                         extra={'wireguard': {'operation': operation, 'duration': duration,
+                                              'error': repr(error) if error else None, **attributes}})
+        if operation_finished.has_listeners():
+            operation_finished.send(sender=None, operation=operation, duration=duration,
+                                    error=error, attributes=attributes)
+
+
+def instrumented(operation: str):
+    """Decorator running the whole function inside :func:`instrument`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with instrument(operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class OperationStats:
+    __slots__ = ('calls', 'errors', 'total', 'max', 'queries', 'query_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+
+
+class Profiler:
+    """
+    Aggregate the instrumented operations and database queries run inside a ``with`` block.
+
+    Queries are attributed to the innermost running operation, ``-`` if none.
+    """
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.stats: Dict[str, OperationStats] = defaultdict(OperationStats)
+        self.total = 0.0
+        self.__exit_stack = None
+        self.__start = None
+
+    def __enter__(self):
+        self.__exit_stack = ExitStack()
+        self.__exit_stack.enter_context(self.connection.execute_wrapper(self.__query))
+        operation_finished.connect(self.__record, dispatch_uid=id(self))
+        self.__exit_stack.callback(operation_finished.disconnect, dispatch_uid=id(self))
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.total = time.perf_counter() - self.__start
+        self.__exit_stack.close()
+
+    def __record(self, sender, operation, duration, error, **kwargs):
+        stats = self.stats[operation]
+        stats.calls += 1
+        stats.errors += error is not None
+        stats.total += duration
+        stats.max = max(stats.max, duration)
+
+    def __query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats = self.stats[current_operation() or '-']
+            stats.queries += 1
+            stats.query_time += time.perf_counter() - start
+
+    def report(self) -> List[str]:
+        lines = [f"{'operation':<28} {'calls':>7} {'errors':>6} {'total ms':>10} {'mean ms':>9} "
+                 f"{'max ms':>9} {'queries':>8} {'query ms':>9}"]
+        for operation, stats in sorted(self.stats.items(), key=lambda item: -item[1].total):
+            mean = stats.total / stats.calls if stats.calls else 0.0
+            lines.append(f"{operation:<28} {stats.calls:>7} {stats.errors:>6} {stats.total * 1000:>10.1f} "
+                         f"{mean * 1000:>9.2f} {stats.max * 1000:>9.2f} {stats.queries:>8} "
+                         f"{stats.query_time * 1000:>9.1f}")
+        lines.append(f"wall time {self.total * 1000:.1f}ms")
+        return lines
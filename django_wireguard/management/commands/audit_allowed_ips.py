@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardInterface, WireguardPeerNetwork, describe_conflicts
+
+
+class Command(BaseCommand):
+    help = 'Report the networks routed to several WireGuard peers of an interface'
+
+    def add_arguments(self, parser):
+        parser.add_argument('interfaces', type=str, nargs='*',
+                            help="interface names, all interfaces if omitted")
+        parser.add_argument('--nested', action='store_true',
+                            help="also report networks nested in another peer's network, "
+                                 "which WireGuard routes to the most specific one")
+
+    def handle(self, *args, **options):
+        interfaces = WireguardInterface.objects.order_by('name')
+        if options['interfaces']:
+            interfaces = interfaces.filter(name__in=options['interfaces'])
+
+        nested = options['nested'] or not settings.WIREGUARD_ALLOW_NESTED_ALLOWED_IPS
+        errors = warnings = 0
+        for interface in interfaces:
+            conflicts = WireguardPeerNetwork.find_conflicts(interface, nested=nested)
+            for conflict, description in zip(conflicts, describe_conflicts(conflicts)):
+                self.stdout.write(f"{interface.name}: {'nested' if conflict.nested else 'conflict'}: {description}")
+                if conflict.nested and settings.WIREGUARD_ALLOW_NESTED_ALLOWED_IPS:
+                    warnings += 1
+                else:
+                    errors += 1
+
+        if errors:
+            raise CommandError(f"Found {errors} conflicting and {warnings} nested networks.")
+        self.stderr.write(self.style.SUCCESS(f"No conflict found, {warnings} nested networks."))
@@ -0,0 +1,67 @@
+import csv
+import json
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from django_wireguard.export import write_configs
+from django_wireguard.models import WireguardPeer, WireguardInterface
+
+
+class Command(BaseCommand):
+    help = 'Create many WireGuard Peers from a CSV or JSONL file'
+
+    fields = ('name', 'private_key', 'public_key', 'address', 'dns', 'allowed_ips', 'interface_allowed_ips',
+              'persistent_keepalive', 'interface_persistent_keepalive')
+
+    def add_arguments(self, parser):
+        parser.add_argument('interface', type=str,
+                            help="interface's name")
+        parser.add_argument('input', type=str,
+                            help="CSV or JSONL file with one peer per row, '-' to read from stdin. "
+                                 f"Recognized fields: {', '.join(self.fields)}.")
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help="input format, guessed from the file extension by default.")
+        parser.add_argument('--output', type=str,
+                            help="write peer configurations to this directory or .zip/.tar/.tar.gz archive.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="rows per INSERT query.")
+
+    def read_rows(self, stream, input_format):
+        if input_format == 'csv':
+            rows = csv.DictReader(stream)
+        else:
+            rows = (json.loads(line) for line in stream if line.strip())
+
+        for line, row in enumerate(rows, start=1):
+            unknown = set(row) - set(self.fields)
+            if unknown:
+                raise CommandError(f"Row {line}: unknown fields {', '.join(sorted(unknown))}.")
+            if not row.get('name'):
+                raise CommandError(f"Row {line}: name is required.")
+            yield {key: value for key, value in row.items() if value not in ('', None)}
+
+    def handle(self, *args, **options):
+        try:
+            interface = WireguardInterface.objects.get(name=options['interface'])
+        except WireguardInterface.DoesNotExist:
+            raise CommandError("Requested interface does not exist.")
+
+        input_format = options['format'] or ('jsonl' if options['input'].endswith(('.jsonl', '.json')) else 'csv')
+        if options['input'] == '-':
+            rows = list(self.read_rows(sys.stdin, input_format))
+        else:
+            with open(options['input'], newline='') as stream:
+                rows = list(self.read_rows(stream, input_format))
+
+        try:
+            peers = WireguardPeer.objects.bulk_create_peers(interface, rows, batch_size=options['batch_size'])
+        except (ValidationError, RuntimeWarning) as e:
+            raise CommandError('; '.join(getattr(e, 'messages', None) or [str(e)]))
+
+        if options['output']:
+            count = write_configs(peers, options['output'])
+            self.stderr.write(self.style.SUCCESS(f"Wrote {count} configurations to {options['output']}."))
+
+        self.stderr.write(self.style.SUCCESS(f"Peers added successfully: {len(peers)}.\n"))
@@ -1,19 +1,21 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from django_wireguard.models import WireguardPeer
 
 
 class Command(BaseCommand):
-    help = 'Create a WireGuard Peer'
+    help = 'Delete WireGuard Peers'
 
     def add_arguments(self, parser):
         group = parser.add_mutually_exclusive_group()
-        group.add_argument('pubkeys', type=str, nargs='+', help="peer's public key")
+        group.add_argument('pubkeys', type=str, nargs='*', default=[], help="peer's public key")
         group.add_argument('--all', action='store_true', help="delete all peers")
 
     def handle(self, *args, **options):
         public_keys = options['pubkeys']
         delete_all = options['all']
+        if not public_keys and not delete_all:
+            raise CommandError("Give the public keys of the peers to delete, or --all.")
 
         if delete_all:
             peers = WireguardPeer.objects.all()
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_wireguard.export import ARCHIVE_FORMATS, iter_export_peers, stream_configs, write_configs
+from django_wireguard.models import WireguardPeer
+
+
+class Command(BaseCommand):
+    help = 'Export WireGuard Peer configurations to a directory or an archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('destination', type=str,
+                            help="directory or .zip/.tar/.tar.gz archive, '-' to stream an archive to stdout.")
+        parser.add_argument('--interface', type=str, action='append', dest='interfaces',
+                            help="only export the peers of this interface, can be repeated.")
+        parser.add_argument('--format', choices=tuple(ARCHIVE_FORMATS), default='zip',
+                            help="archive format when streaming to stdout.")
+
+    def handle(self, *args, **options):
+        peers = WireguardPeer.objects.order_by('interface', 'name')
+        if options['interfaces']:
+            peers = peers.filter(interface__name__in=options['interfaces'])
+            if not peers.exists():
+                raise CommandError("No peer found on the requested interfaces.")
+
+        if options['destination'] == '-':
+            for chunk in stream_configs(iter_export_peers(peers), options['format']):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        count = write_configs(iter_export_peers(peers), options['destination'])
+        self.stderr.write(self.style.SUCCESS(f"Wrote {count} configurations to {options['destination']}."))
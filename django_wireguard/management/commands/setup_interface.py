@@ -13,19 +13,18 @@ class Command(BaseCommand):
         parser.add_argument('--address', nargs='*', type=str)
 
     def handle(self, *args, **options):
-        interface = WireguardInterface.objects.filter(name=options['name'])
+        interface = WireguardInterface.objects.filter(name=options['name']).first()
 
         address = ','.join(options['address'] or [])
 
-        if interface.exists():
+        if interface is not None:
+            # saved rather than updated, so the address pools, the kernel and the revision follow
+            interface.listen_port = options['listen_port']
+            interface.address = address
             if options['private_key']:
-                interface.update(listen_port=options['listen_port'],
-                                 private_key=options['private_key'],
-                                 address=address)
-            else:
-                interface.update(listen_port=options['listen_port'],
-                                 address=address)
-            self.stderr.write(self.style.SUCCESS(f"Interface updated: {interface.first().name}.\n"))
+                interface.private_key = options['private_key']
+            interface.save()
+            self.stderr.write(self.style.SUCCESS(f"Interface updated: {interface.name}.\n"))
         else:
             interface = WireguardInterface.objects.create(name=options['name'],
                                                           listen_port=options['listen_port'],
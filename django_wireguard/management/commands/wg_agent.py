@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from django_wireguard import settings
+from django_wireguard.agent import Agent
+
+
+class Command(BaseCommand):
+    help = 'Apply the changes made in controller mode to the WireGuard devices of this host'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=settings.WIREGUARD_AGENT_INTERVAL,
+                            help="seconds between polls of the interface revisions.")
+        parser.add_argument('--full-sync-interval', type=float, default=settings.WIREGUARD_AGENT_FULL_SYNC_INTERVAL,
+                            help="seconds between reconciliations of every interface.")
+        parser.add_argument('--once', action='store_true',
+                            help="reconcile every interface and exit.")
+
+    def handle(self, *args, **options):
+        agent = Agent(full_sync_interval=options['full_sync_interval'])
+        if options['once']:
+            synced = agent.poll()
+            self.stderr.write(self.style.SUCCESS(f"Synced {len(synced)} interfaces."))
+            return
+
+        self.stderr.write(self.style.SUCCESS(f"Polling interface revisions every {options['interval']}s."))
+        try:
+            while True:
+                start = time.monotonic()
+                agent.poll()
+                time.sleep(max(0.0, options['interval'] - (time.monotonic() - start)))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,66 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+
+from django_wireguard.benchmarks import BENCHMARKS, DEFAULT_SIZES, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot paths in a throwaway test database against the in-memory backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmarks', type=str, nargs='*', choices=[[]] + sorted(BENCHMARKS),
+                            help="benchmarks to run, all of them if omitted")
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                            help="peer counts to benchmark.")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="runs per benchmark, the fastest one is kept.")
+        parser.add_argument('--baseline', type=str,
+                            help="JSON results of a previous run to compare with.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="relative slowdown allowed before reporting a regression.")
+        parser.add_argument('--save', type=str,
+                            help="write the results to this JSON file, to be used as a baseline.")
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)['benchmarks']
+
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            results = run_benchmarks(options['sizes'], options['repeat'], options['benchmarks'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        rows = compare(results, baseline, options['tolerance'])
+        self.stdout.write(f"{'benchmark':<26} {'peers':>7} {'time ms':>10} {'queries':>8} {'per s':>8} "
+                          f"{'baseline ms':>12} {'change':>8}")
+        for row in rows:
+            change = ''
+            baseline_time = ''
+            if row['baseline_time']:
+                baseline_time = f"{row['baseline_time'] * 1000:.1f}"
+                change = f"{(row['time'] / row['baseline_time'] - 1) * 100:+.0f}%"
+            per_second = f"{row['per_second']:.0f}" if 'per_second' in row else ''
+            line = (f"{row['name']:<26} {row['size']:>7} {row['time'] * 1000:>10.1f} {row['queries']:>8} "
+                    f"{per_second:>8} {baseline_time:>12} {change:>8}")
+            self.stdout.write(self.style.ERROR(line) if row['regression'] else line)
+
+        if options['save']:
+            with open(options['save'], 'w') as results_file:
+                json.dump({'python': platform.python_version(),
+                           'django': django.get_version(),
+                           'benchmarks': results}, results_file, indent=2, sort_keys=True)
+                results_file.write('\n')
+
+        regressions = [row for row in rows if row['regression']]
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmarks regressed against {options['baseline']}.")
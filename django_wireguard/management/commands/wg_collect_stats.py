@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardInterface
+from django_wireguard.stats import StatsCollector
+
+
+class Command(BaseCommand):
+    help = 'Collect WireGuard peer traffic and handshake statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('interfaces', type=str, nargs='*',
+                            help="interface names, all interfaces if omitted")
+        parser.add_argument('--interval', type=float, default=settings.WIREGUARD_STATS_INTERVAL,
+                            help="seconds between polls.")
+        parser.add_argument('--once', action='store_true',
+                            help="poll once, store the traffic since the previous run and exit.")
+
+    def handle(self, *args, **options):
+        interfaces = None
+        if options['interfaces']:
+            interfaces = WireguardInterface.objects.filter(name__in=options['interfaces'])
+        collector = StatsCollector(interfaces)
+
+        if options['once']:
+            collector.poll()
+            collector.flush()
+            return
+
+        self.stderr.write(self.style.SUCCESS(f"Collecting statistics every {options['interval']}s."))
+        try:
+            while True:
+                start = time.monotonic()
+                collector.poll()
+                time.sleep(max(0.0, options['interval'] - (time.monotonic() - start)))
+        except KeyboardInterrupt:
+            collector.flush()
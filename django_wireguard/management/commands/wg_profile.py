@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from django_wireguard.instrumentation import Profiler
+from django_wireguard.models import WireguardInterface
+from django_wireguard.sync_wg import reconcile_interfaces
+
+
+class Command(BaseCommand):
+    help = 'Sync WireGuard interfaces and print the time spent in each phase'
+
+    def add_arguments(self, parser):
+        parser.add_argument('interfaces', type=str, nargs='*',
+                            help="interface names, all interfaces if omitted")
+        parser.add_argument('--plan', action='store_true',
+                            help="profile the diff only, without applying it")
+
+    def handle(self, *args, **options):
+        interfaces = WireguardInterface.objects.all()
+        if options['interfaces']:
+            interfaces = interfaces.filter(name__in=options['interfaces'])
+
+        with Profiler() as profiler:
+            plans = reconcile_interfaces(interfaces, dry_run=options['plan'])
+
+        self.stdout.write('\n'.join(profiler.report()))
+        self.stderr.write(self.style.SUCCESS(f"Profiled {len(plans)} interfaces."))
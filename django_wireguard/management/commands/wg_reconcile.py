@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardInterface
+from django_wireguard.sync_wg import reconcile_interfaces
+
+
+class Command(BaseCommand):
+    help = 'Reconcile WireGuard devices with the database, applying only the differences'
+
+    def add_arguments(self, parser):
+        parser.add_argument('interfaces', type=str, nargs='*',
+                            help="interface names, all interfaces if omitted")
+        parser.add_argument('--plan', action='store_true',
+                            help="print the changes and timings without applying them")
+        parser.add_argument('--workers', type=int, default=settings.WIREGUARD_SYNC_WORKERS,
+                            help="number of interfaces reconciled at once")
+
+    def handle(self, *args, **options):
+        interfaces = WireguardInterface.objects.all()
+        if options['interfaces']:
+            interfaces = interfaces.filter(name__in=options['interfaces'])
+
+        plans = reconcile_interfaces(interfaces, dry_run=options['plan'], workers=options['workers'])
+        if not plans:
+            self.stderr.write(self.style.NOTICE("No interface found."))
+            return
+
+        for plan in plans:
+            self.stdout.write('\n'.join(plan.describe()))
+
+        if options['plan']:
+            self.stderr.write(self.style.NOTICE("Plan only, no change applied."))
+        else:
+            changed = sum(1 for plan in plans if plan)
+            self.stderr.write(self.style.SUCCESS(f"Reconciled {changed} of {len(plans)} interfaces."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from django_wireguard.startup import sync_interfaces, sync_once_per_boot
+
+
+class Command(BaseCommand):
+    help = 'Reconcile WireGuard devices with the database, meant to run from the init system at boot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('interfaces', type=str, nargs='*',
+                            help="interface names, all interfaces if omitted")
+
+    def handle(self, *args, **options):
+        if options['interfaces']:
+            plans = sync_interfaces(options['interfaces'])
+            self.stderr.write(self.style.SUCCESS(f"Synced {len(plans)} interfaces."))
+        else:
+            # recorded, so processes started later with WIREGUARD_STARTUP_SYNC = 'once' skip it
+            sync_once_per_boot(force=True)
+            self.stderr.write(self.style.SUCCESS("Synced all interfaces."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from django_wireguard.models import WireguardInterface
+from django_wireguard.syncconf import syncconf_interfaces, write_config
+
+
+class Command(BaseCommand):
+    help = 'Render the configuration of WireGuard interfaces to files and apply each one as a whole'
+
+    def add_arguments(self, parser):
+        parser.add_argument('interfaces', type=str, nargs='*',
+                            help="interface names, all interfaces if omitted")
+        parser.add_argument('--directory', type=str,
+                            help="where to write the files, WIREGUARD_CONFIG_DIR by default")
+        parser.add_argument('--render-only', action='store_true',
+                            help="write the files without applying them")
+
+    def handle(self, *args, **options):
+        interfaces = WireguardInterface.objects.all()
+        if options['interfaces']:
+            interfaces = interfaces.filter(name__in=options['interfaces'])
+
+        if options['render_only']:
+            paths = [write_config(interface, options['directory']) for interface in interfaces]
+        else:
+            paths = syncconf_interfaces(interfaces, options['directory'])
+
+        for path in paths:
+            self.stdout.write(path)
+        action = "Rendered" if options['render_only'] else "Applied"
+        self.stderr.write(self.style.SUCCESS(f"{action} {len(paths)} interfaces."))
@@ -0,0 +1,133 @@
+"""
+OpenMetrics exporter.
+
+Mount :func:`metrics_view` in your URLconf, e.g. ``path('wireguard/', include('django_wireguard.urls'))``,
+and protect it like any other endpoint exposing peer endpoints and public keys.
+Each device is read with a single netlink dump, and the rendered page is cached for
+``WIREGUARD_METRICS_CACHE_TTL`` seconds so concurrent scrapers share the same dump.
+"""
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from django.db.models import Count
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardAddressPool, WireguardInterface, WireguardPeer
+from django_wireguard.wireguard import WireGuard, WireGuardException
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+_cache_lock = threading.Lock()
+_cache: Tuple[float, Optional[str]] = (0.0, None)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class MetricFamily:
+    """Samples of a single metric, rendered in the OpenMetrics text format."""
+
+    __slots__ = ('name', 'type', 'help', 'samples')
+
+    def __init__(self, name: str, metric_type: str, help_text: str):
+        self.name = name
+        self.type = metric_type
+        self.help = help_text
+        self.samples: List[str] = []
+
+    def add(self, value, labels: str, suffix: str = ''):
+        self.samples.append(f"{self.name}{suffix}{labels} {value}")
+
+    def render(self) -> Iterable[str]:
+        yield f"# TYPE {self.name} {self.type}"
+        yield f"# HELP {self.name} {self.help}"
+        yield from self.samples
+
+
+def collect(now: Optional[float] = None) -> List[MetricFamily]:
+    """Dump every interface once and build the metric families."""
+    now = now or time.time()
+    up = MetricFamily('wireguard_interface_up', 'gauge', "Whether the WireGuard device exists.")
+    configured = MetricFamily('wireguard_interface_configured_peers', 'gauge', "Peers stored in the database.")
+    kernel = MetricFamily('wireguard_interface_kernel_peers', 'gauge', "Peers programmed on the device.")
+    handshake = MetricFamily('wireguard_peer_last_handshake_age_seconds', 'gauge',
+                             "Seconds since the latest handshake, NaN if the peer never connected.")
+    received = MetricFamily('wireguard_peer_receive_bytes', 'counter', "Bytes received from the peer.")
+    sent = MetricFamily('wireguard_peer_transmit_bytes', 'counter', "Bytes sent to the peer.")
+    pool_size = MetricFamily('wireguard_address_pool_size', 'gauge', "Addresses in the pool.")
+    pool_allocated = MetricFamily('wireguard_address_pool_allocated', 'gauge', "Addresses allocated from the pool.")
+
+    configured_counts = dict(WireguardPeer.objects
+                             .order_by()
+                             .values_list('interface')
+                             .annotate(count=Count('pk')))
+
+    for interface_pk, interface_name in WireguardInterface.objects.values_list('pk', 'name'):
+        interface_labels = _labels(interface=interface_name)
+        configured.add(configured_counts.get(interface_pk, 0), interface_labels)
+        if settings.WIREGUARD_MODE == 'controller':
+            # the devices live on the agent's host
+            continue
+        try:
+            peers = WireGuard.get_interface(interface_name).get_peers()
+        except WireGuardException:
+            up.add(0, interface_labels)
+            continue
+        up.add(1, interface_labels)
+        kernel.add(len(peers), interface_labels)
+
+        names = dict(WireguardPeer.objects
+                     .filter(interface_id=interface_pk)
+                     .values_list('public_key', 'name')
+                     .iterator(chunk_size=settings.WIREGUARD_SYNC_CHUNK_SIZE))
+        for public_key, state in peers.items():
+            labels = _labels(interface=interface_name, public_key=public_key, name=names.get(public_key, ''))
+            age = now - state['last_handshake'] if state['last_handshake'] else 'NaN'
+            handshake.add(age, labels)
+            received.add(state['rx_bytes'], labels, '_total')
+            sent.add(state['tx_bytes'], labels, '_total')
+
+    for interface_name, network, size, allocated in (WireguardAddressPool.objects
+                                                     .values_list('interface__name', 'network', 'size', 'allocated')):
+        labels = _labels(interface=interface_name, network=network)
+        pool_size.add(size, labels)
+        pool_allocated.add(allocated, labels)
+
+    return [up, configured, kernel, handshake, received, sent, pool_size, pool_allocated]
+
+
+def render_metrics() -> str:
+    lines = [line for family in collect() for line in family.render()]
+    lines.append('# EOF\n')
+    return '\n'.join(lines)
+
+
+def get_metrics() -> str:
+    """Rendered metrics, refreshed at most once per ``WIREGUARD_METRICS_CACHE_TTL`` seconds."""
+    global _cache
+    with _cache_lock:
+        # scrapers arriving during a dump wait for it instead of starting their own
+        rendered_at, body = _cache
+        if body is None or time.monotonic() - rendered_at >= settings.WIREGUARD_METRICS_CACHE_TTL:
+            body = render_metrics()
+            _cache = (time.monotonic(), body)
+        return body
+
+
+def clear_cache():
+    global _cache
+    with _cache_lock:
+        _cache = (0.0, None)
+
+
+@require_GET
+def metrics_view(request):
+    return HttpResponse(get_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,69 @@
+"""
+Middleware telling which WireGuard peer a request comes from.
+
+Add ``django_wireguard.middleware.WireguardPeerMiddleware`` to ``MIDDLEWARE`` to set ``request.wireguard_peer``
+to the peer owning the client IP, or None for clients outside the VPN. The client IP is ``REMOTE_ADDR``,
+so behind a reverse proxy another middleware must set it from the forwarded headers first.
+
+Owners are cached in process memory for ``WIREGUARD_PEER_CACHE_TIMEOUT`` seconds. The cache is cleared whenever
+peer networks change in this process, other processes see the change once their entries expire.
+"""
+import copy
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.dispatch import receiver
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardPeer, peer_networks_changed
+
+
+class PeerCache:
+    """Owner peers of the recently seen IPs, None included, at most ``size`` of them."""
+
+    def __init__(self, size: int, timeout: float):
+        self.size = size
+        self.timeout = timeout
+        self.entries: Dict[str, Tuple[float, Optional[WireguardPeer]]] = {}
+        self.lock = threading.Lock()
+
+    def get_owner(self, ip: str) -> Optional[WireguardPeer]:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(ip)
+        if entry is None or entry[0] < now:
+            try:
+                owner = WireguardPeer.objects.get_owner(ip)
+            except ValueError:
+                # IPv6 or not an IP at all
+                owner = None
+            entry = (now + self.timeout, owner)
+            with self.lock:
+                if len(self.entries) >= self.size:
+                    self.entries.clear()
+                self.entries[ip] = entry
+        # the cached instance is shared between requests
+        return copy.copy(entry[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+peer_cache = PeerCache(settings.WIREGUARD_PEER_CACHE_SIZE, settings.WIREGUARD_PEER_CACHE_TIMEOUT)
+
+
+@receiver(peer_networks_changed)
+def clear_peer_cache(sender, **kwargs):
+    peer_cache.clear()
+
+
+class WireguardPeerMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        ip = request.META.get('REMOTE_ADDR')
+        request.wireguard_peer = peer_cache.get_owner(ip) if ip else None
+        return self.get_response(request)
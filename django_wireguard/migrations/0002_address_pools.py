@@ -0,0 +1,79 @@
+# Generated by Django 3.2.25 on 2026-10-17 10:26
+
+import ipaddress
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from django_wireguard.utils import clean_comma_separated_list, get_host_range, build_free_ranges
+
+
+def create_address_pools(apps, schema_editor):
+    WireguardInterface = apps.get_model('django_wireguard', 'WireguardInterface')
+    WireguardAddressPool = apps.get_model('django_wireguard', 'WireguardAddressPool')
+    WireguardAddressRange = apps.get_model('django_wireguard', 'WireguardAddressRange')
+
+    for interface in WireguardInterface.objects.all():
+        addresses = [ipaddress.IPv4Interface(address) for address in clean_comma_separated_list(interface.address)]
+        used = [int(address.ip) for address in addresses]
+        used.extend(int(ipaddress.IPv4Address(address))
+                    for address in interface.peers.exclude(address='').values_list('address', flat=True))
+
+        for network in dict.fromkeys(address.network for address in addresses):
+            first, last = get_host_range(network)
+            free_ranges = build_free_ranges(first, last, used)
+            free = sum(range_last - range_first + 1 for range_first, range_last in free_ranges)
+            pool = WireguardAddressPool.objects.create(interface=interface,
+                                                       network=str(network),
+                                                       size=last - first + 1,
+                                                       allocated=last - first + 1 - free)
+            WireguardAddressRange.objects.bulk_create(
+                WireguardAddressRange(pool=pool, first=range_first, last=range_last)
+                for range_first, range_last in free_ranges
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WireguardAddressPool',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(max_length=18, verbose_name='Network')),
+                ('size', models.PositiveIntegerField(verbose_name='Size')),
+                ('allocated', models.PositiveIntegerField(default=0, verbose_name='Allocated')),
+                ('interface', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='address_pools', to='django_wireguard.wireguardinterface', verbose_name='Interface')),
+            ],
+            options={
+                'verbose_name': 'WireGuard Address Pool',
+                'verbose_name_plural': 'WireGuard Address Pools',
+            },
+        ),
+        migrations.CreateModel(
+            name='WireguardAddressRange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first', models.BigIntegerField()),
+                ('last', models.BigIntegerField()),
+                ('pool', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='free_ranges', to='django_wireguard.wireguardaddresspool')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='wireguardaddressrange',
+            index=models.Index(fields=['pool', 'first'], name='django_wire_pool_id_b4aeca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wireguardaddressrange',
+            index=models.Index(fields=['pool', 'last'], name='django_wire_pool_id_1b7f07_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='wireguardaddresspool',
+            unique_together={('interface', 'network')},
+        ),
+        migrations.RunPython(create_address_pools, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-17 10:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicate_addresses(apps, schema_editor):
+    """
+    Refuse to add the constraint over peers sharing an address, listing them so they can be fixed by hand.
+
+    Reassigning them here would silently break the configuration of the clients.
+    """
+    WireguardInterface = apps.get_model('django_wireguard', 'WireguardInterface')
+    WireguardPeer = apps.get_model('django_wireguard', 'WireguardPeer')
+    using = schema_editor.connection.alias
+    peers = WireguardPeer.objects.using(using)
+
+    duplicates = (peers.values('interface_id', 'address')
+                  .annotate(count=Count('pk'))
+                  .filter(count__gt=1)
+                  .order_by('interface_id', 'address'))
+    conflicts = []
+    for duplicate in duplicates:
+        names = (peers.filter(interface_id=duplicate['interface_id'], address=duplicate['address'])
+                 .order_by('pk')
+                 .values_list('name', flat=True))
+        interface = WireguardInterface.objects.using(using).get(pk=duplicate['interface_id'])
+        conflicts.append(f"{interface.name} {duplicate['address'] or '(no address)'}: {', '.join(names)}")
+    if conflicts:
+        raise RuntimeError("Several WireGuard peers share an address, give each a distinct address "
+                           "before migrating:\n" + '\n'.join(conflicts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0002_address_pools'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_addresses, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='wireguardpeer',
+            constraint=models.UniqueConstraint(fields=('interface', 'address'), name='unique_wireguard_peer_address'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-17 10:34
+
+from django.db import migrations, models
+
+from django_wireguard.wireguard import PrivateKey
+
+
+def derive_public_keys(apps, schema_editor):
+    WireguardInterface = apps.get_model('django_wireguard', 'WireguardInterface')
+
+    interfaces = list(WireguardInterface.objects.exclude(private_key=''))
+    for interface in interfaces:
+        interface.public_key = str(PrivateKey(interface.private_key).public_key())
+    WireguardInterface.objects.bulk_update(interfaces, ['public_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0003_unique_peer_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wireguardinterface',
+            name='public_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='Public Key'),
+        ),
+        migrations.RunPython(derive_public_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-17 10:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0004_interface_public_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WireguardPeerStatus',
+            fields=[
+                ('peer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='status', serialize=False, to='django_wireguard.wireguardpeer', verbose_name='Peer')),
+                ('endpoint', models.CharField(blank=True, max_length=64, verbose_name='Endpoint')),
+                ('last_handshake', models.DateTimeField(blank=True, null=True, verbose_name='Last Handshake')),
+                ('rx_bytes', models.BigIntegerField(default=0, verbose_name='Received Bytes')),
+                ('tx_bytes', models.BigIntegerField(default=0, verbose_name='Sent Bytes')),
+                ('updated', models.DateTimeField(verbose_name='Updated')),
+            ],
+            options={
+                'verbose_name': 'WireGuard Peer Status',
+                'verbose_name_plural': 'WireGuard Peer Statuses',
+            },
+        ),
+        migrations.CreateModel(
+            name='WireguardPeerTraffic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], max_length=6, verbose_name='Resolution')),
+                ('start', models.DateTimeField(verbose_name='Start')),
+                ('rx_bytes', models.BigIntegerField(default=0, verbose_name='Received Bytes')),
+                ('tx_bytes', models.BigIntegerField(default=0, verbose_name='Sent Bytes')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traffic', to='django_wireguard.wireguardpeer', verbose_name='Peer')),
+            ],
+            options={
+                'verbose_name': 'WireGuard Peer Traffic',
+                'verbose_name_plural': 'WireGuard Peer Traffic',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='wireguardpeertraffic',
+            index=models.Index(fields=['resolution', 'start'], name='django_wire_resolut_7c9333_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='wireguardpeertraffic',
+            unique_together={('peer', 'resolution', 'start')},
+        ),
+    ]
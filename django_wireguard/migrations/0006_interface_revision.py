@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0005_peer_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wireguardinterface',
+            name='revision',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Revision'),
+        ),
+    ]
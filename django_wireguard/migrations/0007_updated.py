@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-17 12:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0006_interface_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wireguardinterface',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Updated'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='wireguardpeer',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Updated'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-17 11:22
+
+from django.db import migrations, models
+import django_wireguard.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0007_updated'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='wireguardpeer',
+            name='address',
+            field=models.CharField(blank=True, db_index=True, max_length=20, validators=[django_wireguard.validators.validate_private_ipv4], verbose_name='Address'),
+        ),
+        migrations.AlterField(
+            model_name='wireguardpeer',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.25 on 2026-10-17 11:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from django_wireguard.utils import parse_networks
+
+PEER_FIELDS = ('address', 'interface_allowed_ips', 'allowed_ips', 'dns')
+
+
+def create_peer_networks(apps, schema_editor):
+    WireguardPeer = apps.get_model('django_wireguard', 'WireguardPeer')
+    WireguardPeerNetwork = apps.get_model('django_wireguard', 'WireguardPeerNetwork')
+
+    rows = []
+    for peer in WireguardPeer.objects.only('interface_id', *PEER_FIELDS).iterator(chunk_size=2000):
+        for field in PEER_FIELDS:
+            for network in parse_networks(getattr(peer, field) or ''):
+                rows.append(WireguardPeerNetwork(peer_id=peer.pk,
+                                                 interface_id=peer.interface_id,
+                                                 field=field,
+                                                 network=str(network),
+                                                 first=int(network.network_address),
+                                                 last=int(network.broadcast_address),
+                                                 prefixlen=network.prefixlen))
+        if len(rows) >= 2000:
+            WireguardPeerNetwork.objects.bulk_create(rows)
+            rows = []
+    WireguardPeerNetwork.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0008_peer_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WireguardPeerNetwork',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('address', 'Address'), ('interface_allowed_ips', 'Interface Allowed IPs'), ('allowed_ips', 'Allowed IPs'), ('dns', 'DNS')], max_length=21, verbose_name='Field')),
+                ('network', models.CharField(max_length=18, verbose_name='Network')),
+                ('first', models.BigIntegerField(verbose_name='First Address')),
+                ('last', models.BigIntegerField(verbose_name='Last Address')),
+                ('prefixlen', models.PositiveSmallIntegerField(verbose_name='Prefix Length')),
+                ('interface', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='peer_networks', to='django_wireguard.wireguardinterface', verbose_name='Interface')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='networks', to='django_wireguard.wireguardpeer', verbose_name='Peer')),
+            ],
+            options={
+                'verbose_name': 'WireGuard Peer Network',
+                'verbose_name_plural': 'WireGuard Peer Networks',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='wireguardpeernetwork',
+            index=models.Index(fields=['network', 'field'], name='django_wire_network_6669fe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wireguardpeernetwork',
+            index=models.Index(fields=['interface', 'first'], name='django_wire_interfa_227cfe_idx'),
+        ),
+        migrations.RunPython(create_peer_networks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-17 11:57
+import ipaddress
+
+from django.db import migrations, models
+
+from django_wireguard.utils import parse_networks
+
+
+def create_peer_routes(apps, schema_editor):
+    WireguardPeer = apps.get_model('django_wireguard', 'WireguardPeer')
+    WireguardPeerNetwork = apps.get_model('django_wireguard', 'WireguardPeerNetwork')
+
+    rows = []
+    peers = WireguardPeer.objects.only('interface_id', 'address', 'interface_allowed_ips').iterator(chunk_size=2000)
+    for peer in peers:
+        networks = parse_networks(f"{peer.interface_allowed_ips},{peer.address}")
+        for network in ipaddress.collapse_addresses(networks):
+            rows.append(WireguardPeerNetwork(peer_id=peer.pk,
+                                             interface_id=peer.interface_id,
+                                             field='route',
+                                             network=str(network),
+                                             first=int(network.network_address),
+                                             last=int(network.broadcast_address),
+                                             prefixlen=network.prefixlen))
+        if len(rows) >= 2000:
+            WireguardPeerNetwork.objects.bulk_create(rows)
+            rows = []
+    WireguardPeerNetwork.objects.bulk_create(rows)
+
+
+def delete_peer_routes(apps, schema_editor):
+    WireguardPeerNetwork = apps.get_model('django_wireguard', 'WireguardPeerNetwork')
+    WireguardPeerNetwork.objects.filter(field='route').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_wireguard', '0009_peer_networks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='wireguardpeernetwork',
+            name='field',
+            field=models.CharField(choices=[('address', 'Address'), ('interface_allowed_ips', 'Interface Allowed IPs'), ('allowed_ips', 'Allowed IPs'), ('dns', 'DNS'), ('route', 'Route')], max_length=21, verbose_name='Field'),
+        ),
+        migrations.RunPython(create_peer_routes, delete_peer_routes),
+    ]
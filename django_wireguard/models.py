@@ -1,24 +1,166 @@
+import datetime
+import bisect
 import ipaddress
-from typing import List
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Iterator, List, Optional, Iterable, Set, Tuple
 
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
-from django.db import models
-from django.db.models.signals import pre_save, pre_delete
-from django.dispatch import receiver
+from django.db import models, router, transaction, IntegrityError, OperationalError
+from django.db.models import Count, F, Q
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
-from django_wireguard import settings
-from django_wireguard.utils import clean_comma_separated_list
+from django_wireguard import settings, sync_queue
+from django_wireguard.instrumentation import instrumented
+from django_wireguard.prefix_trie import Conflict, PrefixTrie
+from django_wireguard.utils import clean_comma_separated_list, get_peer_allowed_ips, get_host_range, \
+    build_free_ranges, chunked, parse_networks
 from django_wireguard.validators import validate_private_ipv4, validate_wireguard_private_key, \
     validate_wireguard_public_key, validate_allowed_ips
 
 from django_wireguard.wireguard import WireGuard, PrivateKey
 
 
-__all__ = ('WireguardInterface', 'WireguardPeer')
+__all__ = ('WireguardInterface', 'WireguardPeer', 'WireguardPeerNetwork', 'WireguardAddressPool',
+           'WireguardAddressRange', 'WireguardPeerStatus', 'WireguardPeerTraffic', 'peer_networks_changed')
 
+# sent once changes to the networks routed to some peers are committed, with the ``using`` database alias
+peer_networks_changed = Signal()
 
-class WireguardInterface(models.Model):
+
+def _send_peer_networks_changed(using: str):
+    transaction.on_commit(lambda: peer_networks_changed.send(sender=WireguardPeerNetwork, using=using), using=using)
+
+
+class ChangeTrackingModel(models.Model):
+    """
+    Remember the values a model was loaded with, to tell which fields a save changes.
+
+    ``kernel_fields`` lists the fields whose changes must be programmed into the kernel.
+    """
+    kernel_fields = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname)
+                               for field in self._meta.concrete_fields
+                               if field.attname not in self.get_deferred_fields()}
+
+    def get_loaded_value(self, field: str, default=None):
+        """Value ``field`` had when the instance was loaded or last saved, ``default`` if unknown."""
+        return getattr(self, '_loaded_values', {}).get(self._meta.get_field(field).attname, default)
+
+    def get_changed_fields(self) -> Set[str]:
+        """
+        Fields changed since the instance was loaded or last saved.
+
+        Every field is considered changed on new instances or instances that weren't loaded from the database.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        fields = self._meta.concrete_fields
+        if self._state.adding or loaded is None:
+            return {field.name for field in fields}
+        return {field.name for field in fields
+                if field.attname in loaded and loaded[field.attname] != getattr(self, field.attname)}
+
+    def has_kernel_changes(self) -> bool:
+        return not self.get_changed_fields().isdisjoint(self.kernel_fields)
+
+
+_local = threading.local()
+
+
+class _PeerDeletion:
+    """
+    Bookkeeping shared by the delete signals of the peers deleted at once.
+
+    The addresses of the peers are given back to the pools in one pass per pool when the delete is done,
+    unless their interfaces are deleted too, taking the pools along.
+    """
+
+    def __init__(self, using: str, release: bool = True):
+        self.using = using
+        self.release = release
+        # interface id -> addresses of its deleted peers
+        self.addresses = defaultdict(list)
+        self.interface_names = {}
+        self.deleted = False
+        self.previous = None
+
+    @classmethod
+    def get(cls, using: str) -> Optional['_PeerDeletion']:
+        """Deletion in progress on the database ``using`` in this thread, if any."""
+        return getattr(_local, 'peer_deletions', {}).get(using)
+
+    def __enter__(self) -> '_PeerDeletion':
+        deletions = _local.__dict__.setdefault('peer_deletions', {})
+        self.previous = deletions.get(self.using)
+        deletions[self.using] = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        deletions = _local.peer_deletions
+        if self.previous is None:
+            del deletions[self.using]
+        else:
+            deletions[self.using] = self.previous
+        if exc_type is None:
+            self.release_addresses()
+
+    def get_interface_name(self, peer: 'WireguardPeer') -> str:
+        """Name of the interface of ``peer``, fetched once per interface."""
+        name = self.interface_names.get(peer.interface_id)
+        if name is None:
+            name = self.interface_names[peer.interface_id] = peer.interface.name
+        return name
+
+    def add(self, peer: 'WireguardPeer'):
+        """Record that ``peer`` was deleted."""
+        self.deleted = True
+        if peer.address:
+            self.addresses[peer.interface_id].append(peer.address)
+
+    def release_addresses(self):
+        if self.addresses and self.release:
+            pools = WireguardAddressPool.objects.using(self.using).filter(interface_id__in=list(self.addresses))
+            for pool in pools:
+                pool.release_many(self.addresses[pool.interface_id])
+        if self.deleted:
+            # the networks are deleted with the peers
+            _send_peer_networks_changed(self.using)
+        self.addresses.clear()
+        self.deleted = False
+
+
+class WireguardInterfaceQuerySet(models.QuerySet):
+    def delete(self):
+        # the pools are deleted with the interfaces, their peers' addresses needn't be given back
+        with transaction.atomic(using=self.db, savepoint=False), _PeerDeletion(self.db, release=False):
+            return super().delete()
+
+    # like QuerySet.delete, not copied to the manager
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class WireguardInterface(ChangeTrackingModel):
     name = models.CharField(max_length=100,
                             validators=[RegexValidator(r'^[A-z0-9]+$',
                                                        _("Interface Name must be a string of alphanumeric chars."))],
@@ -33,14 +175,26 @@ class WireguardInterface(models.Model):
                                    blank=True,
                                    validators=[validate_wireguard_private_key],
                                    verbose_name=_("Private Key (leave empty to auto generate)"))
+    # derived from private_key on save
+    public_key = models.CharField(max_length=64,
+                                  blank=True,
+                                  editable=False,
+                                  db_index=True,
+                                  verbose_name=_("Public Key"))
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name=_("Updated"))
+    # bumped when committed changes wait to be applied by the agent, in controller mode
+    revision = models.BigIntegerField(default=0,
+                                      editable=False,
+                                      verbose_name=_("Revision"))
+
+    objects = WireguardInterfaceQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("WireGuard Interface")
         verbose_name_plural = _("WireGuard Interfaces")
 
-    @property
-    def public_key(self) -> str:
-        return str(PrivateKey(self.private_key).public_key())
+    kernel_fields = ('name', 'private_key', 'listen_port', 'address')
 
     @property
     def wg(self):
@@ -52,21 +206,322 @@ class WireguardInterface(models.Model):
     def __str__(self):
         return f"{self.name} - {self.address}"
 
+    def save(self, *args, **kwargs):
+        # never write back a stale revision, the agent would miss the bumps made since the instance was loaded
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'revision']
+        super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        # the pools are deleted with the interface, its peers' addresses needn't be given back
+        using = using or router.db_for_write(WireguardInterface, instance=self)
+        with transaction.atomic(using=using, savepoint=False), _PeerDeletion(using, release=False):
+            return super().delete(using, keep_parents)
+
     def get_address_list(self):
         return clean_comma_separated_list(self.address)
 
     def get_endpoint(self):
         return f"{settings.WIREGUARD_ENDPOINT}:{self.listen_port}"
 
+    def sync_address_pools(self, previous_address: Optional[str] = None):
+        """
+        Create the address pools of the interface's subnets and drop the stale ones.
+
+        New pools are seeded in a single pass with the interface's own IPs and the addresses already held by peers.
+        In the pools that are kept, the interface's new IPs are reserved and the ones it no longer has are released.
+
+        :param previous_address: the interface's address before the change, if any.
+        """
+        addresses = [ipaddress.IPv4Interface(address) for address in self.get_address_list()]
+        networks = {str(address.network): address.network for address in addresses}
+
+        self.address_pools.exclude(network__in=list(networks)).delete()
+        existing = set(self.address_pools.values_list('network', flat=True))
+        missing = [network for key, network in networks.items() if key not in existing]
+
+        if existing and previous_address:
+            ips = {str(address.ip) for address in addresses}
+            previous_ips = {str(ipaddress.IPv4Interface(address).ip)
+                            for address in clean_comma_separated_list(previous_address)}
+            # pools ignore the addresses outside their network
+            for pool in self.address_pools.filter(network__in=existing):
+                for ip in previous_ips - ips:
+                    pool.release(ip)
+                for ip in ips - previous_ips:
+                    pool.reserve(ip)
+        if not missing:
+            return
 
-class WireguardPeer(models.Model):
+        used = [int(address.ip) for address in addresses]
+        for address in self.peers.exclude(address='').values_list('address', flat=True).iterator():
+            used.append(int(ipaddress.IPv4Address(address)))
+
+        using = router.db_for_write(WireguardAddressPool, instance=self)
+        for network in missing:
+            first, last = get_host_range(network)
+            free_ranges = build_free_ranges(first, last, used)
+            free = sum(range_last - range_first + 1 for range_first, range_last in free_ranges)
+            pool = WireguardAddressPool.objects.using(using).create(interface=self,
+                                                                    network=str(network),
+                                                                    size=last - first + 1,
+                                                                    allocated=last - first + 1 - free)
+            WireguardAddressRange.objects.using(using).bulk_create(
+                WireguardAddressRange(pool=pool, first=range_first, last=range_last)
+                for range_first, range_last in free_ranges
+            )
+
+    @instrumented('pool.allocate')
+    def allocate_address(self) -> Optional[str]:
+        """
+        Take the lowest free address from the interface's pools.
+
+        :return: the allocated address, or None if every pool is exhausted.
+        """
+        for pool in self.address_pools.order_by('pk'):
+            address = pool.allocate()
+            if address:
+                return address
+        return None
+
+    @instrumented('pool.allocate_many')
+    def allocate_addresses(self, count: int) -> List[str]:
+        """
+        Take the ``count`` lowest free addresses from the interface's pools in one pass.
+
+        :raises RuntimeWarning: if the pools don't have enough free addresses.
+        """
+        addresses = []
+        with transaction.atomic(using=router.db_for_write(WireguardAddressPool, instance=self)):
+            for pool in self.address_pools.order_by('pk'):
+                addresses.extend(pool.allocate_many(count - len(addresses)))
+                if len(addresses) == count:
+                    return addresses
+            raise RuntimeWarning("WireGuard interface's subnets have no available IP left")
+
+    @instrumented('pool.reserve')
+    def reserve_address(self, address: str) -> bool:
+        """
+        Mark ``address`` as used in the pool containing it.
+
+        :return: False if the address is outside the pools or already taken.
+        """
+        pool = self.get_address_pool(address)
+        return pool is not None and pool.reserve(address)
+
+    @instrumented('pool.release')
+    def release_address(self, address: str) -> bool:
+        """
+        Give ``address`` back to the pool containing it.
+
+        :return: False if the address is outside the pools or already free.
+        """
+        pool = self.get_address_pool(address)
+        return pool is not None and pool.release(address)
+
+    def get_address_pool(self, address: str) -> Optional['WireguardAddressPool']:
+        address = ipaddress.IPv4Address(address)
+        for pool in self.address_pools.all():
+            if address in pool.get_network():
+                return pool
+        return None
+
+    def get_address_pool_usage(self) -> List[dict]:
+        return [pool.get_usage() for pool in self.address_pools.order_by('pk')]
+
+    def get_allowed_ips_usage(self) -> dict:
+        """
+        Count the AllowedIPs entries listed by the peers and the ones programmed once collapsed.
+
+        Counted from the stored peer networks in a single query, no peer is parsed.
+
+        :return: dict with ``listed``, ``programmed`` and ``saved`` entry counts.
+        """
+        usage = self.peer_networks.order_by().aggregate(
+            listed=Count('pk', filter=Q(field__in=WireguardPeerNetwork.ROUTED)),
+            programmed=Count('pk', filter=Q(field=WireguardPeerNetwork.ROUTE)),
+        )
+        usage['saved'] = usage['listed'] - usage['programmed']
+        return usage
+
+
+class WireguardPeerQuerySet(models.QuerySet):
+    def delete(self):
+        # one pass over each pool once every peer is deleted, instead of one pool update per peer
+        with transaction.atomic(using=self.db, savepoint=False), _PeerDeletion(self.db):
+            return super().delete()
+
+    # like QuerySet.delete, not copied to the manager
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def search(self, term: str) -> 'WireguardPeerQuerySet':
+        """
+        Filter the peers matching ``term`` with indexed lookups only, so searching stays fast on large tables.
+
+        A WireGuard key matches the public key, an address or address prefix the peer address,
+        anything else a name prefix.
+        """
+        term = term.strip()
+        if not term:
+            return self
+        if len(term) == 44 and term.endswith('='):
+            return self.filter(public_key=term)
+        if re.fullmatch(r'[0-9.]+', term):
+            return self.filter(address__startswith=term)
+        return self.filter(name__startswith=term)
+
+    def update_and_sync(self, **values) -> int:
+        """
+        Update the selected peers with a single query.
+
+        The kernel is reprogrammed after commit only if a kernel relevant field is updated,
+        so client side changes like pushing a new DNS to every peer never touch netlink.
+        Fields tied to the address pools or the peer identity must be saved one by one.
+
+        :return: number of updated peers.
+        """
+        per_peer = {'interface', 'address', 'private_key', 'public_key'}.intersection(values)
+        if per_peer:
+            raise ValueError(f"Fields {', '.join(sorted(per_peer))} can't be updated in bulk, save each peer instead.")
+        # update() skips auto_now, yet the configurations change
+        values.setdefault('updated', timezone.now())
+
+        kernel = bool(set(WireguardPeer.kernel_fields).intersection(values))
+        networks = [field for field in WireguardPeerNetwork.FIELDS if field in values]
+        if not kernel and not networks:
+            return self.update(**values)
+
+        with transaction.atomic(using=self.db):
+            rows = list(self.values_list('pk', 'public_key'))
+            count = self.update(**values)
+            if networks:
+                for chunk in chunked([pk for pk, _ in rows], 500):
+                    WireguardPeerNetwork.rebuild(WireguardPeer.objects.using(self.db).filter(pk__in=chunk),
+                                                 fields=networks, using=self.db)
+            if kernel:
+                sync_queue.queue_peers(*(public_key for _, public_key in rows), using=self.db)
+        return count
+
+
+class WireguardPeerManager(models.Manager.from_queryset(WireguardPeerQuerySet)):
+    def get_owner(self, ip: str, interface: Optional[WireguardInterface] = None) -> Optional['WireguardPeer']:
+        """
+        Peer the server routes ``ip`` to.
+
+        That is the peer whose AllowedIPs, collapsed as programmed into the kernel,
+        hold the most specific network containing ``ip``.
+        Each candidate network is matched with an index lookup, so the cost grows with the log of the peer count.
+
+        :param ip: IP address or network, a network must be wholly contained.
+        :param interface: only look among the peers of this interface.
+        :raises ValueError: if ``ip`` is not a valid IPv4 address or network.
+        """
+        network = ipaddress.IPv4Network(ip, strict=False)
+        candidates = [str(network.supernet(new_prefix=prefixlen)) for prefixlen in range(network.prefixlen, -1, -1)]
+        networks = WireguardPeerNetwork.objects.using(self.db).filter(network__in=candidates,
+                                                                      field=WireguardPeerNetwork.ROUTE)
+        if interface is not None:
+            networks = networks.filter(interface=interface)
+        owner = networks.select_related('peer__interface').order_by('-prefixlen', 'interface_id').first()
+        return owner and owner.peer
+
+    def bulk_create_peers(self, interface: WireguardInterface, peers: Iterable[dict],
+                          batch_size: Optional[int] = None) -> List['WireguardPeer']:
+        """
+        Create many peers of ``interface`` at once.
+
+        Keys are generated for the peers given without one, addresses are allocated from the
+        interface's pools in a single pass, rows are inserted with ``bulk_create`` in one transaction
+        and the kernel is programmed with batched netlink messages.
+
+        :param interface: interface of the new peers.
+        :param peers: dicts of field values, list values are joined as comma separated strings.
+        :param batch_size: rows per INSERT query.
+        :return: the created peers. When ``WIREGUARD_STORE_PRIVATE_KEYS`` is False generated
+                 private keys are not stored, but are kept on the returned instances to render their configuration.
+        """
+        instances = []
+        for values in peers:
+            values = {key: ','.join(value) if isinstance(value, (list, tuple)) else value
+                      for key, value in values.items() if value is not None}
+            peer = self.model(interface=interface, **values)
+            if not peer.private_key and not peer.public_key:
+                peer.private_key = str(PrivateKey.generate())
+            try:
+                peer.clean_fields(exclude=['interface'])
+            except ValidationError as e:
+                raise ValidationError(_("Invalid peer %(name)s: %(errors)s"),
+                                      params={'name': peer.name, 'errors': '; '.join(e.messages)})
+            if peer.private_key:
+                peer.public_key = str(PrivateKey(peer.private_key).public_key())
+            instances.append(peer)
+
+        self.__check_duplicates(interface, instances)
+
+        private_keys = [peer.private_key for peer in instances]
+        if not settings.WIREGUARD_STORE_PRIVATE_KEYS:
+            for peer in instances:
+                peer.private_key = None
+
+        with transaction.atomic(using=self.db):
+            unavailable = [peer.address for peer in instances
+                           if peer.address and not interface.reserve_address(peer.address)]
+            if unavailable:
+                raise ValidationError(_("Addresses already taken or outside the interface's pools: %(addresses)s"),
+                                      params={'addresses': ', '.join(unavailable)})
+            auto_assigned = [peer for peer in instances if not peer.address]
+            for peer, address in zip(auto_assigned, interface.allocate_addresses(len(auto_assigned))):
+                peer.address = address
+            self.__check_routing_conflicts(interface, instances)
+            self.bulk_create(instances, batch_size=batch_size)
+
+            # only some databases return the primary keys of bulk inserts
+            missing = [peer for peer in instances if peer.pk is None]
+            for chunk in chunked(missing, 500):
+                pks = dict(interface.peers.filter(name__in=[peer.name for peer in chunk]).values_list('name', 'pk'))
+                for peer in chunk:
+                    peer.pk = pks[peer.name]
+            WireguardPeerNetwork.rebuild(instances, using=self.db)
+
+            sync_queue.queue_peers(*(peer.public_key for peer in instances), using=self.db)
+
+        for peer, private_key in zip(instances, private_keys):
+            peer.private_key = private_key
+        return instances
+
+    def __check_duplicates(self, interface: WireguardInterface, peers: List['WireguardPeer']):
+        for field, queryset in (('public_key', self.all()), ('name', interface.peers.all())):
+            values = [getattr(peer, field) for peer in peers]
+            duplicates = {value for value, count in Counter(values).items() if count > 1}
+            for chunk in chunked(values, 500):
+                duplicates.update(queryset.filter(**{f'{field}__in': chunk}).values_list(field, flat=True))
+            if duplicates:
+                raise ValidationError(_("Peers with the same %(field)s already exist: %(values)s"),
+                                      params={'field': field.replace('_', ' '),
+                                              'values': ', '.join(sorted(duplicates))})
+
+    def __check_routing_conflicts(self, interface: WireguardInterface, peers: List['WireguardPeer']):
+        trie = PrefixTrie(nested=not settings.WIREGUARD_ALLOW_NESTED_ALLOWED_IPS)
+        for network, peer_id in WireguardPeerNetwork.iter_routed_networks(interface, using=self.db):
+            trie.add(network, peer_id)
+        conflicts = [conflict for peer in peers for network in peer.get_routed_networks()
+                     for conflict in trie.add(network, peer)]
+        if conflicts:
+            raise ValidationError(_("Networks routed to several peers: %(conflicts)s"),
+                                  params={'conflicts': '; '.join(describe_conflicts(conflicts, using=self.db))})
+
+
+class WireguardPeer(ChangeTrackingModel):
     interface = models.ForeignKey(WireguardInterface,
                                   on_delete=models.CASCADE,
                                   related_name='peers',
                                   verbose_name=_("Interface"))
 
     name = models.CharField(max_length=100,
-                            blank=False)
+                            blank=False,
+                            db_index=True)
     private_key = models.CharField(max_length=64,
                                    null=True,
                                    blank=True,
@@ -84,6 +539,7 @@ class WireguardPeer(models.Model):
     address = models.CharField(validators=[validate_private_ipv4],
                                max_length=20,
                                blank=True,
+                               db_index=True,
                                verbose_name=_("Address"))
     interface_allowed_ips = models.TextField(validators=[validate_allowed_ips],
                                              blank=True,
@@ -99,11 +555,21 @@ class WireguardPeer(models.Model):
     persistent_keepalive = models.PositiveIntegerField(blank=True,
                                                        default=0,
                                                        verbose_name=_("Persistent Keepalive"))
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name=_("Updated"))
+
+    objects = WireguardPeerManager()
 
     class Meta:
         verbose_name = _("WireGuard Peer")
         verbose_name_plural = _("WireGuard Peers")
         unique_together = ('interface', 'name')
+        constraints = [
+            models.UniqueConstraint(fields=['interface', 'address'], name='unique_wireguard_peer_address'),
+        ]
+
+    # dns, allowed_ips and persistent_keepalive only affect the client configuration
+    kernel_fields = ('interface', 'private_key', 'public_key', 'address', 'interface_allowed_ips')
 
     def __repr__(self):
         return f"{self._meta.verbose_name} {self.name} - interface {self.interface}"
@@ -111,6 +577,80 @@ class WireguardPeer(models.Model):
     def __str__(self):
         return f"{self.name}@{self.interface.name} - {self.address}"
 
+    def save(self, *args, **kwargs):
+        """
+        Save the peer, allocating its address atomically with the insert.
+
+        If the address picked from the pool turns out to be held by another peer,
+        the pool is corrected and the save is retried with a new address.
+        Lock conflicts with concurrent writers are retried with a backoff,
+        unless the save runs inside an outer transaction that can't be retried.
+        """
+        auto_address = not self.address
+        using = kwargs.get('using') or router.db_for_write(WireguardPeer, instance=self)
+        retry_conflicts = not transaction.get_connection(using).in_atomic_block
+        retries = settings.WIREGUARD_ALLOCATION_RETRIES
+        for attempt in range(1, retries + 1):
+            try:
+                with transaction.atomic(using=using):
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                address = self.address
+                if not address or not (WireguardPeer.objects.using(using)
+                                       .filter(interface_id=self.interface_id, address=address)
+                                       .exclude(pk=self.pk)
+                                       .exists()):
+                    raise
+                # the pool lost track of an address held by another peer
+                self.interface.reserve_address(address)
+                if not auto_address or attempt == retries:
+                    raise
+            except OperationalError:
+                if not retry_conflicts or attempt == retries:
+                    raise
+                time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+            if auto_address:
+                self.address = ''
+
+    async def asave_and_sync(self, *args, **kwargs):
+        """
+        Save the peer from async code and program the kernel without blocking the event loop.
+
+        The save runs in Django's sync thread and the netlink requests on the WireGuard executor.
+        Inside an outer transaction the kernel is programmed when it commits, like with :meth:`save`.
+        """
+        using = router.db_for_write(WireguardPeer, instance=self)
+
+        def save():
+            with sync_queue.deferred(using) as batch:
+                self.save(*args, **kwargs)
+            return batch
+
+        batch = await sync_to_async(save)()
+        if batch:
+            await sync_queue.aapply_batch(batch, using)
+
+    def get_status(self) -> Optional['WireguardPeerStatus']:
+        """Kernel state of the peer as last seen by the stats collector, if any."""
+        try:
+            return self.status
+        except WireguardPeerStatus.DoesNotExist:
+            return None
+
+    def get_traffic(self, since: datetime.datetime,
+                    resolution: str = 'minute') -> dict:
+        """
+        Total traffic recorded since ``since``.
+
+        :param resolution: ``minute`` or ``hour`` samples, pick one whose retention covers ``since``.
+        :return: dict with ``rx_bytes`` and ``tx_bytes``.
+        """
+        totals = (self.traffic
+                  .filter(resolution=resolution, start__gte=since)
+                  .aggregate(rx_bytes=models.Sum('rx_bytes'), tx_bytes=models.Sum('tx_bytes')))
+        return {key: value or 0 for key, value in totals.items()}
+
     def get_dns_list(self) -> List[str]:
         return clean_comma_separated_list(self.dns)
 
@@ -118,10 +658,49 @@ class WireguardPeer(models.Model):
         return clean_comma_separated_list(self.allowed_ips)
 
     def get_interface_allowed_ips(self) -> List[str]:
-        values = clean_comma_separated_list(self.interface_allowed_ips)
-        if self.address:
-            values.append(self.address)
-        return values
+        return get_peer_allowed_ips(self.address, self.interface_allowed_ips)
+
+    def get_routed_networks(self) -> List[ipaddress.IPv4Network]:
+        """Networks the server routes to the peer: its address and interface allowed IPs, collapsed."""
+        # invalid entries are reported by the field validators
+        return list(ipaddress.collapse_addresses(parse_networks(f"{self.interface_allowed_ips},{self.address}")))
+
+    def get_routing_conflicts(self) -> List[Conflict]:
+        """
+        Conflicts between the networks routed to the peer and the ones stored for the other peers of its interface.
+
+        Identical networks always conflict, nested ones unless ``WIREGUARD_ALLOW_NESTED_ALLOWED_IPS``.
+        Only the candidate networks are read, with index lookups.
+        """
+        networks = self.get_routed_networks()
+        if self.interface_id is None or not networks:
+            return []
+        nested = not settings.WIREGUARD_ALLOW_NESTED_ALLOWED_IPS
+
+        query = Q()
+        for network in networks:
+            if nested:
+                query |= Q(network__in=[str(network.supernet(new_prefix=prefixlen))
+                                        for prefixlen in range(network.prefixlen, -1, -1)])
+                query |= Q(first__range=(int(network.network_address), int(network.broadcast_address)))
+            else:
+                query |= Q(network=str(network))
+        candidates = WireguardPeerNetwork.objects.filter(query,
+                                                         interface_id=self.interface_id,
+                                                         field=WireguardPeerNetwork.ROUTE)
+        if self.pk is not None:
+            candidates = candidates.exclude(peer_id=self.pk)
+
+        trie = PrefixTrie(nested)
+        for network, peer_id in candidates.values_list('network', 'peer_id'):
+            trie.add(ipaddress.IPv4Network(network), peer_id)
+        return [conflict for network in networks for conflict in trie.add(network, self)]
+
+    def clean(self):
+        conflicts = self.get_routing_conflicts()
+        if conflicts:
+            raise ValidationError(_("Networks routed to several peers: %(conflicts)s"),
+                                  params={'conflicts': '; '.join(describe_conflicts(conflicts))})
 
     def get_config(self) -> str:
         """
@@ -149,45 +728,476 @@ class WireguardPeer(models.Model):
         return config
 
 
+class WireguardPeerNetwork(models.Model):
+    """
+    Network listed in one of the comma separated network fields of a peer, normalized and indexed.
+
+    Rows are rebuilt from the peer fields whenever they change, so questions like which peer owns an IP
+    are answered with index lookups instead of parsing every peer.
+    ``route`` rows hold the AllowedIPs programmed into the kernel: the routed fields, collapsed.
+    """
+    ADDRESS = 'address'
+    INTERFACE_ALLOWED_IPS = 'interface_allowed_ips'
+    ALLOWED_IPS = 'allowed_ips'
+    DNS = 'dns'
+    ROUTE = 'route'
+    FIELDS = (ADDRESS, INTERFACE_ALLOWED_IPS, ALLOWED_IPS, DNS)
+    FIELD_CHOICES = (
+        (ADDRESS, _("Address")),
+        (INTERFACE_ALLOWED_IPS, _("Interface Allowed IPs")),
+        (ALLOWED_IPS, _("Allowed IPs")),
+        (DNS, _("DNS")),
+        (ROUTE, _("Route")),
+    )
+    # fields of the networks the server routes to the peer
+    ROUTED = (ADDRESS, INTERFACE_ALLOWED_IPS)
+
+    peer = models.ForeignKey(WireguardPeer,
+                             on_delete=models.CASCADE,
+                             related_name='networks',
+                             verbose_name=_("Peer"))
+    # copied from the peer, to look up the networks of an interface without a join
+    interface = models.ForeignKey(WireguardInterface,
+                                  on_delete=models.CASCADE,
+                                  related_name='peer_networks',
+                                  verbose_name=_("Interface"))
+    field = models.CharField(max_length=21,
+                             choices=FIELD_CHOICES,
+                             verbose_name=_("Field"))
+    network = models.CharField(max_length=18,
+                               verbose_name=_("Network"))
+    first = models.BigIntegerField(verbose_name=_("First Address"))
+    last = models.BigIntegerField(verbose_name=_("Last Address"))
+    prefixlen = models.PositiveSmallIntegerField(verbose_name=_("Prefix Length"))
+
+    class Meta:
+        verbose_name = _("WireGuard Peer Network")
+        verbose_name_plural = _("WireGuard Peer Networks")
+        indexes = [
+            models.Index(fields=['network', 'field']),
+            models.Index(fields=['interface', 'first']),
+        ]
+
+    def __str__(self):
+        return f"{self.network} ({self.field})"
+
+    def get_network(self) -> ipaddress.IPv4Network:
+        return ipaddress.IPv4Network(self.network)
+
+    @classmethod
+    def get_fields(cls, fields: Iterable[str]) -> List[str]:
+        """Row fields to rebuild when the peer ``fields`` change, the routes follow the routed fields."""
+        fields = list(fields)
+        if cls.ROUTE not in fields and not set(fields).isdisjoint(cls.ROUTED):
+            fields.append(cls.ROUTE)
+        return fields
+
+    @classmethod
+    def for_peer(cls, peer: WireguardPeer, fields: Iterable[str] = FIELDS) -> List['WireguardPeerNetwork']:
+        """Unsaved rows of the networks currently listed in the ``fields`` of ``peer``, with its routes."""
+        rows = []
+        for field in cls.get_fields(fields):
+            if field == cls.ROUTE:
+                networks = peer.get_routed_networks()
+            else:
+                networks = parse_networks(getattr(peer, field) or '')
+            for network in networks:
+                rows.append(cls(peer_id=peer.pk,
+                                interface_id=peer.interface_id,
+                                field=field,
+                                network=str(network),
+                                first=int(network.network_address),
+                                last=int(network.broadcast_address),
+                                prefixlen=network.prefixlen))
+        return rows
+
+    @classmethod
+    def iter_routed_networks(cls, interface: WireguardInterface,
+                             using: Optional[str] = None) -> Iterator[Tuple[ipaddress.IPv4Network, int]]:
+        """Stream the networks routed to the peers of ``interface``, with the id of their peer."""
+        rows = (cls.objects.using(using)
+                .filter(interface=interface, field=cls.ROUTE)
+                .values_list('first', 'prefixlen', 'peer_id')
+                .iterator(chunk_size=settings.WIREGUARD_SYNC_CHUNK_SIZE))
+        for first, prefixlen, peer_id in rows:
+            yield ipaddress.IPv4Network((first, prefixlen)), peer_id
+
+    @classmethod
+    def find_conflicts(cls, interface: WireguardInterface, nested: bool = False,
+                       using: Optional[str] = None) -> List[Conflict]:
+        """
+        Conflicts between the networks routed to the peers of ``interface``, in a single pass over them.
+
+        :param nested: also report networks nested in each other, not only identical ones.
+        """
+        trie = PrefixTrie(nested)
+        return [conflict for network, peer_id in cls.iter_routed_networks(interface, using=using)
+                for conflict in trie.add(network, peer_id)]
+
+    @classmethod
+    def rebuild(cls, peers: Iterable[WireguardPeer], fields: Iterable[str] = FIELDS, using: Optional[str] = None):
+        """Replace the stored networks of ``peers`` with the ones listed in their ``fields``."""
+        fields = cls.get_fields(fields)
+        networks = cls.objects.using(using or router.db_for_write(cls))
+        for chunk in chunked(peers, 500):
+            networks.filter(peer__in=[peer.pk for peer in chunk], field__in=fields).delete()
+            networks.bulk_create([row for peer in chunk for row in cls.for_peer(peer, fields)])
+        if cls.ROUTE in fields:
+            _send_peer_networks_changed(networks.db)
+
+
+def describe_conflicts(conflicts: Iterable[Conflict], using: Optional[str] = None) -> List[str]:
+    """Describe each of ``conflicts``, whose owners are peers or peer ids."""
+    conflicts = list(conflicts)
+    ids = {owner for conflict in conflicts for owner in (conflict.owner, conflict.other_owner)
+           if not isinstance(owner, WireguardPeer)}
+    names = {}
+    for chunk in chunked(ids, 500):
+        names.update(WireguardPeer.objects.using(using).filter(pk__in=chunk).values_list('pk', 'name'))
+
+    def name(owner):
+        return owner.name if isinstance(owner, WireguardPeer) else names.get(owner, owner)
+
+    return [f"{conflict.network} of {name(conflict.owner)} and {conflict.other_network} of {name(conflict.other_owner)}"
+            for conflict in conflicts]
+
+
+class _RangeConflict(Exception):
+    """A free range was modified concurrently, the allocation must be retried."""
+
+
+class WireguardAddressPool(models.Model):
+    """
+    Address pool of one interface subnet.
+
+    Free addresses are indexed as disjoint ranges in :class:`WireguardAddressRange`,
+    so allocating, reserving and releasing an address only touch one or two ranges.
+    """
+    interface = models.ForeignKey(WireguardInterface,
+                                  on_delete=models.CASCADE,
+                                  related_name='address_pools',
+                                  verbose_name=_("Interface"))
+    network = models.CharField(max_length=18,
+                               verbose_name=_("Network"))
+    size = models.PositiveIntegerField(verbose_name=_("Size"))
+    allocated = models.PositiveIntegerField(default=0,
+                                            verbose_name=_("Allocated"))
+
+    class Meta:
+        verbose_name = _("WireGuard Address Pool")
+        verbose_name_plural = _("WireGuard Address Pools")
+        unique_together = ('interface', 'network')
+
+    def __str__(self):
+        return f"{self.network} ({self.allocated}/{self.size})"
+
+    def get_network(self) -> ipaddress.IPv4Network:
+        return ipaddress.IPv4Network(self.network)
+
+    def get_usage(self) -> dict:
+        return {
+            'network': self.network,
+            'size': self.size,
+            'allocated': self.allocated,
+            'free': self.size - self.allocated,
+        }
+
+    def allocate(self) -> Optional[str]:
+        with transaction.atomic(using=self.__using()):
+            self.__lock()
+            for attempt in range(settings.WIREGUARD_ALLOCATION_RETRIES):
+                free_range = self.free_ranges.order_by('first').first()
+                if free_range is None:
+                    return None
+                if self.__take(free_range, free_range.first):
+                    return str(ipaddress.IPv4Address(free_range.first))
+        raise OperationalError(f"Could not allocate an address from pool {self.network}, too much contention.")
+
+    def allocate_many(self, count: int) -> List[str]:
+        """
+        Take up to ``count`` of the lowest free addresses, consuming whole free ranges at once.
+
+        :return: the allocated addresses, fewer than ``count`` if the pool runs out.
+        """
+        for attempt in range(settings.WIREGUARD_ALLOCATION_RETRIES):
+            try:
+                with transaction.atomic(using=self.__using()):
+                    self.__lock()
+                    return self.__take_many(count)
+            except _RangeConflict:
+                continue
+        raise OperationalError(f"Could not allocate addresses from pool {self.network}, too much contention.")
+
+    def reserve(self, address: str) -> bool:
+        address = int(ipaddress.IPv4Address(address))
+        with transaction.atomic(using=self.__using()):
+            self.__lock()
+            for attempt in range(settings.WIREGUARD_ALLOCATION_RETRIES):
+                free_range = self.free_ranges.filter(first__lte=address).order_by('-first').first()
+                if free_range is None or free_range.last < address:
+                    return False
+                if self.__take(free_range, address):
+                    return True
+        raise OperationalError(f"Could not reserve {address} from pool {self.network}, too much contention.")
+
+    def release(self, address: str) -> bool:
+        address = int(ipaddress.IPv4Address(address))
+        first, last = get_host_range(self.get_network())
+        if not first <= address <= last:
+            return False
+
+        with transaction.atomic(using=self.__using()):
+            self.__lock()
+            if self.free_ranges.filter(first__lte=address, last__gte=address).exists():
+                return False
+
+            # merge with the adjacent free ranges
+            before = self.free_ranges.filter(last=address - 1).first()
+            after = self.free_ranges.filter(first=address + 1).first()
+            if before and after:
+                before.last = after.last
+                before.save(update_fields=['last'])
+                after.delete()
+            elif before:
+                before.last = address
+                before.save(update_fields=['last'])
+            elif after:
+                after.first = address
+                after.save(update_fields=['first'])
+            else:
+                WireguardAddressRange.objects.using(self.__using()).create(pool=self, first=address, last=address)
+
+            self.__count(-1)
+        return True
+
+    def __using(self) -> str:
+        """Database of the pool, its ranges are written there too."""
+        return router.db_for_write(WireguardAddressPool, instance=self)
+
+    def release_many(self, addresses: Iterable[str]) -> int:
+        """
+        Give many addresses back at once, rewriting the free ranges in a single pass.
+
+        Addresses outside the pool or already free are skipped.
+
+        :return: number of released addresses.
+        """
+        first, last = get_host_range(self.get_network())
+        released = sorted({address for address in map(int, map(ipaddress.IPv4Address, addresses))
+                           if first <= address <= last})
+        if not released:
+            return 0
+
+        using = self.__using()
+        with transaction.atomic(using=using):
+            self.__lock()
+            free_ranges = list(self.free_ranges.order_by('first').values_list('first', 'last'))
+            starts = [range_first for range_first, _ in free_ranges]
+            count = 0
+            for address in released:
+                index = bisect.bisect_right(starts, address) - 1
+                if index < 0 or free_ranges[index][1] < address:
+                    free_ranges.append((address, address))
+                    count += 1
+            if not count:
+                return 0
+
+            merged = []
+            for range_first, range_last in sorted(free_ranges):
+                if merged and range_first <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], range_last)
+                else:
+                    merged.append([range_first, range_last])
+            self.free_ranges.all().delete()
+            WireguardAddressRange.objects.using(using).bulk_create(
+                WireguardAddressRange(pool=self, first=range_first, last=range_last)
+                for range_first, range_last in merged
+            )
+            self.__count(-count)
+        return count
+
+    def __lock(self):
+        """Serialize writers of this pool until the current transaction ends, where the database supports it."""
+        list(WireguardAddressPool.objects.using(self.__using())
+             .select_for_update()
+             .filter(pk=self.pk)
+             .values_list('pk', flat=True))
+
+    def __take(self, free_range: 'WireguardAddressRange', address: int) -> bool:
+        """
+        Remove ``address`` from ``free_range``.
+
+        The range is only modified if it still matches what was read, so concurrent
+        writers on databases without row locks cannot take the same address.
+
+        :return: False if the range changed in the meantime.
+        """
+        ranges = WireguardAddressRange.objects.using(self.__using()).filter(pk=free_range.pk,
+                                                                            first=free_range.first,
+                                                                            last=free_range.last)
+        if free_range.first == free_range.last:
+            taken = ranges.delete()[0]
+        elif address == free_range.first:
+            taken = ranges.update(first=address + 1)
+        elif address == free_range.last:
+            taken = ranges.update(last=address - 1)
+        else:
+            taken = ranges.update(last=address - 1)
+            if taken:
+                WireguardAddressRange.objects.using(self.__using()).create(pool=self, first=address + 1,
+                                                                           last=free_range.last)
+
+        if taken:
+            self.__count(1)
+        return bool(taken)
+
+    def __take_many(self, count: int) -> List[str]:
+        addresses = []
+        emptied = []
+        for free_range in self.free_ranges.order_by('first').iterator():
+            if len(addresses) == count:
+                break
+            take = min(count - len(addresses), free_range.last - free_range.first + 1)
+            addresses.extend(range(free_range.first, free_range.first + take))
+            if free_range.first + take > free_range.last:
+                emptied.append(free_range.pk)
+            elif not (WireguardAddressRange.objects.using(self.__using())
+                      .filter(pk=free_range.pk, first=free_range.first)
+                      .update(first=free_range.first + take)):
+                raise _RangeConflict
+
+        ranges = WireguardAddressRange.objects.using(self.__using())
+        if emptied and ranges.filter(pk__in=emptied).delete()[0] != len(emptied):
+            raise _RangeConflict
+
+        if addresses:
+            self.__count(len(addresses))
+        return [str(ipaddress.IPv4Address(address)) for address in addresses]
+
+    def __count(self, delta: int):
+        WireguardAddressPool.objects.using(self.__using()).filter(pk=self.pk).update(allocated=F('allocated') + delta)
+        self.allocated += delta
+
+
+class WireguardAddressRange(models.Model):
+    """Inclusive range of free addresses of a pool, stored as integers."""
+    pool = models.ForeignKey(WireguardAddressPool,
+                             on_delete=models.CASCADE,
+                             related_name='free_ranges')
+    first = models.BigIntegerField()
+    last = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pool', 'first']),
+            models.Index(fields=['pool', 'last']),
+        ]
+
+
+class WireguardPeerStatus(models.Model):
+    """Latest kernel state of a peer, written by the stats collector."""
+    peer = models.OneToOneField(WireguardPeer,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='status',
+                                verbose_name=_("Peer"))
+    endpoint = models.CharField(max_length=64,
+                                blank=True,
+                                verbose_name=_("Endpoint"))
+    last_handshake = models.DateTimeField(null=True,
+                                          blank=True,
+                                          verbose_name=_("Last Handshake"))
+    rx_bytes = models.BigIntegerField(default=0,
+                                      verbose_name=_("Received Bytes"))
+    tx_bytes = models.BigIntegerField(default=0,
+                                      verbose_name=_("Sent Bytes"))
+    updated = models.DateTimeField(verbose_name=_("Updated"))
+
+    class Meta:
+        verbose_name = _("WireGuard Peer Status")
+        verbose_name_plural = _("WireGuard Peer Statuses")
+
+
+class WireguardPeerTraffic(models.Model):
+    """
+    Traffic of a peer over one minute or one hour.
+
+    Only peers with traffic get a row, hour rows are rolled up from minute rows.
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    RESOLUTIONS = (
+        (MINUTE, _("Minute")),
+        (HOUR, _("Hour")),
+    )
+
+    peer = models.ForeignKey(WireguardPeer,
+                             on_delete=models.CASCADE,
+                             related_name='traffic',
+                             verbose_name=_("Peer"))
+    resolution = models.CharField(max_length=6,
+                                  choices=RESOLUTIONS,
+                                  verbose_name=_("Resolution"))
+    start = models.DateTimeField(verbose_name=_("Start"))
+    rx_bytes = models.BigIntegerField(default=0,
+                                      verbose_name=_("Received Bytes"))
+    tx_bytes = models.BigIntegerField(default=0,
+                                      verbose_name=_("Sent Bytes"))
+
+    class Meta:
+        verbose_name = _("WireGuard Peer Traffic")
+        verbose_name_plural = _("WireGuard Peer Traffic")
+        unique_together = ('peer', 'resolution', 'start')
+        indexes = [
+            models.Index(fields=['resolution', 'start']),
+        ]
+
+
 @receiver(pre_save, sender=WireguardInterface)
+@instrumented('interface.pre_save')
 def sync_wireguard_interface(sender, **kwargs):
     interface = kwargs['instance']
     if not interface.private_key:
         interface.private_key = str(PrivateKey.generate())
 
-    interface.wg.set_interface(private_key=interface.private_key,
-                               listen_port=interface.listen_port)
-
-    interface.wg.set_ip_addresses(*interface.get_address_list())
+    if not interface.public_key or 'private_key' in interface.get_changed_fields():
+        interface.public_key = str(PrivateKey(interface.private_key).public_key())
 
 
 @receiver(pre_save, sender=WireguardPeer)
+@instrumented('peer.pre_save')
 def sync_wireguard_peer(sender, **kwargs):
     peer: WireguardPeer = kwargs['instance']
     interface = peer.interface
+    using = kwargs['using']
+
+    old_interface_id = old_address = old_public_key = None
+    if peer.pk:
+        missing = object()
+        old_values = [peer.get_loaded_value(field, missing) for field in ('interface', 'address', 'public_key')]
+        if missing in old_values:
+            old_values = (WireguardPeer.objects
+                          .using(using)
+                          .filter(pk=peer.pk)
+                          .values_list('interface_id', 'address', 'public_key')
+                          .first()) or (None, None, None)
+        old_interface_id, old_address, old_public_key = old_values
+
+    old_interface = interface
+    if old_interface_id is not None and old_interface_id != peer.interface_id:
+        # the peer moved to another interface
+        old_interface = WireguardInterface.objects.using(using).get(pk=old_interface_id)
 
     if not peer.address:
-        for address in interface.wg.get_ip_addresses():
-            address = ipaddress.IPv4Interface(address)
-            interface_address = str(address.ip)
-            subnet = address.network
-
-            # fetch other peers for checks
-            peers = WireguardPeer.objects.all().only('address')
-
-            # auto assign IP address
-            peer_addresses = [peer.address for peer in peers]
-            peer_addresses.append(interface_address)
-            if not peer.address:
-                for host in subnet.hosts():
-                    if str(host) not in peer_addresses:
-                        peer.address = str(host)
-                        break
-                else:
-                    continue
-            break
-        else:
+        # auto assign IP address
+        peer.address = interface.allocate_address()
+        if not peer.address:
             raise RuntimeWarning("WireGuard interface's subnets have no available IP left")
+    elif peer.address != old_address or old_interface is not interface:
+        interface.reserve_address(peer.address)
+
+    if old_address and (old_address != peer.address or old_interface is not interface):
+        old_interface.release_address(old_address)
 
     if not peer.private_key and not peer.public_key:
         if settings.WIREGUARD_STORE_PRIVATE_KEYS:
@@ -200,12 +1210,57 @@ def sync_wireguard_peer(sender, **kwargs):
     if peer.private_key:
         peer.public_key = str(PrivateKey(peer.private_key).public_key())
 
-    # update/create the wireguard peer
-    interface.wg.set_peer(peer.public_key,
-                          *peer.get_interface_allowed_ips())
+    if old_public_key and (old_public_key != peer.public_key or old_interface is not interface):
+        sync_queue.queue_peer_removal(old_interface.name, old_public_key, using=using)
+
+
+@receiver(post_save, sender=WireguardPeer)
+def queue_wireguard_peer(sender, **kwargs):
+    peer: WireguardPeer = kwargs['instance']
+    # update/create the wireguard peer once the transaction commits, if the kernel is affected
+    if peer.has_kernel_changes():
+        sync_queue.queue_peers(peer.public_key, using=kwargs['using'])
+
+
+@receiver(post_save, sender=WireguardPeer)
+def rebuild_peer_networks(sender, **kwargs):
+    peer: WireguardPeer = kwargs['instance']
+    changed = peer.get_changed_fields()
+    # the rows hold a copy of the interface
+    fields = changed.intersection(WireguardPeerNetwork.FIELDS)
+    if 'interface' in changed:
+        fields = WireguardPeerNetwork.FIELDS
+    if fields:
+        WireguardPeerNetwork.rebuild([peer], fields, using=kwargs['using'])
+
+
+@receiver(post_save, sender=WireguardInterface)
+def sync_wireguard_address_pools(sender, **kwargs):
+    interface: WireguardInterface = kwargs['instance']
+    changed = interface.get_changed_fields()
+    if 'address' in changed:
+        interface.sync_address_pools(interface.get_loaded_value('address'))
+    if interface.has_kernel_changes():
+        sync_queue.queue_interface(interface, using=kwargs['using'])
 
 
 @receiver(pre_delete, sender=WireguardPeer)
 def delete_peer(sender, **kwargs):
     peer: WireguardPeer = kwargs['instance']
-    peer.interface.wg.remove_peers(peer.public_key)
+    deletion = _PeerDeletion.get(kwargs['using'])
+    interface_name = deletion.get_interface_name(peer) if deletion else peer.interface.name
+    sync_queue.queue_peer_removal(interface_name, peer.public_key, using=kwargs['using'])
+
+
+@receiver(post_delete, sender=WireguardPeer)
+def release_peer_address(sender, **kwargs):
+    peer: WireguardPeer = kwargs['instance']
+    deletion = _PeerDeletion.get(kwargs['using'])
+    if deletion is not None:
+        # released once the whole delete is done
+        deletion.add(peer)
+        return
+    if peer.address:
+        peer.interface.release_address(peer.address)
+    # the networks are deleted with the peer
+    _send_peer_networks_changed(kwargs['using'])
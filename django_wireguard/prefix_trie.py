@@ -0,0 +1,89 @@
+"""
+Binary prefix trie of IPv4 networks, used to find AllowedIPs claimed by several peers.
+
+WireGuard routes a packet to the peer with the most specific AllowedIPs entry containing its destination,
+and moves an entry to the last peer configured with it. Two peers claiming the same network therefore break
+routing for one of them, while nested networks are legal but shadow part of the broader one.
+"""
+import ipaddress
+from typing import Any, Iterator, List, NamedTuple, Tuple
+
+# trie nodes are lists, much cheaper than objects at the scale of an interface
+_ZERO, _ONE, _NETWORK, _OWNERS = range(4)
+
+
+class Conflict(NamedTuple):
+    """``network`` claimed by ``owner`` overlaps ``other_network``, claimed by ``other_owner``."""
+    network: ipaddress.IPv4Network
+    owner: Any
+    other_network: ipaddress.IPv4Network
+    other_owner: Any
+
+    @property
+    def nested(self) -> bool:
+        return self.network != self.other_network
+
+
+class PrefixTrie:
+    """
+    Networks and the owners claiming them, indexed bit by bit.
+
+    Adding a network walks at most 32 nodes to find the identical and broader networks,
+    so a whole interface is checked in linear time instead of comparing every pair of peers.
+
+    :param nested: also report networks nested in each other as conflicts, not only identical ones.
+    """
+    __slots__ = ('root', 'nested')
+
+    def __init__(self, nested: bool = False):
+        self.root = [None, None, None, []]
+        self.nested = nested
+
+    def add(self, network: ipaddress.IPv4Network, owner: Any) -> List[Conflict]:
+        """
+        Record that ``owner`` claims ``network``.
+
+        :return: the conflicts with the networks previously added by other owners.
+        """
+        conflicts = []
+        node = self.root
+        address = int(network.network_address)
+        nested = self.nested
+        for depth in range(network.prefixlen):
+            if nested and node[_OWNERS]:
+                conflicts.extend(Conflict(network, owner, node[_NETWORK], other)
+                                 for other in node[_OWNERS] if other != owner)
+            bit = (address >> (31 - depth)) & 1
+            child = node[bit]
+            if child is None:
+                child = node[bit] = [None, None, None, []]
+            node = child
+
+        conflicts.extend(Conflict(network, owner, network, other) for other in node[_OWNERS] if other != owner)
+        if nested:
+            for other_network, others in self._iter_below(node):
+                conflicts.extend(Conflict(network, owner, other_network, other) for other in others if other != owner)
+
+        node[_NETWORK] = network
+        if owner not in node[_OWNERS]:
+            node[_OWNERS].append(owner)
+        return conflicts
+
+    def get_owners(self, network: ipaddress.IPv4Network) -> List[Any]:
+        """Owners claiming exactly ``network``."""
+        node = self.root
+        address = int(network.network_address)
+        for depth in range(network.prefixlen):
+            node = node[(address >> (31 - depth)) & 1]
+            if node is None:
+                return []
+        return list(node[_OWNERS])
+
+    @staticmethod
+    def _iter_below(node: list) -> Iterator[Tuple[ipaddress.IPv4Network, List[Any]]]:
+        stack = [child for child in node[:_NETWORK] if child is not None]
+        while stack:
+            node = stack.pop()
+            if node[_OWNERS]:
+                yield node[_NETWORK], node[_OWNERS]
+            stack.extend(child for child in node[:_NETWORK] if child is not None)
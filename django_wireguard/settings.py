@@ -1,5 +1,28 @@
+import os
+import tempfile
+
 from django.conf import settings
 
+WIREGUARD_ASYNC_WORKERS = getattr(settings, 'WIREGUARD_ASYNC_WORKERS', 4)
+WIREGUARD_BACKEND = getattr(settings, 'WIREGUARD_BACKEND', 'django_wireguard.backends.netlink.NetlinkBackend')
+WIREGUARD_MODE = getattr(settings, 'WIREGUARD_MODE', 'local')
+WIREGUARD_AGENT_INTERVAL = getattr(settings, 'WIREGUARD_AGENT_INTERVAL', 2)
+WIREGUARD_AGENT_FULL_SYNC_INTERVAL = getattr(settings, 'WIREGUARD_AGENT_FULL_SYNC_INTERVAL', 300)
 WIREGUARD_ENDPOINT = getattr(settings, 'WIREGUARD_ENDPOINT', 'localhost')
 WIREGUARD_STORE_PRIVATE_KEYS = getattr(settings, 'WIREGUARD_STORE_PRIVATE_KEYS', True)
 WIREGUARD_WAGTAIL_SHOW_IN_SETTINGS = getattr(settings, 'WIREGUARD_WAGTAIL_SHOW_IN_SETTINGS', True)
+WIREGUARD_SYNC_CHUNK_SIZE = getattr(settings, 'WIREGUARD_SYNC_CHUNK_SIZE', 2000)
+WIREGUARD_SYNC_WORKERS = getattr(settings, 'WIREGUARD_SYNC_WORKERS', 1)
+WIREGUARD_ALLOW_NESTED_ALLOWED_IPS = getattr(settings, 'WIREGUARD_ALLOW_NESTED_ALLOWED_IPS', True)
+WIREGUARD_ALLOCATION_RETRIES = getattr(settings, 'WIREGUARD_ALLOCATION_RETRIES', 10)
+WIREGUARD_STATS_INTERVAL = getattr(settings, 'WIREGUARD_STATS_INTERVAL', 10)
+WIREGUARD_STATS_MINUTE_RETENTION = getattr(settings, 'WIREGUARD_STATS_MINUTE_RETENTION', 24 * 60 * 60)
+WIREGUARD_STATS_HOUR_RETENTION = getattr(settings, 'WIREGUARD_STATS_HOUR_RETENTION', 90 * 24 * 60 * 60)
+WIREGUARD_METRICS_CACHE_TTL = getattr(settings, 'WIREGUARD_METRICS_CACHE_TTL', 5)
+WIREGUARD_PEER_CACHE_SIZE = getattr(settings, 'WIREGUARD_PEER_CACHE_SIZE', 10000)
+WIREGUARD_PEER_CACHE_TIMEOUT = getattr(settings, 'WIREGUARD_PEER_CACHE_TIMEOUT', 60)
+WIREGUARD_CONFIG_CACHE_TIMEOUT = getattr(settings, 'WIREGUARD_CONFIG_CACHE_TIMEOUT', 24 * 60 * 60)
+WIREGUARD_CONFIG_DIR = getattr(settings, 'WIREGUARD_CONFIG_DIR', os.path.join(tempfile.gettempdir(), 'django_wireguard'))
+WIREGUARD_STARTUP_SYNC = getattr(settings, 'WIREGUARD_STARTUP_SYNC', 'once')
+WIREGUARD_STARTUP_SYNC_LOCK = getattr(settings, 'WIREGUARD_STARTUP_SYNC_LOCK',
+                                      os.path.join(tempfile.gettempdir(), 'django_wireguard.sync.lock'))
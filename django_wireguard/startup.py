@@ -0,0 +1,108 @@
+"""
+Kernel sync at process start, driven by ``WIREGUARD_STARTUP_SYNC``:
+
+* ``once``: the first process started since the host booted reconciles every interface, the others
+  skip it. The lock file ``WIREGUARD_STARTUP_SYNC_LOCK`` records the boot id of the last sync;
+* ``lazy``: each process reconciles an interface right before programming it for the first time;
+* ``always``: every process reconciles every interface when Django starts;
+* ``off``: never, run ``manage.py wg_sync`` from the init system instead.
+
+Processes in controller mode never sync, ``manage.py wg_agent`` does it on the WireGuard host.
+
+Once the devices are in sync, model changes keep them so through :mod:`django_wireguard.sync_queue`.
+"""
+import fcntl
+import logging
+import threading
+from typing import Iterable, Set
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, OperationalError
+
+from django_wireguard import settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ('once', 'lazy', 'always', 'off')
+
+_synced: Set[str] = set()
+_synced_lock = threading.Lock()
+
+
+def get_boot_id() -> str:
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as boot_id:
+            return boot_id.read().strip()
+    except OSError:
+        return ''
+
+
+def sync_interfaces(names: Iterable[str] = (), using: str = DEFAULT_DB_ALIAS):
+    """Reconcile the interfaces named ``names``, all of them if empty."""
+    from django_wireguard.models import WireguardInterface
+    from django_wireguard.sync_wg import reconcile_interfaces
+
+    interfaces = WireguardInterface.objects.using(using).all()
+    names = list(names)
+    if names:
+        interfaces = interfaces.filter(name__in=names)
+    return reconcile_interfaces(interfaces)
+
+
+def sync_once_per_boot(force: bool = False) -> bool:
+    """
+    Reconcile every interface unless it was already done since the host booted.
+
+    Processes starting while another one is syncing don't wait for it.
+
+    :param force: sync even if already done, recording it for the processes starting later.
+    :return: whether this process synced.
+    """
+    boot_id = get_boot_id()
+    with open(settings.WIREGUARD_STARTUP_SYNC_LOCK, 'a+') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if force else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        try:
+            lock_file.seek(0)
+            if not force and boot_id and lock_file.read().strip() == boot_id:
+                return False
+            sync_interfaces()
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(boot_id)
+            return True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_synced(names: Iterable[str], using: str = DEFAULT_DB_ALIAS):
+    """In ``lazy`` mode, reconcile the interfaces this process did not program yet."""
+    if settings.WIREGUARD_STARTUP_SYNC != 'lazy':
+        return
+    with _synced_lock:
+        pending = set(names) - _synced
+        _synced.update(pending)
+    if pending:
+        sync_interfaces(pending, using=using)
+
+
+def startup_sync():
+    """Run the startup sync of ``WIREGUARD_STARTUP_SYNC``, called when Django starts."""
+    if settings.WIREGUARD_MODE not in ('local', 'controller'):
+        raise ImproperlyConfigured(f"WIREGUARD_MODE must be local or controller, not {settings.WIREGUARD_MODE!r}.")
+    mode = settings.WIREGUARD_STARTUP_SYNC
+    if mode not in MODES:
+        raise ImproperlyConfigured(f"WIREGUARD_STARTUP_SYNC must be one of {', '.join(MODES)}, not {mode!r}.")
+    if settings.WIREGUARD_MODE == 'controller':
+        return
+
+    try:
+        if mode == 'always':
+            sync_interfaces()
+        elif mode == 'once':
+            sync_once_per_boot()
+    except OperationalError:
+        # database not migrated yet
+        logger.debug("Skipping the startup sync, the database is not ready.", exc_info=True)
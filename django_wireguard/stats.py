@@ -0,0 +1,252 @@
+"""
+Per-peer traffic and handshake statistics.
+
+:class:`StatsCollector` dumps every device once per poll and keeps the per-minute traffic
+in memory. The database is only written when a minute ends: one
+:class:`~django_wireguard.models.WireguardPeerTraffic` row per peer that had traffic, plus the
+:class:`~django_wireguard.models.WireguardPeerStatus` of the peers whose state changed.
+A new collector resumes from the stored statuses and adds to the rows of the minute it starts in.
+Minute rows are rolled up into hour rows once their hour has ended, and both are pruned after their retention.
+"""
+import datetime
+import logging
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardInterface, WireguardPeer, WireguardPeerStatus, WireguardPeerTraffic
+from django_wireguard.utils import chunked
+from django_wireguard.wireguard import WireGuard, WireGuardException
+
+logger = logging.getLogger(__name__)
+
+MINUTE = datetime.timedelta(minutes=1)
+HOUR = datetime.timedelta(hours=1)
+
+
+def truncate(moment: datetime.datetime, period: datetime.timedelta) -> datetime.datetime:
+    return moment - datetime.timedelta(seconds=moment.timestamp() % period.total_seconds())
+
+
+def rollup_hour(hour: datetime.datetime) -> int:
+    """
+    Aggregate the minute samples of ``hour`` into hour samples, replacing previous ones.
+
+    :return: number of hour samples written.
+    """
+    rows = (WireguardPeerTraffic.objects
+            .filter(resolution=WireguardPeerTraffic.MINUTE, start__gte=hour, start__lt=hour + HOUR)
+            .values('peer_id')
+            .annotate(rx=Sum('rx_bytes'), tx=Sum('tx_bytes')))
+    samples = [WireguardPeerTraffic(peer_id=row['peer_id'], resolution=WireguardPeerTraffic.HOUR,
+                                    start=hour, rx_bytes=row['rx'], tx_bytes=row['tx'])
+               for row in rows]
+    with transaction.atomic():
+        WireguardPeerTraffic.objects.filter(resolution=WireguardPeerTraffic.HOUR, start=hour).delete()
+        WireguardPeerTraffic.objects.bulk_create(samples, batch_size=settings.WIREGUARD_SYNC_CHUNK_SIZE)
+    return len(samples)
+
+
+def get_pending_hours(now: Optional[datetime.datetime] = None) -> Set[datetime.datetime]:
+    """
+    Hours ended before ``now`` with minute samples but not rolled up yet.
+
+    Only the minutes after the last rolled up hour are read, so this stays cheap however many samples are kept.
+    """
+    now = now or timezone.now()
+    minutes = WireguardPeerTraffic.objects.filter(resolution=WireguardPeerTraffic.MINUTE,
+                                                  start__lt=truncate(now, HOUR))
+    last_hour = (WireguardPeerTraffic.objects
+                 .filter(resolution=WireguardPeerTraffic.HOUR)
+                 .aggregate(last=Max('start'))['last'])
+    if last_hour is not None:
+        minutes = minutes.filter(start__gte=last_hour + HOUR)
+    return {truncate(start, HOUR) for start in minutes.order_by().values_list('start', flat=True).distinct()}
+
+
+def prune(now: Optional[datetime.datetime] = None) -> int:
+    """
+    Delete samples older than their retention.
+
+    :return: number of deleted samples.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    for resolution, retention in ((WireguardPeerTraffic.MINUTE, settings.WIREGUARD_STATS_MINUTE_RETENTION),
+                                  (WireguardPeerTraffic.HOUR, settings.WIREGUARD_STATS_HOUR_RETENTION)):
+        deleted += (WireguardPeerTraffic.objects
+                    .filter(resolution=resolution, start__lt=now - datetime.timedelta(seconds=retention))
+                    .delete()[0])
+    return deleted
+
+
+class StatsCollector:
+    """
+    Poll the kernel and store rolled up peer statistics.
+
+    Call :meth:`poll` every ``WIREGUARD_STATS_INTERVAL`` seconds, and :meth:`flush` before exiting.
+    """
+
+    def __init__(self, interfaces=None):
+        self.interfaces = interfaces
+        self.minute: Optional[datetime.datetime] = None
+        # public key -> peer id, reloaded every minute to pick up new peers
+        self.peer_ids: Dict[str, int] = {}
+        # peer id -> last kernel counters, to compute deltas
+        self.counters: Dict[int, Tuple[int, int]] = {}
+        # peer id -> traffic of the current minute
+        self.traffic: Dict[int, list] = defaultdict(lambda: [0, 0])
+        # peer id -> status to store at the end of the minute, only for peers whose state changed
+        self.statuses: Dict[int, WireguardPeerStatus] = {}
+        # peer id -> last stored (endpoint, last handshake, rx bytes, tx bytes)
+        self.stored: Dict[int, tuple] = {}
+        self.pending: Dict[int, tuple] = {}
+
+    def get_interfaces(self):
+        if self.interfaces is None:
+            return WireguardInterface.objects.all()
+        return self.interfaces
+
+    def load_peer_ids(self):
+        self.peer_ids = dict(WireguardPeer.objects
+                             .filter(interface__in=self.get_interfaces())
+                             .values_list('public_key', 'pk')
+                             .iterator(chunk_size=settings.WIREGUARD_SYNC_CHUNK_SIZE))
+        if not self.counters:
+            self.load_statuses()
+
+    def load_statuses(self):
+        """
+        Resume from the statuses stored by a previous collector.
+
+        Their counters are the baseline of the first poll, so the traffic since the last flush is accounted
+        even when the collector runs once per cron job.
+        """
+        statuses = (WireguardPeerStatus.objects
+                    .filter(peer__interface__in=self.get_interfaces())
+                    .values_list('peer_id', 'endpoint', 'last_handshake', 'rx_bytes', 'tx_bytes')
+                    .iterator(chunk_size=settings.WIREGUARD_SYNC_CHUNK_SIZE))
+        for peer_id, endpoint, last_handshake, rx_bytes, tx_bytes in statuses:
+            self.counters[peer_id] = (rx_bytes, tx_bytes)
+            self.stored[peer_id] = (endpoint, int(last_handshake.timestamp()) if last_handshake else 0,
+                                    rx_bytes, tx_bytes)
+
+    def poll(self, now: Optional[datetime.datetime] = None):
+        """Dump every device once and account the traffic since the previous poll."""
+        now = now or timezone.now()
+        minute = truncate(now, MINUTE)
+        if self.minute is not None and minute != self.minute:
+            self.flush(now)
+        if self.minute is None:
+            self.load_peer_ids()
+        self.minute = minute
+
+        for interface_name in self.get_interfaces().values_list('name', flat=True):
+            try:
+                peers = WireGuard.get_interface(interface_name).get_peers()
+            except WireGuardException:
+                logger.warning("Skipping statistics of missing interface %s.", interface_name)
+                continue
+            for public_key, state in peers.items():
+                peer_id = self.peer_ids.get(public_key)
+                if peer_id is not None:
+                    self.account(peer_id, state, now)
+
+    def account(self, peer_id: int, state: dict, now: datetime.datetime):
+        rx_bytes, tx_bytes = state['rx_bytes'], state['tx_bytes']
+        last = self.counters.get(peer_id)
+        self.counters[peer_id] = (rx_bytes, tx_bytes)
+        if last is None:
+            # first sight, only the baseline is known
+            delta = (0, 0)
+        else:
+            # counters start over when the peer is re-added
+            delta = (rx_bytes - last[0] if rx_bytes >= last[0] else rx_bytes,
+                     tx_bytes - last[1] if tx_bytes >= last[1] else tx_bytes)
+
+        if delta != (0, 0):
+            traffic = self.traffic[peer_id]
+            traffic[0] += delta[0]
+            traffic[1] += delta[1]
+
+        endpoint = state['endpoint'] or ''
+        current = (endpoint, state['last_handshake'], rx_bytes, tx_bytes)
+        if self.stored.get(peer_id) != current:
+            self.pending[peer_id] = current
+            last_handshake = None
+            if state['last_handshake']:
+                last_handshake = datetime.datetime.fromtimestamp(state['last_handshake'], tz=datetime.timezone.utc)
+            self.statuses[peer_id] = WireguardPeerStatus(peer_id=peer_id,
+                                                         endpoint=endpoint,
+                                                         last_handshake=last_handshake,
+                                                         rx_bytes=rx_bytes,
+                                                         tx_bytes=tx_bytes,
+                                                         updated=now)
+
+    def flush(self, now: Optional[datetime.datetime] = None):
+        """Store the current minute, roll up the ended hours and prune the expired samples."""
+        now = now or timezone.now()
+        if self.minute is None:
+            return
+
+        samples = [WireguardPeerTraffic(peer_id=peer_id, resolution=WireguardPeerTraffic.MINUTE,
+                                        start=self.minute, rx_bytes=rx_bytes, tx_bytes=tx_bytes)
+                   for peer_id, (rx_bytes, tx_bytes) in self.traffic.items()]
+        statuses = list(self.statuses.values())
+
+        with transaction.atomic():
+            # peers deleted in the meantime are skipped
+            existing_peers = set()
+            existing_statuses = set()
+            # peer id -> sample of the same minute stored by a previous collector
+            existing_samples = {}
+            peer_ids = list(self.statuses.keys() | self.traffic.keys())
+            for chunk in chunked(peer_ids, settings.WIREGUARD_SYNC_CHUNK_SIZE):
+                existing_peers.update(WireguardPeer.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+                existing_statuses.update(WireguardPeerStatus.objects
+                                         .filter(peer_id__in=chunk)
+                                         .values_list('peer_id', flat=True))
+                existing_samples.update((sample.peer_id, sample) for sample in WireguardPeerTraffic.objects
+                                        .select_for_update()
+                                        .filter(resolution=WireguardPeerTraffic.MINUTE, start=self.minute,
+                                                peer_id__in=chunk))
+
+            merged = []
+            for sample in samples:
+                existing = existing_samples.get(sample.peer_id)
+                if existing is not None:
+                    existing.rx_bytes += sample.rx_bytes
+                    existing.tx_bytes += sample.tx_bytes
+                    merged.append(existing)
+            WireguardPeerTraffic.objects.bulk_update(merged, ['rx_bytes', 'tx_bytes'],
+                                                     batch_size=settings.WIREGUARD_SYNC_CHUNK_SIZE)
+            WireguardPeerTraffic.objects.bulk_create([sample for sample in samples
+                                                      if sample.peer_id in existing_peers
+                                                      and sample.peer_id not in existing_samples],
+                                                     batch_size=settings.WIREGUARD_SYNC_CHUNK_SIZE)
+            WireguardPeerStatus.objects.bulk_update([status for status in statuses
+                                                     if status.peer_id in existing_statuses],
+                                                    ['endpoint', 'last_handshake', 'rx_bytes', 'tx_bytes', 'updated'],
+                                                    batch_size=settings.WIREGUARD_SYNC_CHUNK_SIZE)
+            WireguardPeerStatus.objects.bulk_create([status for status in statuses
+                                                     if status.peer_id in existing_peers - existing_statuses],
+                                                    batch_size=settings.WIREGUARD_SYNC_CHUNK_SIZE)
+
+        # also the hours a previous collector didn't roll up, e.g. one run per cron job or interrupted
+        hours = get_pending_hours(now)
+        if truncate(now, HOUR) > truncate(self.minute, HOUR):
+            # rolled up again if a previous collector already did, the minute was just stored
+            hours.add(truncate(self.minute, HOUR))
+        for hour in sorted(hours):
+            rollup_hour(hour)
+        prune(now)
+
+        self.stored.update(self.pending)
+        self.pending.clear()
+        self.traffic.clear()
+        self.statuses.clear()
+        self.minute = None
@@ -0,0 +1,224 @@
+"""
+Transaction aware kernel sync.
+
+Model changes only record *what* must be synced: interface ids, peer public keys and
+public keys to remove. The kernel is programmed once the transaction commits, reading
+the committed rows back, so repeated edits collapse into a single batched update and
+rolled back changes never reach the kernel.
+
+With ``WIREGUARD_MODE = 'controller'`` the kernel is left alone: the flush bumps the revision of the
+affected interfaces instead, and ``manage.py wg_agent`` reconciles them on the WireGuard host.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+from typing import Dict, Iterator, List, Set
+
+from asgiref.sync import sync_to_async
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+
+from django_wireguard import settings
+from django_wireguard.instrumentation import instrument
+from django_wireguard.utils import chunked, get_peer_allowed_ips
+from django_wireguard.wireguard import WireGuard, run_in_executor
+
+
+class SyncBatch:
+    __slots__ = ('interfaces', 'peers', 'removed_peers')
+
+    def __init__(self):
+        self.interfaces: Set[int] = set()
+        self.peers: Set[str] = set()
+        self.removed_peers: Dict[str, Set[str]] = defaultdict(set)
+
+    def __bool__(self):
+        return bool(self.interfaces or self.peers or self.removed_peers)
+
+    def update(self, other: 'SyncBatch'):
+        self.interfaces.update(other.interfaces)
+        self.peers.update(other.peers)
+        for interface_name, public_keys in other.removed_peers.items():
+            self.removed_peers[interface_name].update(public_keys)
+
+
+_local = threading.local()
+
+
+def _is_scheduled(using: str) -> bool:
+    connection = transaction.get_connection(using)
+    return any(getattr(entry[1], 'func', None) is flush for entry in connection.run_on_commit)
+
+
+def get_batch(using: str = DEFAULT_DB_ALIAS) -> SyncBatch:
+    """Pending changes of the current thread for database ``using``."""
+    batches = getattr(_local, 'batches', None)
+    if batches is None:
+        batches = _local.batches = {}
+    batch = batches.get(using)
+    # a batch without a scheduled flush belongs to a rolled back transaction
+    if batch is None or (batch and not _is_scheduled(using)):
+        batch = batches[using] = SyncBatch()
+    return batch
+
+
+def _schedule(using: str):
+    # registered on every change: whichever callback survives savepoint rollbacks runs the flush,
+    # the following ones find an empty batch
+    transaction.on_commit(partial(flush, using), using=using)
+
+
+def queue_interface(interface, using: str = DEFAULT_DB_ALIAS):
+    get_batch(using).interfaces.add(interface.pk)
+    _schedule(using)
+
+
+def queue_peers(*public_keys: str, using: str = DEFAULT_DB_ALIAS):
+    get_batch(using).peers.update(public_keys)
+    _schedule(using)
+
+
+def queue_peer_removal(interface_name: str, *public_keys: str, using: str = DEFAULT_DB_ALIAS):
+    get_batch(using).removed_peers[interface_name].update(public_keys)
+    _schedule(using)
+
+
+def bump_revisions(batch: SyncBatch, using: str = DEFAULT_DB_ALIAS):
+    """Bump the revision of every interface affected by ``batch``, so the agent reconciles them."""
+    from django_wireguard.models import WireguardInterface, WireguardPeer
+
+    with instrument('sync.bump_revisions', interfaces=len(batch.interfaces), peers=len(batch.peers)):
+        names = set(batch.removed_peers)
+        for chunk in chunked(batch.peers, settings.WIREGUARD_SYNC_CHUNK_SIZE):
+            names.update(WireguardPeer.objects
+                         .using(using)
+                         .filter(public_key__in=chunk)
+                         .values_list('interface__name', flat=True)
+                         .distinct())
+        (WireguardInterface.objects
+         .using(using)
+         .filter(Q(pk__in=batch.interfaces) | Q(name__in=names))
+         .update(revision=F('revision') + 1))
+
+
+def flush(using: str = DEFAULT_DB_ALIAS):
+    """Program the kernel with the committed state of every pending change."""
+    batches = getattr(_local, 'batches', {})
+    batch = batches.get(using)
+    if not batch:
+        return
+    batches[using] = SyncBatch()
+
+    collector = getattr(_local, 'deferred', {}).get(using)
+    if collector is not None:
+        collector.update(batch)
+        return
+    apply_batch(batch, using)
+
+
+@contextmanager
+def deferred(using: str = DEFAULT_DB_ALIAS) -> Iterator[SyncBatch]:
+    """
+    Collect the changes committed in the block into the yielded batch instead of programming the kernel.
+
+    Changes committed after the block, e.g. by an outer transaction, are flushed as usual.
+    """
+    collectors = getattr(_local, 'deferred', None)
+    if collectors is None:
+        collectors = _local.deferred = {}
+    previous = collectors.get(using)
+    batch = collectors[using] = SyncBatch()
+    try:
+        yield batch
+    finally:
+        if previous is None:
+            del collectors[using]
+        else:
+            previous.update(batch)
+            collectors[using] = previous
+
+
+class SyncChanges:
+    """Kernel updates of a batch, as read from the database by :func:`read_changes`."""
+    __slots__ = ('interfaces', 'removed_peers', 'peers')
+
+    def __init__(self):
+        self.interfaces = []
+        self.removed_peers: Dict[str, Set[str]] = {}
+        self.peers: Dict[str, List[dict]] = defaultdict(list)
+
+
+def read_changes(batch: SyncBatch, using: str = DEFAULT_DB_ALIAS) -> SyncChanges:
+    """Read the committed state of the changes in ``batch``, without touching the kernel."""
+    from django_wireguard.models import WireguardInterface, WireguardPeer
+    from django_wireguard.startup import ensure_synced
+
+    changes = SyncChanges()
+    changes.interfaces = list(WireguardInterface.objects.using(using).filter(pk__in=batch.interfaces))
+    with instrument('sync.read_peers'):
+        for chunk in chunked(batch.peers, settings.WIREGUARD_SYNC_CHUNK_SIZE):
+            rows = (WireguardPeer.objects
+                    .using(using)
+                    .filter(public_key__in=chunk)
+                    .values_list('interface__name', 'public_key', 'address', 'interface_allowed_ips'))
+            for interface_name, public_key, address, interface_allowed_ips in rows:
+                changes.peers[interface_name].append(WireGuard.build_peer(public_key,
+                                                                          *get_peer_allowed_ips(address,
+                                                                                                interface_allowed_ips),
+                                                                          replace_allowed_ips=True))
+
+    for interface_name, public_keys in batch.removed_peers.items():
+        # skip keys added back, or whose removal was rolled back
+        for chunk in chunked(list(public_keys), settings.WIREGUARD_SYNC_CHUNK_SIZE):
+            public_keys = public_keys.difference(WireguardPeer.objects
+                                                 .using(using)
+                                                 .filter(interface__name=interface_name, public_key__in=chunk)
+                                                 .values_list('public_key', flat=True))
+        if public_keys:
+            changes.removed_peers[interface_name] = public_keys
+
+    ensure_synced({interface.name for interface in changes.interfaces}
+                  | changes.peers.keys() | batch.removed_peers.keys(),
+                  using=using)
+    return changes
+
+
+def apply_changes(changes: SyncChanges):
+    """Program the kernel with ``changes``, without touching the database."""
+    with instrument('sync.interfaces'):
+        for interface in changes.interfaces:
+            wg = interface.wg
+            wg.set_interface(private_key=interface.private_key,
+                             listen_port=interface.listen_port)
+            wg.set_ip_addresses(*interface.get_address_list())
+
+    with instrument('sync.remove_peers'):
+        for interface_name, public_keys in changes.removed_peers.items():
+            WireGuard.get_or_create_interface(interface_name).remove_peers(*public_keys)
+
+    with instrument('sync.update_peers'):
+        for interface_name, interface_peers in changes.peers.items():
+            WireGuard.get_or_create_interface(interface_name).update_peers(interface_peers)
+
+
+def apply_batch(batch: SyncBatch, using: str = DEFAULT_DB_ALIAS):
+    if settings.WIREGUARD_MODE == 'controller':
+        return bump_revisions(batch, using)
+
+    with instrument('sync.flush', interfaces=len(batch.interfaces), peers=len(batch.peers)):
+        apply_changes(read_changes(batch, using))
+
+
+async def aapply_batch(batch: SyncBatch, using: str = DEFAULT_DB_ALIAS):
+    """
+    Async counterpart of :func:`apply_batch`.
+
+    The database is read in Django's sync thread and the kernel is programmed on the WireGuard executor,
+    so the event loop is never blocked.
+    """
+    if settings.WIREGUARD_MODE == 'controller':
+        return await sync_to_async(bump_revisions)(batch, using)
+
+    changes = await sync_to_async(read_changes)(batch, using)
+    await run_in_executor(apply_changes, changes)
@@ -1,24 +1,247 @@
-from typing import Union, Optional
+import asyncio
+import ipaddress
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Union, Optional, Iterator, Iterable, Dict, List, Tuple
 
+from asgiref.sync import sync_to_async
+from django.db import connections
 from django.db.models import QuerySet
 
+from django_wireguard import settings
+from django_wireguard.instrumentation import instrument
 from django_wireguard.models import WireguardInterface
+from django_wireguard.utils import get_peer_allowed_ips
+from django_wireguard.wireguard import WireGuard, WireGuardException, run_in_executor
+
+
+def iter_interface_peers(interface: WireguardInterface) -> Iterator[dict]:
+    """
+    Stream the kernel configuration of every peer of ``interface``.
+
+    Rows are fetched in chunks of ``WIREGUARD_SYNC_CHUNK_SIZE`` without building model instances.
+    """
+    peers = (interface.peers
+             .order_by()
+             .values_list('public_key', 'address', 'interface_allowed_ips')
+             .iterator(chunk_size=settings.WIREGUARD_SYNC_CHUNK_SIZE))
+    for public_key, address, interface_allowed_ips in peers:
+        yield WireGuard.build_peer(public_key,
+                                   *get_peer_allowed_ips(address, interface_allowed_ips))
+
+
+def normalize_allowed_ips(allowed_ips: Iterable[str]) -> frozenset:
+    """Normalize AllowedIPs the way the kernel reports them, host bits masked."""
+    return frozenset(str(ipaddress.ip_network(ip, strict=False)) for ip in allowed_ips)
+
+
+def diff_peers(current: Dict[str, dict],
+               desired: Iterable[dict]) -> Tuple[List[dict], List[str], List[Tuple[dict, List[str]]]]:
+    """
+    Compare the peers found on a device against the desired ones.
+
+    :param current: kernel peers keyed by public key, as returned by :meth:`WireGuard.get_peers`.
+    :param desired: peer dicts as built by :meth:`WireGuard.build_peer`.
+    :return: peers to add, public keys to remove and ``(peer, current AllowedIPs)`` pairs to update.
+    """
+    added = []
+    changed = []
+    seen = set()
+    for peer in desired:
+        public_key = peer['public_key']
+        seen.add(public_key)
+        state = current.get(public_key)
+        if state is None:
+            added.append(peer)
+        elif (set(peer['allowed_ips']) != set(state['allowed_ips'])
+              and normalize_allowed_ips(peer['allowed_ips']) != normalize_allowed_ips(state['allowed_ips'])):
+            changed.append((peer, state['allowed_ips']))
+
+    removed = [public_key for public_key in current if public_key not in seen]
+    return added, removed, changed
+
+
+class InterfacePlan:
+    """
+    Changes required to bring a WireGuard device in line with its :class:`WireguardInterface`.
+
+    Build it with :func:`plan_interface`, print it with :meth:`describe` and run it with :meth:`apply`.
+    """
+
+    def __init__(self, interface: WireguardInterface):
+        self.interface = interface
+        self.exists = True
+        self.device = {}
+        self.addresses: Optional[List[str]] = None
+        self.added: List[dict] = []
+        self.removed: List[str] = []
+        self.changed: List[Tuple[dict, List[str]]] = []
+        self.timings: Dict[str, float] = {}
+
+    def __bool__(self):
+        return bool(not self.exists or self.device or self.addresses is not None
+                    or self.added or self.removed or self.changed)
+
+    @contextmanager
+    def timed(self, phase: str):
+        start = time.perf_counter()
+        try:
+            with instrument(f'reconcile.{phase}', interface=self.interface.name):
+                yield
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0) + time.perf_counter() - start
+
+    def iter_peer_updates(self) -> Iterator[dict]:
+        for public_key in self.removed:
+            yield {'public_key': public_key, 'remove': True}
+        yield from self.added
+        for peer, _ in self.changed:
+            yield {**peer, 'replace_allowed_ips': True}
+
+    def apply(self):
+        with self.timed('apply'):
+            wg = self.interface.wg
+            if self.device:
+                wg.set_interface(**self.device)
+            if self.addresses is not None:
+                wg.set_ip_addresses(*self.addresses)
+            wg.update_peers(self.iter_peer_updates())
+
+    def describe(self) -> List[str]:
+        lines = [f"interface {self.interface.name}"]
+        if not self.exists:
+            lines.append("  + device")
+        for key in self.device:
+            lines.append(f"  ~ {key.replace('_', ' ')}")
+        if self.addresses is not None:
+            lines.append(f"  ~ addresses: {', '.join(self.addresses)}")
+        for peer in self.added:
+            lines.append(f"  + peer {peer['public_key']}: {', '.join(peer['allowed_ips'])}")
+        for public_key in self.removed:
+            lines.append(f"  - peer {public_key}")
+        for peer, current in self.changed:
+            lines.append(f"  ~ peer {peer['public_key']}: "
+                         f"{', '.join(current)} -> {', '.join(peer['allowed_ips'])}")
+        if not self:
+            lines.append("  up to date")
+        lines.append("  timings: " + ', '.join(f"{phase} {seconds * 1000:.1f}ms"
+                                               for phase, seconds in self.timings.items()))
+        return lines
+
+
+def _dump_device(plan: InterfacePlan) -> Tuple[dict, List[str]]:
+    with plan.timed('dump'):
+        try:
+            wg = WireGuard.get_interface(plan.interface.name)
+        except WireGuardException:
+            plan.exists = False
+            return {'private_key': None, 'listen_port': None, 'peers': {}}, []
+        return wg.dump(), wg.get_ip_addresses(cached=False)
+
+
+def _diff_device(plan: InterfacePlan, device: dict, addresses: List[str]):
+    interface = plan.interface
+    with plan.timed('diff'):
+        if interface.private_key and device['private_key'] != interface.private_key:
+            plan.device['private_key'] = interface.private_key
+        if device['listen_port'] != interface.listen_port:
+            plan.device['listen_port'] = interface.listen_port
+
+        desired_addresses = [str(ipaddress.IPv4Interface(address)) for address in interface.get_address_list()]
+        if interface.address and set(desired_addresses) != set(addresses):
+            plan.addresses = desired_addresses
+
+        plan.added, plan.removed, plan.changed = diff_peers(device['peers'], iter_interface_peers(interface))
+
+
+def plan_interface(interface: WireguardInterface) -> InterfacePlan:
+    """
+    Dump the live device once and diff it against the database.
+
+    Nothing is written to the kernel, and a missing device is not created.
+    """
+    plan = InterfacePlan(interface)
+    _diff_device(plan, *_dump_device(plan))
+    return plan
+
+
+async def aplan_interface(interface: WireguardInterface) -> InterfacePlan:
+    """Async counterpart of :func:`plan_interface`, dumping the device on the WireGuard executor."""
+    plan = InterfacePlan(interface)
+    device, addresses = await run_in_executor(_dump_device, plan)
+    await sync_to_async(_diff_device)(plan, device, addresses)
+    return plan
+
+
+def _reconcile_interface(interface: WireguardInterface, dry_run: bool = False) -> InterfacePlan:
+    plan = plan_interface(interface)
+    if plan and not dry_run:
+        plan.apply()
+    return plan
+
+
+def _reconcile_interface_in_worker(interface: WireguardInterface, dry_run: bool = False) -> InterfacePlan:
+    try:
+        return _reconcile_interface(interface, dry_run)
+    finally:
+        # workers open their own database connections
+        connections.close_all()
+
+
+def reconcile_interfaces(queryset: Optional[Union[QuerySet, WireguardInterface]] = None,
+                         dry_run: bool = False, workers: Optional[int] = None) -> List[InterfacePlan]:
+    """
+    Apply only the differences between the database and the kernel devices.
+
+    :param queryset: interfaces to reconcile, all of them by default.
+    :param dry_run: compute the plans without applying them.
+    :param workers: number of interfaces reconciled at once, defaults to ``WIREGUARD_SYNC_WORKERS``.
+    :return: the computed plans.
+    """
+    if queryset is None:
+        queryset = WireguardInterface.objects.all()
+    elif isinstance(queryset, WireguardInterface):
+        queryset = [queryset]
+
+    workers = workers or settings.WIREGUARD_SYNC_WORKERS
+    if workers <= 1:
+        return [_reconcile_interface(interface, dry_run) for interface in queryset]
+
+    interfaces = list(queryset)
+    with ThreadPoolExecutor(max_workers=min(workers, len(interfaces) or 1),
+                            thread_name_prefix='wireguard-sync') as executor:
+        return list(executor.map(partial(_reconcile_interface_in_worker, dry_run=dry_run), interfaces))
 
 
 def sync_wireguard_interfaces(queryset: Optional[Union[QuerySet, WireguardInterface]] = None):
+    reconcile_interfaces(queryset)
+
+
+async def areconcile_interfaces(queryset: Optional[Union[QuerySet, WireguardInterface]] = None,
+                                dry_run: bool = False) -> List[InterfacePlan]:
+    """
+    Async counterpart of :func:`reconcile_interfaces`.
+
+    Interfaces are reconciled concurrently: the database is read in Django's sync thread and the devices
+    are dumped and programmed on the WireGuard executor, see ``WIREGUARD_ASYNC_WORKERS``.
+    """
     if queryset is None:
         queryset = WireguardInterface.objects.all()
     elif isinstance(queryset, WireguardInterface):
         queryset = [queryset]
 
-    for interface in queryset:
-        interface.wg.set_interface(private_key=interface.private_key,
-                                   listen_port=interface.listen_port)
+    async def reconcile(interface: WireguardInterface) -> InterfacePlan:
+        plan = await aplan_interface(interface)
+        if plan and not dry_run:
+            await run_in_executor(plan.apply)
+        return plan
+
+    interfaces = await sync_to_async(list)(queryset)
+    return list(await asyncio.gather(*map(reconcile, interfaces)))
 
-        if interface.address:
-            interface.wg.set_ip_addresses(*interface.get_address_list())
 
-        for peer in interface.peers.all():
-            # update/create the wireguard peer
-            interface.wg.set_peer(peer.public_key,
-                                  *peer.get_interface_allowed_ips())
+async def async_sync_wireguard_interfaces(queryset: Optional[Union[QuerySet, WireguardInterface]] = None):
+    """Async counterpart of :func:`sync_wireguard_interfaces`."""
+    await areconcile_interfaces(queryset)
@@ -0,0 +1,175 @@
+"""
+Whole-device apply, like ``wg syncconf``.
+
+The server side configuration of an interface and all its peers is rendered to a file in the ``wg(8)``
+format, then applied in one go: the file is diffed against a single dump of the live device, and the
+device attributes and the whole peer set are replaced with as few backend requests as possible.
+The same files can be fed to ``wg syncconf`` directly.
+"""
+import itertools
+import os
+import tempfile
+from typing import Iterable, List, Optional, TextIO, Union
+
+from django.db.models import QuerySet
+
+from django_wireguard import settings
+from django_wireguard.instrumentation import instrument
+from django_wireguard.models import WireguardInterface
+from django_wireguard.sync_wg import diff_peers, iter_interface_peers
+from django_wireguard.utils import clean_comma_separated_list
+from django_wireguard.wireguard import WireGuard, chunk_peers
+
+
+def render_config(interface: WireguardInterface, stream: TextIO) -> int:
+    """
+    Write the ``wg(8)`` configuration of ``interface`` to ``stream``, peers are streamed from the database.
+
+    :return: number of peers written.
+    """
+    stream.write(f"[Interface]\n"
+                 f"PrivateKey={interface.private_key}\n"
+                 f"ListenPort={interface.listen_port}\n")
+    count = 0
+    for peer in iter_interface_peers(interface):
+        stream.write(f"\n[Peer]\n"
+                     f"PublicKey={peer['public_key']}\n"
+                     f"AllowedIPs={', '.join(peer['allowed_ips'])}\n")
+        count += 1
+    return count
+
+
+def write_config(interface: WireguardInterface, directory: Optional[str] = None) -> str:
+    """
+    Render the configuration of ``interface`` to ``<directory>/<name>.conf``.
+
+    The file is readable by the owner only, as it holds the private key, and is replaced atomically
+    so readers never see a partial configuration.
+
+    :param directory: defaults to ``WIREGUARD_CONFIG_DIR``.
+    :return: path of the written file.
+    """
+    directory = directory or settings.WIREGUARD_CONFIG_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{interface.name}.conf")
+    fd, temp_path = tempfile.mkstemp(prefix=f".{interface.name}.", suffix='.conf', dir=directory)
+    try:
+        with open(fd, 'w') as stream:
+            render_config(interface, stream)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return path
+
+
+def parse_config(lines: Iterable[str]) -> dict:
+    """
+    Parse a ``wg(8)`` configuration.
+
+    :return: dict with ``private_key``, ``listen_port``, ``fwmark`` and the ``peers`` list,
+             in the format accepted by :meth:`WireGuard.update_peers`.
+    :raises ValueError: on malformed lines or unknown keys.
+    """
+    config = {'private_key': None, 'listen_port': None, 'fwmark': None, 'peers': []}
+    section = None
+    peer = None
+    for number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            section = line[1:-1].lower()
+            if section == 'peer':
+                peer = None
+            elif section != 'interface':
+                raise ValueError(f"Line {number}: unknown section {line}")
+            continue
+
+        key, separator, value = line.partition('=')
+        key, value = key.strip().lower(), value.strip()
+        if not separator or section is None:
+            raise ValueError(f"Line {number}: expected a key in a section")
+
+        if section == 'interface':
+            if key == 'privatekey':
+                config['private_key'] = value
+            elif key == 'listenport':
+                config['listen_port'] = int(value)
+            elif key == 'fwmark':
+                config['fwmark'] = 0 if value == 'off' else int(value, 0)
+            else:
+                raise ValueError(f"Line {number}: unknown interface key {key}")
+        elif key == 'publickey':
+            peer = {'public_key': value, 'allowed_ips': []}
+            config['peers'].append(peer)
+        elif peer is None:
+            raise ValueError(f"Line {number}: PublicKey must come first in a peer section")
+        elif key == 'allowedips':
+            peer['allowed_ips'].extend(clean_comma_separated_list(value))
+        elif key == 'presharedkey':
+            peer['preshared_key'] = value
+        elif key == 'persistentkeepalive':
+            peer['persistent_keepalive'] = 0 if value == 'off' else int(value)
+        elif key == 'endpoint':
+            host, _, port = value.rpartition(':')
+            peer['endpoint_addr'] = host.strip('[]')
+            peer['endpoint_port'] = int(port)
+        else:
+            raise ValueError(f"Line {number}: unknown peer key {key}")
+    return config
+
+
+def read_config(path: str) -> dict:
+    with open(path) as stream:
+        return parse_config(stream)
+
+
+def apply_config(backend, interface_name: str, config: dict) -> int:
+    """
+    Make the device ``interface_name`` match ``config``, removing every peer it does not list.
+
+    :param backend: a :class:`~django_wireguard.backends.BaseBackend`.
+    :param config: as returned by :func:`parse_config`.
+    :return: number of peer requests sent.
+    """
+    device = backend.get_device(interface_name)
+    attrs = {key: config[key] for key in ('private_key', 'listen_port', 'fwmark')
+             if config.get(key) is not None and config[key] != device.get(key)}
+    if attrs:
+        backend.set_device(interface_name, **attrs)
+
+    added, removed, changed = diff_peers(device['peers'], config['peers'])
+    updates = itertools.chain(({'public_key': public_key, 'remove': True} for public_key in removed),
+                              added,
+                              ({**peer, 'replace_allowed_ips': True} for peer, _ in changed))
+    requests = 0
+    for chunk in chunk_peers(updates, WireGuard.MAX_MESSAGE_SIZE):
+        backend.set_peers(interface_name, chunk)
+        requests += 1
+    return requests
+
+
+def syncconf_interfaces(queryset: Optional[Union[QuerySet, WireguardInterface]] = None,
+                        directory: Optional[str] = None) -> List[str]:
+    """
+    Render each interface to a file and apply it to its device as a whole.
+
+    :param queryset: interfaces to sync, all of them by default.
+    :param directory: where to keep the files, ``WIREGUARD_CONFIG_DIR`` by default.
+    :return: paths of the applied files.
+    """
+    if queryset is None:
+        queryset = WireguardInterface.objects.all()
+    elif isinstance(queryset, WireguardInterface):
+        queryset = [queryset]
+
+    paths = []
+    for interface in queryset:
+        with instrument('syncconf.render', interface=interface.name):
+            path = write_config(interface, directory)
+        wg = interface.wg
+        wg.set_ip_addresses(*interface.get_address_list())
+        wg.sync_config(path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,24 @@
+from typing import Dict, List
+
+from django_wireguard.backends import set_backend
+from django_wireguard.backends.memory import MemoryBackend
+
+
+class MemoryBackendMixin:
+    """Run each test against a fresh in-memory backend, whose devices are checked through ``self.backend``."""
+
+    def setUp(self):
+        super().setUp()
+        self.backend = MemoryBackend()
+        set_backend(self.backend)
+        self.addCleanup(set_backend, None)
+
+    def get_device_peers(self, interface_name: str) -> Dict[str, List[str]]:
+        """Sorted AllowedIPs of each peer of the device, keyed by public key."""
+        return {public_key: sorted(peer['allowed_ips'])
+                for public_key, peer in self.backend.get_device(interface_name)['peers'].items()}
+
+    def set_peer_state(self, interface_name: str, public_key: str, **state):
+        """Overwrite kernel managed attributes of a programmed peer, e.g. its counters or last handshake."""
+        with self.backend.lock:
+            self.backend.devices[interface_name].peers[public_key].update(state)
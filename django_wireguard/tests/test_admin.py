@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestAdmin(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.interface = WireguardInterface.objects.create(name='adminInterface', listen_port=1194,
+                                                           address='10.100.160.1/24')
+        WireguardPeer.objects.bulk_create_peers(self.interface, ({'name': f'peer-{i}'} for i in range(30)))
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def test_search(self):
+        peer = WireguardPeer.objects.get(name='peer-12')
+        peers = WireguardPeer.objects.all()
+        self.assertEqual(list(peers.search(peer.public_key)), [peer])
+        self.assertEqual(list(peers.search(peer.address)), [peer])
+        self.assertEqual(set(peers.search('peer-1').values_list('name', flat=True)),
+                         {'peer-1'} | {f'peer-{i}' for i in range(10, 20)})
+        self.assertEqual(peers.search(' ').count(), 30)
+
+    def test_changelists_queries_dont_grow_with_peers(self):
+        def count_queries(url):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return len(queries)
+
+        for url in ('/admin/django_wireguard/wireguardpeer/', '/wagtail/django_wireguard/wireguardpeer/'):
+            count_queries(url)
+            before = count_queries(url)
+            WireguardPeer.objects.bulk_create_peers(self.interface, ({'name': f'{url}-{i}'} for i in range(10)))
+            self.assertEqual(count_queries(url), before, url)
+
+    def test_interface_page_summarises_peers(self):
+        response = self.client.get(f'/admin/django_wireguard/wireguardinterface/{self.interface.pk}/change/')
+        self.assertContains(response, f'?interface__id__exact={self.interface.pk}">30 peers</a>')
+        self.assertNotContains(response, 'peer-0')
+
+        response = self.client.get('/admin/django_wireguard/wireguardpeer/',
+                                   {'q': 'peer-2', 'interface__id__exact': self.interface.pk})
+        self.assertContains(response, '11 results')
+
+    def test_allowed_ips_report(self):
+        peer = WireguardPeer.objects.create(interface=self.interface, name='site',
+                                            interface_allowed_ips=','.join(f'172.16.{i}.0/24' for i in range(4)))
+
+        response = self.client.get(f'/admin/django_wireguard/wireguardinterface/{self.interface.pk}/change/')
+        self.assertContains(response, '35 AllowedIPs entries listed by the peers, 32 programmed in the kernel once '
+                                      'collapsed, 3 saved.')
+        with self.assertNumQueries(1):
+            self.interface.get_allowed_ips_usage()
+
+        response = self.client.get(f'/admin/django_wireguard/wireguardpeer/{peer.pk}/change/')
+        self.assertContains(response, f'{peer.address}/32, 172.16.0.0/22 (5 entries collapsed to 2)')
@@ -0,0 +1,50 @@
+from asgiref.sync import sync_to_async
+from django.test import TransactionTestCase
+
+from django_wireguard.backends import set_backend
+from django_wireguard.backends.memory import MemoryBackend
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.sync_wg import areconcile_interfaces, async_sync_wireguard_interfaces
+from django_wireguard.tests.base import MemoryBackendMixin
+from django_wireguard.wireguard import AsyncWireGuard
+
+
+class TestAsyncAPI(MemoryBackendMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.interface = WireguardInterface.objects.create(name='asyncInterface', listen_port=1194,
+                                                           address='10.100.130.1/24')
+
+    async def test_asave_and_sync(self):
+        peer = WireguardPeer(interface=self.interface, name='async')
+        await peer.asave_and_sync()
+
+        wg = await AsyncWireGuard.aget_interface('asyncInterface')
+        self.assertEqual(await wg.aget_ip_addresses(), ['10.100.130.1/24'])
+        self.assertEqual((await wg.aget_peers())[peer.public_key]['allowed_ips'], ['10.100.130.2/32'])
+
+        await wg.aremove_peers(peer.public_key)
+        self.assertEqual(await wg.aget_peers(), {})
+
+    async def test_areconcile_interfaces(self):
+        await sync_to_async(WireguardInterface.objects.create)(name='asyncOther', listen_port=1195,
+                                                               address='10.100.131.1/24')
+        await sync_to_async(WireguardPeer.objects.bulk_create_peers)(self.interface,
+                                                                     ({'name': f'peer-{i}'} for i in range(5)))
+        # the device comes back empty, like after a reboot
+        set_backend(MemoryBackend())
+
+        plans = await areconcile_interfaces(WireguardInterface.objects.order_by('name'))
+        self.assertEqual([plan.interface.name for plan in plans], ['asyncInterface', 'asyncOther'])
+        self.assertEqual(len((await (await AsyncWireGuard.aget_interface('asyncInterface')).adump())['peers']), 5)
+
+        plans = await areconcile_interfaces()
+        self.assertFalse(any(plans))
+
+    async def test_async_sync_wireguard_interfaces(self):
+        await sync_to_async(WireguardPeer.objects.create)(interface=self.interface, name='async')
+        set_backend(MemoryBackend())
+
+        await async_sync_wireguard_interfaces(self.interface)
+        wg = await AsyncWireGuard.aget_interface('asyncInterface')
+        self.assertEqual(list((await wg.aget_peers()).values())[0]['allowed_ips'], ['10.100.130.2/32'])
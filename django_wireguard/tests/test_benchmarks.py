@@ -0,0 +1,17 @@
+from django.test import TransactionTestCase
+
+from django_wireguard.benchmarks import BENCHMARKS, compare, run_benchmarks
+
+
+class TestBenchmarks(TransactionTestCase):
+    def test_suite_runs(self):
+        results = run_benchmarks(sizes=[5], repeat=1)
+        self.assertEqual(set(results), set(BENCHMARKS))
+        for name, sizes in results.items():
+            self.assertGreater(sizes['5']['queries'], 0, name)
+        self.assertGreater(results['concurrent_peer_save_x200']['5']['per_second'], 0)
+
+        slower = {name: {'5': {'time': sizes['5']['time'] * 2, 'queries': sizes['5']['queries']}}
+                  for name, sizes in results.items()}
+        self.assertFalse(any(row['regression'] for row in compare(results, results, 0.25)))
+        self.assertTrue(all(row['regression'] for row in compare(slower, results, 0.25)))
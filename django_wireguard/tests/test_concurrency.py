@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections
+from django.test import TransactionTestCase
+
+from django_wireguard.backends import set_backend
+from django_wireguard.backends.memory import MemoryBackend
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.sync_wg import reconcile_interfaces
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestConcurrentProvisioning(MemoryBackendMixin, TransactionTestCase):
+    workers = 8
+    peers_per_worker = 25
+
+    def setUp(self):
+        super().setUp()
+
+        self.interface = WireguardInterface.objects.create(name='stressInterface',
+                                                           listen_port=1194,
+                                                           address='10.200.0.1/16')
+
+    def create_peers(self, worker: int) -> int:
+        try:
+            for i in range(self.peers_per_worker):
+                WireguardPeer.objects.create(interface_id=self.interface.pk, name=f'peer-{worker}-{i}')
+            return self.peers_per_worker
+        finally:
+            connections.close_all()
+
+    def test_concurrent_creators(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("In-memory SQLite cannot be shared between threads.")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            created = sum(executor.map(self.create_peers, range(self.workers)))
+
+        expected = self.workers * self.peers_per_worker
+        addresses = list(WireguardPeer.objects.values_list('address', flat=True))
+        self.assertEqual(created, expected)
+        self.assertEqual(len(addresses), expected)
+        self.assertEqual(len(set(addresses)), expected)
+
+        usage, = self.interface.get_address_pool_usage()
+        # the interface address is allocated too
+        self.assertEqual(usage['allocated'], expected + 1)
+
+
+class TestParallelReconcile(MemoryBackendMixin, TransactionTestCase):
+    def test_parallel_reconcile(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("In-memory SQLite cannot be shared between threads.")
+
+        for i in range(4):
+            interface = WireguardInterface.objects.create(name=f'parallel{i}', listen_port=51820 + i,
+                                                          address=f'10.210.{i}.1/24')
+            WireguardPeer.objects.bulk_create_peers(interface, ({'name': f'peer-{j}'} for j in range(10)))
+
+        # the devices come back empty, like after a reboot
+        backend = MemoryBackend()
+        set_backend(backend)
+        plans = reconcile_interfaces(WireguardInterface.objects.order_by('name'), workers=4)
+
+        self.assertEqual([plan.interface.name for plan in plans], [f'parallel{i}' for i in range(4)])
+        for i in range(4):
+            self.assertEqual(len(backend.get_device(f'parallel{i}')['peers']), 10)
+            self.assertEqual(backend.get_addresses(backend.link_lookup(f'parallel{i}')), [f'10.210.{i}.1/24'])
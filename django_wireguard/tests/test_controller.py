@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+from unittest import mock
+
+from django.conf import settings as django_settings
+from django.test import TestCase
+
+from django_wireguard import settings
+from django_wireguard.agent import Agent
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+@mock.patch.object(settings, 'WIREGUARD_MODE', 'controller')
+class TestControllerMode(MemoryBackendMixin, TestCase):
+    def test_changes_bump_revision(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            interface = WireguardInterface.objects.create(name='ctrlInterface', listen_port=1194,
+                                                          address='10.100.120.1/24')
+        with self.captureOnCommitCallbacks(execute=True):
+            peer = WireguardPeer.objects.create(interface=interface, name='controlled')
+        with self.captureOnCommitCallbacks(execute=True):
+            peer.delete()
+        self.assertFalse(self.backend.devices)
+        interface.refresh_from_db()
+        self.assertEqual(interface.revision, 3)
+
+        # a stale instance doesn't roll the revision back
+        stale = WireguardInterface.objects.get(pk=interface.pk)
+        WireguardInterface.objects.filter(pk=interface.pk).update(revision=10)
+        stale.listen_port = 1195
+        with self.captureOnCommitCallbacks(execute=True):
+            stale.save()
+        interface.refresh_from_db()
+        self.assertEqual(interface.revision, 11)
+
+    def test_agent(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            interface = WireguardInterface.objects.create(name='agentInterface', listen_port=1194,
+                                                          address='10.100.121.1/24')
+            WireguardInterface.objects.create(name='idleInterface', listen_port=1195, address='10.100.122.1/24')
+        agent = Agent(full_sync_interval=3600)
+        self.assertEqual(sorted(agent.poll()), ['agentInterface', 'idleInterface'])
+        self.assertEqual(agent.poll(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            peer = WireguardPeer.objects.create(interface=interface, name='agent')
+        self.assertEqual(agent.poll(), ['agentInterface'])
+        self.assertIn(peer.public_key, self.backend.get_device('agentInterface')['peers'])
+
+
+class TestImports(TestCase):
+    def test_kernel_layer_not_imported(self):
+        code = ("import sys, django; django.setup(); "
+                "import django_wireguard.models, django_wireguard.admin, django_wireguard.sync_queue; "
+                "print(' '.join(name for name in ('pyroute2', 'cryptography') if name in sys.modules))")
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                      django_settings.SETTINGS_MODULE)}
+        output = subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        self.assertEqual(output.strip(), '')
@@ -0,0 +1,73 @@
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from django_wireguard.export import stream_configs, write_configs
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestExport(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.interface = WireguardInterface.objects.create(name='exportInterface', listen_port=1194,
+                                                           address='10.100.140.1/24')
+        self.peers = WireguardPeer.objects.bulk_create_peers(self.interface,
+                                                             ({'name': f'peer {i}'} for i in range(3)))
+
+    def test_stream_configs(self):
+        data = b''.join(stream_configs(self.peers, 'zip'))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.namelist(), ['exportinterface/peer-0.conf', 'exportinterface/peer-1.conf',
+                                                  'exportinterface/peer-2.conf'])
+            self.assertEqual(archive.read('exportinterface/peer-1.conf').decode(), self.peers[1].get_config())
+
+        data = b''.join(stream_configs(self.peers, 'tar.gz'))
+        with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+            self.assertEqual(archive.getnames(), ['exportinterface/peer-0.conf', 'exportinterface/peer-1.conf',
+                                                  'exportinterface/peer-2.conf'])
+            self.assertEqual(archive.getmember('exportinterface/peer-0.conf').mode, 0o600)
+            self.assertEqual(archive.extractfile('exportinterface/peer-2.conf').read().decode(),
+                             self.peers[2].get_config())
+
+    def test_filenames_are_unique(self):
+        other = WireguardInterface.objects.create(name='otherInterface', listen_port=1195, address='10.100.141.1/24')
+        peers = (WireguardPeer.objects.bulk_create_peers(other, [{'name': 'peer 0'}])
+                 + WireguardPeer.objects.bulk_create_peers(self.interface, [{'name': 'peer-0'}, {'name': 'Peer 0'}]))
+        peers = [self.peers[0]] + peers
+        expected = ['exportinterface/peer-0.conf', 'otherinterface/peer-0.conf',
+                    'exportinterface/peer-0-2.conf', 'exportinterface/peer-0-3.conf']
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(stream_configs(peers, 'zip')))) as archive:
+            self.assertEqual(archive.namelist(), expected)
+            self.assertEqual(archive.read('otherinterface/peer-0.conf').decode(), peers[1].get_config())
+
+        with tempfile.TemporaryDirectory() as destination:
+            self.assertEqual(write_configs(peers, destination), 4)
+            for filename, peer in zip(expected, peers):
+                with open(os.path.join(destination, filename)) as config:
+                    self.assertEqual(config.read(), peer.get_config())
+
+    def test_admin_exports(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+        response = self.client.post('/admin/django_wireguard/wireguardpeer/', {
+            'action': 'export_configs_zip',
+            '_selected_action': list(WireguardPeer.objects
+                                     .filter(name__in=['peer 0', 'peer 2'])
+                                     .values_list('pk', flat=True)),
+        })
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['exportinterface/peer-0.conf', 'exportinterface/peer-2.conf'])
+
+        response = self.client.get('/wagtail/django_wireguard/wireguardpeer/', {'export': 'tar.gz', 'q': 'peer'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="wireguard-configs.tar.gz"')
+        with tarfile.open(fileobj=io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(len(archive.getnames()), 3)
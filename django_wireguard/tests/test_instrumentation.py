@@ -0,0 +1,38 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from django_wireguard.instrumentation import Profiler, instrument, operation_finished
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestInstrumentation(MemoryBackendMixin, TestCase):
+    def test_signal(self):
+        receiver = mock.Mock()
+        operation_finished.connect(receiver)
+        self.addCleanup(operation_finished.disconnect, receiver)
+
+        with self.assertRaises(KeyError):
+            with instrument('test.operation', interface='wg0'):
+                raise KeyError
+        receiver.assert_called_once()
+        kwargs = receiver.call_args[1]
+        self.assertEqual(kwargs['operation'], 'test.operation')
+        self.assertEqual(kwargs['attributes'], {'interface': 'wg0'})
+        self.assertIsInstance(kwargs['error'], KeyError)
+        self.assertGreaterEqual(kwargs['duration'], 0)
+
+    def test_profiler(self):
+        interface = WireguardInterface.objects.create(name='profileInterface', listen_port=1194,
+                                                      address='10.100.80.1/24')
+        with Profiler() as profiler:
+            with self.captureOnCommitCallbacks(execute=True):
+                WireguardPeer.objects.create(interface=interface, name='profiled')
+
+        for operation in ('peer.pre_save', 'pool.allocate', 'crypto.generate_key', 'crypto.derive_public_key',
+                          'sync.flush', 'sync.read_peers', 'sync.update_peers'):
+            self.assertEqual(profiler.stats[operation].calls, 1, operation)
+        self.assertGreater(profiler.stats['pool.allocate'].queries, 0)
+        self.assertGreater(profiler.stats['sync.read_peers'].queries, 0)
+        self.assertIn('wall time', profiler.report()[-1])
@@ -0,0 +1,42 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+
+from django_wireguard.metrics import CONTENT_TYPE, clear_cache
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestMetricsView(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(clear_cache)
+        clear_cache()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            interface = WireguardInterface.objects.create(name='metricsInterface', listen_port=1194,
+                                                          address='10.100.70.1/24')
+            self.peer = WireguardPeer.objects.create(interface=interface, name='metrics "peer"')
+        self.set_peer_state('metricsInterface', self.peer.public_key,
+                            last_handshake=int(time.time()) - 30, rx_bytes=1024, tx_bytes=2048)
+
+    def test_metrics(self):
+        response = self.client.get('/wireguard/metrics')
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE)
+        body = response.content.decode()
+        labels = f'{{interface="metricsInterface",public_key="{self.peer.public_key}",name="metrics \\"peer\\""}}'
+        self.assertIn('wireguard_interface_up{interface="metricsInterface"} 1\n', body)
+        self.assertIn('wireguard_interface_configured_peers{interface="metricsInterface"} 1\n', body)
+        self.assertIn('wireguard_interface_kernel_peers{interface="metricsInterface"} 1\n', body)
+        self.assertIn(f'wireguard_peer_receive_bytes_total{labels} 1024\n', body)
+        self.assertIn(f'wireguard_peer_transmit_bytes_total{labels} 2048\n', body)
+        self.assertIn('wireguard_address_pool_allocated{interface="metricsInterface",network="10.100.70.0/24"} 2\n',
+                      body)
+        self.assertTrue(body.endswith('# EOF\n'))
+
+    def test_single_dump_per_ttl(self):
+        with mock.patch.object(self.backend, 'get_device', wraps=self.backend.get_device) as get_device:
+            self.client.get('/wireguard/metrics')
+            self.client.get('/wireguard/metrics')
+        self.assertEqual(get_device.call_count, 1)
@@ -0,0 +1,36 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from django_wireguard.middleware import WireguardPeerMiddleware, peer_cache
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestWireguardPeerMiddleware(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        peer_cache.clear()
+        self.addCleanup(peer_cache.clear)
+
+        self.interface = WireguardInterface.objects.create(name='middlewareInterface', listen_port=1194,
+                                                           address='10.100.50.1/24')
+        self.middleware = WireguardPeerMiddleware(lambda request: HttpResponse())
+
+    def get_peer(self, ip):
+        request = RequestFactory().get('/', REMOTE_ADDR=ip)
+        self.middleware(request)
+        return request.wireguard_peer
+
+    def test_request_peer(self):
+        self.assertIsNone(self.get_peer('10.100.50.2'))
+        self.assertIsNone(self.get_peer('::1'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            peer = WireguardPeer.objects.create(interface=self.interface, name='client', address='10.100.50.2')
+        self.assertEqual(self.get_peer('10.100.50.2'), peer)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_peer('10.100.50.2'), peer)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            peer.delete()
+        self.assertIsNone(self.get_peer('10.100.50.2'))
@@ -1,23 +1,32 @@
+import io
 import ipaddress
 import warnings
 
 from unittest import mock
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from django_wireguard.models import WireguardInterface, WireguardPeer
-from django_wireguard.wireguard import WireGuard, WireGuardException
+from django_wireguard import settings
+from django_wireguard.models import WireguardAddressPool, WireguardInterface, WireguardPeer, WireguardPeerNetwork, \
+    describe_conflicts
+from django_wireguard.tests.base import MemoryBackendMixin
+from django_wireguard.wireguard import WireGuard, WireGuardException, PrivateKey
 
 
-class TestWireguardInterface(TestCase):
+class TestWireguardInterface(MemoryBackendMixin, TestCase):
     interface_name = 'testInterface'
 
     def test_interface_creation(self):
         with self.assertRaises(WireGuardException):
             wg = WireGuard(self.interface_name)
 
-        interface = WireguardInterface.objects.create(name=self.interface_name,
-                                                      listen_port=1194,
-                                                      address='10.100.20.1/24,10.100.30.1')
+        with self.captureOnCommitCallbacks(execute=True):
+            interface = WireguardInterface.objects.create(name=self.interface_name,
+                                                          listen_port=1194,
+                                                          address='10.100.20.1/24,10.100.30.1')
 
         try:
             wg = WireGuard(self.interface_name)
@@ -28,3 +37,277 @@ class TestWireguardInterface(TestCase):
         for address in interface.get_address_list():
             ip = str(ipaddress.IPv4Interface(address))
             self.assertIn(ip, ip_addresses)
+
+
+class TestAddressPool(MemoryBackendMixin, TestCase):
+    databases = {'default', 'other'}
+
+    def setUp(self):
+        super().setUp()
+
+        self.interface = WireguardInterface.objects.create(name='poolInterface',
+                                                           listen_port=1194,
+                                                           address='10.100.20.1/29,10.100.30.1/30')
+
+    def create_peer(self, name, **kwargs):
+        return WireguardPeer.objects.create(interface=self.interface, name=name, **kwargs)
+
+    def test_pools_follow_interface_subnets(self):
+        self.assertEqual(self.interface.get_address_pool_usage(), [
+            {'network': '10.100.20.0/29', 'size': 6, 'allocated': 1, 'free': 5},
+            {'network': '10.100.30.0/30', 'size': 2, 'allocated': 1, 'free': 1},
+        ])
+
+        self.interface.address = '10.100.30.1/30'
+        self.interface.save()
+        self.assertEqual([usage['network'] for usage in self.interface.get_address_pool_usage()],
+                         ['10.100.30.0/30'])
+
+    def test_interface_address_change_in_same_subnet(self):
+        self.interface.address = '10.100.20.6/29,10.100.30.1/30'
+        self.interface.save()
+
+        addresses = [self.create_peer(f'peer{i}').address for i in range(6)]
+        self.assertEqual(addresses, ['10.100.20.1', '10.100.20.2', '10.100.20.3',
+                                     '10.100.20.4', '10.100.20.5', '10.100.30.2'])
+        with self.assertRaises(RuntimeWarning):
+            self.create_peer('exhausted')
+
+    def test_bulk_delete_releases_addresses(self):
+        for i in range(5):
+            self.create_peer(f'peer{i}')
+
+        with CaptureQueriesContext(connection) as one:
+            WireguardPeer.objects.filter(name='peer4').delete()
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as many:
+            WireguardPeer.objects.filter(name__in=['peer0', 'peer2', 'peer3']).delete()
+        # the pool is updated once, whatever the number of peers
+        self.assertEqual(len(many), len(one))
+
+        self.assertEqual(self.interface.get_address_pool_usage()[0]['allocated'], 2)
+        self.assertEqual([self.create_peer(f'new{i}').address for i in range(4)],
+                         ['10.100.20.2', '10.100.20.4', '10.100.20.5', '10.100.20.6'])
+
+    def test_interface_delete_skips_pools(self):
+        self.create_peer('peer')
+        with mock.patch.object(WireguardAddressPool, 'release') as release, \
+                mock.patch.object(WireguardAddressPool, 'release_many') as release_many:
+            self.interface.delete()
+        release.assert_not_called()
+        release_many.assert_not_called()
+        self.assertFalse(WireguardAddressPool.objects.exists())
+
+    def test_other_database(self):
+        with self.captureOnCommitCallbacks(execute=True, using='other'):
+            interface = WireguardInterface.objects.using('other').create(name='otherInterface', listen_port=1195,
+                                                                         address='10.100.21.1/29')
+            peer = WireguardPeer(interface=interface, name='peer')
+            peer.save(using='other')
+            manual = WireguardPeer(interface=interface, name='manual', address='10.100.21.5')
+            manual.save(using='other')
+            manual.delete(using='other')
+
+        self.assertEqual(peer.address, '10.100.21.2')
+        self.assertEqual(interface.get_address_pool_usage(), [
+            {'network': '10.100.21.0/29', 'size': 6, 'allocated': 2, 'free': 4},
+        ])
+        self.assertFalse(WireguardInterface.objects.filter(name='otherInterface').exists())
+        self.assertEqual(self.get_device_peers('otherInterface'), {peer.public_key: ['10.100.21.2/32']})
+
+    def test_setup_interface_updates_address(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('setup_interface', 'poolInterface', '--listen-port', '1195',
+                         '--address', '10.100.20.6/29', '10.100.30.1/30', stderr=io.StringIO())
+
+        self.assertEqual(self.create_peer('peer').address, '10.100.20.1')
+        self.assertEqual(WireGuard.get_interface('poolInterface').get_ip_addresses(),
+                         ['10.100.20.6/29', '10.100.30.1/30'])
+        self.assertEqual(self.backend.get_device('poolInterface')['listen_port'], 1195)
+
+    def test_auto_assign_addresses(self):
+        addresses = [self.create_peer(f'peer{i}').address for i in range(6)]
+        self.assertEqual(addresses, ['10.100.20.2', '10.100.20.3', '10.100.20.4',
+                                     '10.100.20.5', '10.100.20.6', '10.100.30.2'])
+
+        with self.assertRaises(RuntimeWarning):
+            self.create_peer('exhausted')
+
+    def test_reserve_and_release(self):
+        manual = self.create_peer('manual', address='10.100.20.3')
+        self.assertFalse(self.interface.reserve_address('10.100.20.3'))
+        self.assertFalse(self.interface.reserve_address('10.200.0.1'))
+
+        self.assertEqual(self.create_peer('auto1').address, '10.100.20.2')
+        self.assertEqual(self.create_peer('auto2').address, '10.100.20.4')
+
+        manual.delete()
+        self.assertEqual(self.create_peer('auto3').address, '10.100.20.3')
+
+        pool = self.interface.get_address_pool('10.100.20.3')
+        self.assertEqual(list(pool.free_ranges.values_list('first', 'last')),
+                         [(int(ipaddress.IPv4Address('10.100.20.5')), int(ipaddress.IPv4Address('10.100.20.6')))])
+        self.assertTrue(self.interface.release_address('10.100.20.3'))
+        self.assertFalse(self.interface.release_address('10.100.20.3'))
+        self.assertEqual(pool.free_ranges.count(), 2)
+
+
+class TestBulkCreatePeers(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.interface = WireguardInterface.objects.create(name='bulkInterface',
+                                                           listen_port=1194,
+                                                           address='10.100.40.1/24')
+
+    def test_bulk_create_peers(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            peers = WireguardPeer.objects.bulk_create_peers(self.interface, [
+                {'name': 'manual', 'address': '10.100.40.3', 'dns': ['10.100.40.1', '10.100.40.2']},
+                *({'name': f'peer{i}'} for i in range(4)),
+            ])
+
+        self.assertEqual(WireguardPeer.objects.filter(interface=self.interface).count(), 5)
+        self.assertEqual([peer.address for peer in peers],
+                         ['10.100.40.3', '10.100.40.2', '10.100.40.4', '10.100.40.5', '10.100.40.6'])
+        self.assertEqual(peers[0].dns, '10.100.40.1,10.100.40.2')
+        self.assertTrue(all(peer.private_key and peer.public_key for peer in peers))
+        self.assertEqual(self.interface.get_address_pool_usage()[0]['allocated'], 6)
+
+        self.assertEqual(self.get_device_peers('bulkInterface'),
+                         {peer.public_key: [f'{peer.address}/32'] for peer in peers})
+
+    def test_bulk_create_rejects_duplicates(self):
+        WireguardPeer.objects.create(interface=self.interface, name='existing')
+
+        with self.assertRaises(ValidationError):
+            WireguardPeer.objects.bulk_create_peers(self.interface, [{'name': 'new'}, {'name': 'existing'}])
+        with self.assertRaises(ValidationError):
+            WireguardPeer.objects.bulk_create_peers(self.interface, [{'name': 'twice'}, {'name': 'twice'}])
+        self.assertEqual(self.interface.peers.count(), 1)
+
+    def test_bulk_create_rejects_unavailable_addresses(self):
+        WireguardPeer.objects.create(interface=self.interface, name='existing')
+
+        with self.assertRaisesMessage(ValidationError, '10.100.40.2, 10.200.0.5'):
+            WireguardPeer.objects.bulk_create_peers(self.interface, [
+                {'name': 'free', 'address': '10.100.40.9'},
+                {'name': 'taken', 'address': '10.100.40.2'},
+                {'name': 'outside', 'address': '10.200.0.5'},
+            ])
+        self.assertEqual(self.interface.peers.count(), 1)
+        # the reservation of the free address was rolled back
+        self.assertEqual(self.interface.get_address_pool_usage()[0]['allocated'], 2)
+
+
+class TestInterfacePublicKey(MemoryBackendMixin, TestCase):
+    def test_public_key_follows_private_key(self):
+        interface = WireguardInterface.objects.create(name='keyInterface', listen_port=1194)
+        self.assertEqual(interface.public_key, str(PrivateKey(interface.private_key).public_key()))
+
+        private_key = PrivateKey.generate()
+        interface = WireguardInterface.objects.get(public_key=interface.public_key)
+        interface.private_key = str(private_key)
+        interface.save()
+        self.assertEqual(WireguardInterface.objects.get(pk=interface.pk).public_key, str(private_key.public_key()))
+
+
+class TestPeerNetworks(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.interface = WireguardInterface.objects.create(name='ownerInterface',
+                                                           listen_port=1194,
+                                                           address='10.100.40.1/24')
+        self.peer = WireguardPeer.objects.create(interface=self.interface, name='router', address='10.100.40.2',
+                                                 interface_allowed_ips='192.168.0.0/16, 192.168.5.9/24',
+                                                 dns='10.100.40.1')
+
+    def get_networks(self, peer):
+        return set(peer.networks.values_list('field', 'network'))
+
+    def test_networks_follow_peer_fields(self):
+        # the /24 is already routed through the /16
+        self.assertEqual(self.get_networks(self.peer), {('address', '10.100.40.2/32'),
+                                                        ('interface_allowed_ips', '192.168.0.0/16'),
+                                                        ('interface_allowed_ips', '192.168.5.0/24'),
+                                                        ('dns', '10.100.40.1/32'),
+                                                        ('route', '10.100.40.2/32'),
+                                                        ('route', '192.168.0.0/16')})
+
+        WireguardPeer.objects.filter(pk=self.peer.pk).update_and_sync(dns='', allowed_ips='10.0.0.0/8')
+        self.assertEqual(self.get_networks(self.peer), {('address', '10.100.40.2/32'),
+                                                        ('interface_allowed_ips', '192.168.0.0/16'),
+                                                        ('interface_allowed_ips', '192.168.5.0/24'),
+                                                        ('allowed_ips', '10.0.0.0/8'),
+                                                        ('route', '10.100.40.2/32'),
+                                                        ('route', '192.168.0.0/16')})
+
+        peer, = WireguardPeer.objects.bulk_create_peers(self.interface, [{'name': 'bulk'}])
+        self.assertEqual(self.get_networks(peer), {('address', f'{peer.address}/32'),
+                                                   ('route', f'{peer.address}/32')})
+
+    def test_get_owner(self):
+        other = WireguardPeer.objects.create(interface=self.interface, name='other',
+                                             interface_allowed_ips='192.168.5.128/25')
+
+        self.assertEqual(WireguardPeer.objects.get_owner('10.100.40.2'), self.peer)
+        self.assertEqual(WireguardPeer.objects.get_owner(other.address), other)
+        # the most specific network wins
+        self.assertEqual(WireguardPeer.objects.get_owner('192.168.5.200'), other)
+        self.assertEqual(WireguardPeer.objects.get_owner('192.168.5.100'), self.peer)
+        self.assertEqual(WireguardPeer.objects.get_owner('192.168.5.128/26'), other)
+        self.assertEqual(WireguardPeer.objects.get_owner('192.168.5.0/24'), self.peer)
+        self.assertIsNone(WireguardPeer.objects.get_owner('192.0.0.0/8'))
+        # client side fields aren't routed to the peer
+        self.assertIsNone(WireguardPeer.objects.get_owner('10.100.40.1'))
+
+        other.interface_allowed_ips = ''
+        other.save()
+        self.assertEqual(WireguardPeer.objects.get_owner('192.168.5.200'), self.peer)
+
+    def test_routing_conflicts(self):
+        peer = WireguardPeer(interface=self.interface, name='clash', interface_allowed_ips='192.168.0.0/16')
+        with self.assertRaisesMessage(ValidationError, '192.168.0.0/16 of clash and 192.168.0.0/16 of router'):
+            peer.full_clean()
+        with self.assertRaisesMessage(ValidationError, '192.168.0.0/16 of clash and 192.168.0.0/16 of router'):
+            WireguardPeer.objects.bulk_create_peers(self.interface, [{'name': 'clash',
+                                                                      'interface_allowed_ips': '192.168.0.0/16'}])
+        with self.assertRaisesMessage(ValidationError, '172.16.0.0/24 of b and 172.16.0.0/24 of a'):
+            WireguardPeer.objects.bulk_create_peers(self.interface, [
+                {'name': 'a', 'interface_allowed_ips': '172.16.0.0/24'},
+                {'name': 'b', 'interface_allowed_ips': '172.16.0.0/24'},
+            ])
+        self.assertFalse(WireguardPeer.objects.filter(name__in=['a', 'b', 'clash']).exists())
+
+        # the most specific network is routed to its peer
+        peer.interface_allowed_ips = '192.168.5.0/25'
+        peer.full_clean()
+        with mock.patch.object(settings, 'WIREGUARD_ALLOW_NESTED_ALLOWED_IPS', False):
+            with self.assertRaisesMessage(ValidationError, '192.168.5.0/25 of clash and 192.168.0.0/16 of router'):
+                peer.full_clean()
+        # a peer doesn't conflict with itself
+        self.peer.clean()
+
+    def test_conflicts_between_collapsed_networks(self):
+        # the kernel routes 172.16.0.0/24 to the peer
+        halves = WireguardPeer.objects.create(interface=self.interface, name='halves',
+                                              interface_allowed_ips='172.16.0.0/25,172.16.0.128/25')
+        self.assertEqual(WireguardPeer.objects.get_owner('172.16.0.0/24'), halves)
+
+        whole = WireguardPeer(interface=self.interface, name='whole', interface_allowed_ips='172.16.0.0/24')
+        with self.assertRaisesMessage(ValidationError, '172.16.0.0/24 of whole and 172.16.0.0/24 of halves'):
+            whole.full_clean()
+        with self.assertRaisesMessage(ValidationError, '172.16.0.0/24 of whole and 172.16.0.0/24 of halves'):
+            WireguardPeer.objects.bulk_create_peers(self.interface, [{'name': 'whole',
+                                                                      'interface_allowed_ips': '172.16.0.0/24'}])
+
+        # saved without validation, the audit reports it
+        whole.save()
+        conflicts = WireguardPeerNetwork.find_conflicts(self.interface)
+        self.assertEqual(describe_conflicts(conflicts), ['172.16.0.0/24 of whole and 172.16.0.0/24 of halves'])
+
+    def test_invalid_networks_are_field_errors(self):
+        peer = WireguardPeer(interface=self.interface, name='invalid', interface_allowed_ips='192.168.300.0/24')
+        with self.assertRaises(ValidationError) as error:
+            peer.full_clean()
+        self.assertIn('interface_allowed_ips', error.exception.message_dict)
@@ -0,0 +1,36 @@
+import ipaddress
+
+from django.test import SimpleTestCase
+
+from django_wireguard.prefix_trie import Conflict, PrefixTrie
+
+
+def net(value):
+    return ipaddress.IPv4Network(value)
+
+
+class TestPrefixTrie(SimpleTestCase):
+    def test_identical_networks(self):
+        trie = PrefixTrie()
+        self.assertEqual(trie.add(net('10.0.0.0/24'), 'a'), [])
+        self.assertEqual(trie.add(net('10.0.0.0/16'), 'b'), [])
+        self.assertEqual(trie.add(net('10.0.0.0/24'), 'a'), [])
+        self.assertEqual(trie.add(net('10.0.0.0/24'), 'c'),
+                         [Conflict(net('10.0.0.0/24'), 'c', net('10.0.0.0/24'), 'a')])
+        self.assertEqual(trie.get_owners(net('10.0.0.0/24')), ['a', 'c'])
+        self.assertEqual(trie.get_owners(net('10.0.1.0/24')), [])
+
+    def test_nested_networks(self):
+        trie = PrefixTrie(nested=True)
+        trie.add(net('10.0.1.0/24'), 'a')
+        trie.add(net('10.0.2.7/32'), 'b')
+        trie.add(net('10.0.0.0/16'), 'b')
+
+        conflicts = trie.add(net('10.0.0.0/8'), 'c')
+        self.assertEqual(sorted(str(conflict.other_network) for conflict in conflicts),
+                         ['10.0.0.0/16', '10.0.1.0/24', '10.0.2.7/32'])
+        self.assertTrue(all(conflict.nested for conflict in conflicts))
+
+        conflicts = trie.add(net('10.0.1.128/25'), 'a')
+        self.assertEqual({(str(conflict.other_network), conflict.other_owner) for conflict in conflicts},
+                         {('10.0.0.0/8', 'c'), ('10.0.0.0/16', 'b')})
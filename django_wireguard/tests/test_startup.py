@@ -0,0 +1,50 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+
+from django_wireguard import settings, startup
+from django_wireguard.models import WireguardInterface, WireguardPeer
+
+
+@mock.patch.object(startup, 'sync_interfaces')
+class TestStartupSync(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(settings, 'WIREGUARD_STARTUP_SYNC_LOCK', os.path.join(directory.name, 'lock'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_once_per_boot(self, sync_interfaces):
+        with mock.patch.object(startup, 'get_boot_id', return_value='boot-1'):
+            self.assertTrue(startup.sync_once_per_boot())
+            self.assertFalse(startup.sync_once_per_boot())
+            self.assertTrue(startup.sync_once_per_boot(force=True))
+        with mock.patch.object(startup, 'get_boot_id', return_value='boot-2'):
+            self.assertTrue(startup.sync_once_per_boot())
+        self.assertEqual(sync_interfaces.call_count, 3)
+
+    def test_modes(self, sync_interfaces):
+        for mode, calls in (('off', 0), ('lazy', 0), ('always', 1)):
+            with mock.patch.object(settings, 'WIREGUARD_STARTUP_SYNC', mode):
+                startup.startup_sync()
+            self.assertEqual(sync_interfaces.call_count, calls, mode)
+
+        with mock.patch.object(settings, 'WIREGUARD_STARTUP_SYNC', 'sometimes'):
+            with self.assertRaises(ImproperlyConfigured):
+                startup.startup_sync()
+
+    @mock.patch.object(settings, 'WIREGUARD_STARTUP_SYNC', 'lazy')
+    @mock.patch.object(startup, '_synced', set())
+    def test_lazy(self, sync_interfaces):
+        with self.captureOnCommitCallbacks(execute=True):
+            interface = WireguardInterface.objects.create(name='lazyInterface', listen_port=1194,
+                                                          address='10.100.110.1/24')
+        sync_interfaces.assert_called_once_with({'lazyInterface'}, using='default')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            WireguardPeer.objects.create(interface=interface, name='lazy')
+        sync_interfaces.assert_called_once()
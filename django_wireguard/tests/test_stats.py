@@ -0,0 +1,87 @@
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardInterface, WireguardPeer, WireguardPeerTraffic
+from django_wireguard.stats import StatsCollector
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestStatsCollector(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            interface = WireguardInterface.objects.create(name='statsInterface', listen_port=1194,
+                                                          address='10.100.60.1/24')
+            self.active = WireguardPeer.objects.create(interface=interface, name='active')
+            self.idle = WireguardPeer.objects.create(interface=interface, name='idle')
+        self.start = datetime.datetime(2026, 1, 1, 10, 58, tzinfo=datetime.timezone.utc)
+
+    def set_counters(self, active, idle=(0, 0)):
+        for peer, (rx, tx) in ((self.active, active), (self.idle, idle)):
+            self.set_peer_state('statsInterface', peer.public_key, endpoint='192.0.2.1:51820',
+                                last_handshake=1767261000 if rx else 0, rx_bytes=rx, tx_bytes=tx)
+
+    def poll(self, collector, seconds, active):
+        self.set_counters(active)
+        collector.poll(self.start + datetime.timedelta(seconds=seconds))
+
+    def test_minutes_and_hours(self):
+        collector = StatsCollector()
+        self.poll(collector, 0, (100, 10))
+        self.poll(collector, 10, (300, 20))
+        self.poll(collector, 50, (400, 30))
+        self.assertFalse(WireguardPeerTraffic.objects.exists())
+
+        # next minute: the first one is stored
+        self.poll(collector, 60, (1400, 130))
+        minute = WireguardPeerTraffic.objects.get()
+        self.assertEqual((minute.peer, minute.resolution, minute.start, minute.rx_bytes, minute.tx_bytes),
+                         (self.active, WireguardPeerTraffic.MINUTE, self.start, 300, 20))
+        self.assertEqual(self.active.get_status().rx_bytes, 400)
+        self.assertEqual(self.active.get_status().endpoint, '192.0.2.1:51820')
+        self.assertEqual(self.idle.get_status().rx_bytes, 0)
+
+        # next hour: the previous one is rolled up
+        self.poll(collector, 120, (1500, 140))
+        hour = WireguardPeerTraffic.objects.get(resolution=WireguardPeerTraffic.HOUR)
+        self.assertEqual((hour.start, hour.rx_bytes, hour.tx_bytes),
+                         (self.start.replace(minute=0), 1300, 120))
+        self.assertEqual(self.active.get_traffic(self.start), {'rx_bytes': 1300, 'tx_bytes': 120})
+
+    def test_idle_peers_are_not_rewritten(self):
+        collector = StatsCollector()
+        self.poll(collector, 0, (100, 10))
+        self.poll(collector, 60, (100, 10))
+        self.poll(collector, 70, (100, 10))
+        self.assertEqual(collector.statuses, {})
+
+    def test_collectors_resume_from_stored_statuses(self):
+        # like wg_collect_stats --once run by cron, a new collector per poll
+        for seconds, active in ((0, (100, 10)), (30, (300, 20)), (45, (500, 40))):
+            collector = StatsCollector()
+            self.poll(collector, seconds, active)
+            if seconds:
+                self.assertEqual(list(collector.statuses), [self.active.pk])
+            collector.flush(self.start + datetime.timedelta(seconds=seconds))
+
+        minute = WireguardPeerTraffic.objects.get()
+        self.assertEqual((minute.peer, minute.start, minute.rx_bytes, minute.tx_bytes),
+                         (self.active, self.start, 400, 30))
+        self.assertEqual(self.active.get_status().rx_bytes, 500)
+
+    def test_single_runs_roll_up_and_prune(self):
+        # wg_collect_stats --once never sees an hour end, the next run rolls it up
+        for seconds, active in ((0, (100, 10)), (30, (300, 20)), (420, (600, 50))):
+            collector = StatsCollector()
+            self.poll(collector, seconds, active)
+            with mock.patch.object(settings, 'WIREGUARD_STATS_MINUTE_RETENTION', 300):
+                collector.flush(self.start + datetime.timedelta(seconds=seconds + 10))
+
+        hour = WireguardPeerTraffic.objects.get(resolution=WireguardPeerTraffic.HOUR)
+        self.assertEqual((hour.start, hour.rx_bytes, hour.tx_bytes), (self.start.replace(minute=0), 200, 10))
+        # the minute of 10:58 is past its retention, the one of 11:05 is kept
+        minute = WireguardPeerTraffic.objects.get(resolution=WireguardPeerTraffic.MINUTE)
+        self.assertEqual((minute.start, minute.rx_bytes), (self.start + datetime.timedelta(minutes=7), 300))
@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestSyncQueue(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interface = WireguardInterface.objects.create(name='queueInterface',
+                                                               listen_port=1194,
+                                                               address='10.100.50.1/24')
+
+    def spy_set_peers(self):
+        return mock.patch.object(self.backend, 'set_peers', wraps=self.backend.set_peers)
+
+    def test_changes_are_coalesced_on_commit(self):
+        with self.spy_set_peers() as set_peers:
+            with self.captureOnCommitCallbacks(execute=True):
+                peers = [WireguardPeer.objects.create(interface=self.interface, name=f'peer{i}') for i in range(3)]
+                peers[0].interface_allowed_ips = '10.200.0.0/24'
+                peers[0].save()
+                set_peers.assert_not_called()
+
+            set_peers.assert_called_once()
+        self.assertEqual(self.get_device_peers('queueInterface'), {
+            peers[0].public_key: ['10.100.50.2/32', '10.200.0.0/24'],
+            peers[1].public_key: ['10.100.50.3/32'],
+            peers[2].public_key: ['10.100.50.4/32'],
+        })
+
+    def test_rollback_skips_kernel(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                WireguardPeer.objects.create(interface=self.interface, name='rolledBack')
+                raise RuntimeError
+
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            WireguardPeer.objects.create(interface=self.interface, name='committed')
+
+        self.assertEqual(list(self.get_device_peers('queueInterface')),
+                         [WireguardPeer.objects.get(name='committed').public_key])
+
+    def test_key_change_removes_old_key(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            peer = WireguardPeer.objects.create(interface=self.interface, name='peer')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            peer.private_key = ''
+            peer.public_key = ''
+            peer.save()
+
+        self.assertEqual(list(self.get_device_peers('queueInterface')), [peer.public_key])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            peer.delete()
+        self.assertEqual(self.get_device_peers('queueInterface'), {})
+
+    def test_client_side_changes_skip_kernel(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            peer = WireguardPeer.objects.create(interface=self.interface, name='peer')
+        peer = WireguardPeer.objects.get(pk=peer.pk)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            peer.dns = '10.100.50.1'
+            peer.persistent_keepalive = 25
+            peer.save()
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            peer.interface_allowed_ips = '10.200.0.0/24'
+            peer.save()
+        self.assertEqual(self.get_device_peers('queueInterface'),
+                         {peer.public_key: [f'{peer.address}/32', '10.200.0.0/24']})
+
+    def test_update_and_sync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            WireguardPeer.objects.bulk_create_peers(self.interface, [{'name': f'peer{i}'} for i in range(3)])
+        peers = WireguardPeer.objects.filter(interface=self.interface)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(peers.update_and_sync(dns='10.100.50.53'), 3)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(set(peers.values_list('dns', flat=True)), {'10.100.50.53'})
+
+        with self.spy_set_peers() as set_peers, self.captureOnCommitCallbacks(execute=True):
+            peers.update_and_sync(interface_allowed_ips='10.200.0.0/24')
+        set_peers.assert_called_once()
+        self.assertEqual(len(set_peers.call_args[0][1]), 3)
+
+        with self.assertRaises(ValueError):
+            peers.update_and_sync(address='10.100.50.10')
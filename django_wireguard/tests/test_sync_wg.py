@@ -0,0 +1,32 @@
+from django.test import SimpleTestCase
+
+from django_wireguard.sync_wg import diff_peers
+from django_wireguard.wireguard import WireGuard
+
+
+class TestDiffPeers(SimpleTestCase):
+    def kernel_peer(self, public_key, *allowed_ips):
+        return {'public_key': public_key, 'allowed_ips': list(allowed_ips)}
+
+    def test_diff_peers(self):
+        current = {
+            'unchanged': self.kernel_peer('unchanged', '10.0.0.2/32', '10.1.0.0/24'),
+            'changed': self.kernel_peer('changed', '10.0.0.3/32'),
+            'stale': self.kernel_peer('stale', '10.0.0.4/32'),
+        }
+        desired = [
+            # host bits and order must not matter
+            WireGuard.build_peer('unchanged', '10.1.0.5/24', '10.0.0.2'),
+            WireGuard.build_peer('changed', '10.0.0.3', '10.2.0.0/24'),
+            WireGuard.build_peer('new', '10.0.0.5'),
+        ]
+
+        added, removed, changed = diff_peers(current, desired)
+
+        self.assertEqual([peer['public_key'] for peer in added], ['new'])
+        self.assertEqual(removed, ['stale'])
+        self.assertEqual([(peer['public_key'], old) for peer, old in changed], [('changed', ['10.0.0.3/32'])])
+
+    def test_diff_peers_in_sync(self):
+        current = {'peer': self.kernel_peer('peer', '10.0.0.2/32')}
+        self.assertEqual(diff_peers(current, [WireGuard.build_peer('peer', '10.0.0.2')]), ([], [], []))
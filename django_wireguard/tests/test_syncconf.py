@@ -0,0 +1,49 @@
+import io
+import tempfile
+
+from django.test import TestCase
+
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.syncconf import parse_config, render_config, syncconf_interfaces
+from django_wireguard.tests.base import MemoryBackendMixin
+from django_wireguard.wireguard import PrivateKey, WireGuard
+
+
+class TestSyncconf(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.interface = WireguardInterface.objects.create(name='syncconfInterface', listen_port=1194,
+                                                               address='10.100.90.1/24')
+            self.peers = [WireguardPeer.objects.create(interface=self.interface, name=f'peer{i}',
+                                                       interface_allowed_ips='10.200.0.0/24' if i == 0 else '')
+                          for i in range(3)]
+
+    def test_render_and_parse(self):
+        stream = io.StringIO()
+        self.assertEqual(render_config(self.interface, stream), 3)
+        config = parse_config(stream.getvalue().splitlines())
+
+        self.assertEqual(config['private_key'], self.interface.private_key)
+        self.assertEqual(config['listen_port'], 1194)
+        self.assertEqual({peer['public_key']: sorted(peer['allowed_ips']) for peer in config['peers']},
+                         {peer.public_key: sorted(filter(None, [peer.interface_allowed_ips, f'{peer.address}/32']))
+                          for peer in self.peers})
+
+    def test_whole_device_apply(self):
+        wg = WireGuard.get_interface('syncconfInterface')
+        stale = str(PrivateKey.generate().public_key())
+        wg.set_peer(stale, '10.100.90.50')
+        wg.set_peer(self.peers[1].public_key, '10.100.90.60', replace_allowed_ips=True)
+        wg.set_interface(listen_port=1195)
+
+        syncconf_interfaces(self.interface, self.directory.name)
+
+        device = wg.dump()
+        self.assertEqual(device['listen_port'], 1194)
+        self.assertEqual({public_key: sorted(peer['allowed_ips']) for public_key, peer in device['peers'].items()},
+                         {peer.public_key: sorted(filter(None, [peer.interface_allowed_ips, f'{peer.address}/32']))
+                          for peer in self.peers})
@@ -0,0 +1,16 @@
+from django.test import SimpleTestCase
+
+from django_wireguard.utils import collapse_networks, get_peer_allowed_ips
+
+
+class TestAllowedIps(SimpleTestCase):
+    def test_collapse_networks(self):
+        self.assertEqual(collapse_networks(['10.0.1.0/24', '10.0.0.0/24', '10.0.0.7/24', '10.0.1.9', '10.8.0.1/32']),
+                         ['10.0.0.0/23', '10.8.0.1/32'])
+        self.assertEqual(collapse_networks([f'172.16.{i}.0/24' for i in range(256)]), ['172.16.0.0/16'])
+        self.assertEqual(collapse_networks([]), [])
+
+    def test_peer_allowed_ips(self):
+        self.assertEqual(get_peer_allowed_ips('10.0.0.2', '10.0.0.0/25, 10.0.0.128/25,\n192.168.0.0/24'),
+                         ['10.0.0.0/24', '192.168.0.0/24'])
+        self.assertEqual(get_peer_allowed_ips('', ''), [])
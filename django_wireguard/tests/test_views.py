@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from django_wireguard import settings, views
+from django_wireguard.models import WireguardInterface, WireguardPeer
+from django_wireguard.tests.base import MemoryBackendMixin
+
+
+class TestConfigViews(MemoryBackendMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(cache.clear)
+
+        self.interface = WireguardInterface.objects.create(name='viewInterface', listen_port=1194,
+                                                           address='10.100.150.1/24')
+        self.peer = WireguardPeer.objects.create(interface=self.interface, name='view peer')
+        self.url = reverse('django_wireguard:peer-config', args=[self.peer.pk])
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+    def test_config(self):
+        WireguardPeer.objects.filter(pk=self.peer.pk).update(private_key=None)
+        self.peer.refresh_from_db()
+        response = self.client.get(self.url)
+        self.assertEqual(response.content.decode(), self.peer.get_config())
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="view-peer.conf"')
+        etag = response['ETag']
+
+        with mock.patch.object(views, '_render') as render:
+            response = self.client.get(self.url)
+            self.assertEqual(response.content.decode(), self.peer.get_config())
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            render.assert_not_called()
+
+        # saving the interface changes the endpoint of every peer
+        self.interface.listen_port = 1195
+        self.interface.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Endpoint=localhost:1195', response.content.decode())
+
+        # so does a new WIREGUARD_ENDPOINT
+        with mock.patch.object(settings, 'WIREGUARD_ENDPOINT', 'vpn.example.com'):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Endpoint=vpn.example.com:1195', response.content.decode())
+
+    def test_private_keys_are_not_cached(self):
+        with mock.patch.object(views, 'cache') as config_cache:
+            self.assertIn(f'PrivateKey={self.peer.private_key}', self.client.get(self.url).content.decode())
+            config_cache.get.assert_not_called()
+            config_cache.set.assert_not_called()
+
+    def test_permissions(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @unittest.skipIf(views.segno is None, "segno is not installed")
+    def test_qrcode(self):
+        response = self.client.get(reverse('django_wireguard:peer-qrcode-png', args=[self.peer.pk]))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        response = self.client.get(reverse('django_wireguard:peer-qrcode-svg', args=[self.peer.pk]))
+        self.assertIn(b'<svg', response.content)
@@ -0,0 +1,133 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from django_wireguard.backends import set_backend
+from django_wireguard.backends.memory import MemoryBackend
+from django_wireguard.backends.netlink import NetlinkBackend
+from django_wireguard.wireguard import WireGuard, WireGuardException, BackendError, PrivateKey, chunk_peers, \
+    peer_message_size
+
+
+class TestPeerChunking(SimpleTestCase):
+    def make_peers(self, count, *allowed_ips):
+        return [WireGuard.build_peer(PrivateKey.generate().public_key(), *allowed_ips)
+                for _ in range(count)]
+
+    def test_peer_message_size(self):
+        peer = WireGuard.build_peer(PrivateKey.generate().public_key(), '10.0.0.2')
+        removed = {'public_key': peer['public_key'], 'remove': True}
+        # nest header + public key + flags + allowedips nest with one IPv4 entry
+        self.assertEqual(peer_message_size(peer), 4 + 36 + 8 + 4 + 28)
+        self.assertEqual(peer_message_size(removed), 4 + 36 + 8)
+
+    def test_chunks_fit_message_size(self):
+        peers = self.make_peers(1000, '10.0.0.2', '10.1.0.0/24')
+        chunks = list(chunk_peers(peers, 4096))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([peer for chunk in chunks for peer in chunk], peers)
+        for chunk in chunks:
+            self.assertLessEqual(sum(map(peer_message_size, chunk)), 4096)
+
+    def test_oversized_peer_gets_own_chunk(self):
+        big_peer = self.make_peers(1, *(f'10.0.{i}.0/24' for i in range(200)))[0]
+        peers = self.make_peers(2, '10.1.0.2') + [big_peer]
+        chunks = list(chunk_peers(peers, 1024))
+
+        self.assertEqual(chunks, [peers[:2], [big_peer]])
+
+
+class TestHandleRegistry(SimpleTestCase):
+    def setUp(self):
+        self.backend = MemoryBackend()
+        self.backend.link_create('wg0')
+        self.backend.add_address(self.backend.link_lookup('wg0'), '10.0.0.1', 24)
+        set_backend(self.backend)
+        self.addCleanup(set_backend, None)
+
+    def test_handles_are_cached(self):
+        with mock.patch.object(self.backend, 'link_lookup', wraps=self.backend.link_lookup) as link_lookup, \
+                mock.patch.object(self.backend, 'get_addresses', wraps=self.backend.get_addresses) as get_addresses:
+            handle = WireGuard.get_or_create_interface('wg0')
+            self.assertIs(WireGuard.get_or_create_interface('wg0'), handle)
+            self.assertIs(WireGuard.get_interface('wg0'), handle)
+            self.assertEqual(handle.interface_index, 1)
+            link_lookup.assert_called_once_with('wg0')
+
+            self.assertEqual(handle.get_ip_addresses(), ['10.0.0.1/24'])
+            handle.set_ip_addresses('10.0.0.1/24', '10.1.0.1/24')
+            self.assertEqual(handle.get_ip_addresses(), ['10.0.0.1/24', '10.1.0.1/24'])
+            get_addresses.assert_called_once_with(1)
+
+        WireGuard.invalidate('wg0')
+        self.assertIsNot(WireGuard.get_or_create_interface('wg0'), handle)
+
+    def test_missing_device_is_relinked(self):
+        handle = WireGuard.get_or_create_interface('wg0')
+        self.backend.link_delete(handle.interface_index)
+
+        handle.set_interface(listen_port=1194)
+
+        self.assertEqual(handle.interface_index, 2)
+        self.assertEqual(self.backend.get_device('wg0')['listen_port'], 1194)
+
+
+class TestMemoryBackend(SimpleTestCase):
+    def setUp(self):
+        set_backend(MemoryBackend())
+        self.addCleanup(set_backend, None)
+        self.wg = WireGuard.create_interface('wg0')
+        self.keys = [str(PrivateKey.generate().public_key()) for _ in range(2)]
+
+    def allowed_ips(self):
+        return {public_key: peer['allowed_ips'] for public_key, peer in self.wg.get_peers().items()}
+
+    def test_missing_device(self):
+        with self.assertRaises(WireGuardException):
+            WireGuard.get_interface('wg1')
+        with self.assertRaises(BackendError):
+            WireGuard.create_interface('wg0')
+
+    def test_peer_semantics(self):
+        first, second = self.keys
+        self.wg.set_peers(WireGuard.build_peer(first, '10.0.0.2'),
+                          WireGuard.build_peer(second, '10.0.0.3'))
+        self.wg.set_peer(first, '10.0.1.0/24')
+        self.assertEqual(self.allowed_ips(), {first: ['10.0.0.2/32', '10.0.1.0/24'], second: ['10.0.0.3/32']})
+
+        # an allowed ip belongs to a single peer
+        self.wg.set_peer(second, '10.0.1.0/24', replace_allowed_ips=True)
+        self.assertEqual(self.allowed_ips(), {first: ['10.0.0.2/32'], second: ['10.0.1.0/24']})
+
+        self.wg.remove_peers(second)
+        self.wg.set_peer(second, '10.0.0.3', update_only=True)
+        self.assertEqual(self.allowed_ips(), {first: ['10.0.0.2/32']})
+
+
+@mock.patch('django_wireguard.backends.netlink.IPRoute')
+@mock.patch('django_wireguard.backends.netlink.PyRouteWireGuard')
+class TestNetlinkSockets(SimpleTestCase):
+    def test_sockets_per_thread(self, wireguard_socket, iproute_socket):
+        wireguard_socket.side_effect = lambda: mock.Mock()
+        backend = NetlinkBackend()
+        self.assertIs(backend.wg, backend.wg)
+
+        sockets = []
+        thread = threading.Thread(target=lambda: sockets.append(backend.wg))
+        thread.start()
+        thread.join()
+        self.assertIsNot(sockets[0], backend.wg)
+        sockets[0].close.assert_not_called()
+
+        # sockets of finished threads are closed when another thread opens its own
+        thread = threading.Thread(target=lambda: backend.ipr)
+        thread.start()
+        thread.join()
+        sockets[0].close.assert_called_once_with()
+
+        main_socket = backend.wg
+        backend.close()
+        main_socket.close.assert_called_once_with()
+        self.assertIsNot(backend.wg, main_socket)
@@ -0,0 +1,7 @@
+class OtherDatabaseRouter:
+    """Only create the WireGuard tables in the ``other`` database, the other apps live in ``default``."""
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == 'other':
+            return app_label == 'django_wireguard'
+        return None
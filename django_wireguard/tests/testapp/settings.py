@@ -17,9 +17,20 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'TEST': {
+            # file based so concurrency tests can share it between threads
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
+    },
+    # for the tests of writes outside the default database
+    'other': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'other.sqlite3'),
+    },
 }
 
+DATABASE_ROUTERS = ['django_wireguard.tests.testapp.routers.OtherDatabaseRouter']
+
 INSTALLED_APPS = [
     'wagtail.contrib.forms',
     'wagtail.contrib.redirects',
@@ -88,3 +99,7 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 WAGTAIL_SITE_NAME = "django_wireguard_test"
+
+# in-memory devices unless the kernel module is available, see Dockerfile.test
+WIREGUARD_BACKEND = os.environ.get('WIREGUARD_BACKEND', 'django_wireguard.backends.memory.MemoryBackend')
+WIREGUARD_STARTUP_SYNC = 'off'
@@ -20,4 +20,5 @@ from wagtail.admin import urls as wagtailadmin_urls
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('wagtail/', include(wagtailadmin_urls)),
+    path('wireguard/', include('django_wireguard.urls')),
 ]
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from django_wireguard.metrics import metrics_view
+from django_wireguard.views import config_view, qrcode_png_view, qrcode_svg_view
+
+app_name = 'django_wireguard'
+
+urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
+    path('peers/<int:pk>/config', config_view, name='peer-config'),
+    path('peers/<int:pk>/qrcode.png', qrcode_png_view, name='peer-qrcode-png'),
+    path('peers/<int:pk>/qrcode.svg', qrcode_svg_view, name='peer-qrcode-svg'),
+]
@@ -1,4 +1,8 @@
-from typing import List
+import ipaddress
+from itertools import islice
+from typing import List, Iterable, Tuple, Iterator
+
+from django.utils import timezone
 
 
 def purge_private_keys() -> int:
@@ -10,7 +14,7 @@ def purge_private_keys() -> int:
 
     peers = WireguardPeer.objects.filter(private_key__isnull=False)
     if peers.exists():
-        peers.update(private_key=None)
+        peers.update(private_key=None, updated=timezone.now())
 
     return peers.count()
 
@@ -26,3 +30,78 @@ def clean_comma_separated_list(value: str) -> List[str]:
         values.remove('')
 
     return values
+
+
+def parse_networks(value: str) -> List[ipaddress.IPv4Network]:
+    """
+    Networks of a comma separated list of IPs and networks, with the host bits cleared.
+
+    Duplicates and invalid entries are skipped.
+    """
+    networks = []
+    for item in clean_comma_separated_list(value):
+        try:
+            networks.append(ipaddress.IPv4Interface(item).network)
+        except ValueError:
+            continue
+    return list(dict.fromkeys(networks))
+
+
+def collapse_networks(values: Iterable[str]) -> List[str]:
+    """
+    Smallest sorted list of networks covering ``values``.
+
+    Host bits are masked, duplicates dropped and adjacent or contained networks merged,
+    e.g. ``10.0.0.0/25, 10.0.0.128/25, 10.0.0.7`` becomes ``10.0.0.0/24``.
+    """
+    networks = [ipaddress.IPv4Interface(value).network for value in values]
+    return [str(network) for network in ipaddress.collapse_addresses(networks)]
+
+
+def get_peer_allowed_ips(address: str, interface_allowed_ips: str) -> List[str]:
+    """
+    Build the AllowedIPs of a peer on the server side from its stored fields.
+
+    They are collapsed, to keep the kernel routing table and the netlink messages small.
+    """
+    values = clean_comma_separated_list(interface_allowed_ips)
+    if address:
+        values.append(address)
+    return collapse_networks(values)
+
+
+def get_host_range(network: ipaddress.IPv4Network) -> Tuple[int, int]:
+    """First and last assignable host of ``network`` as integers."""
+    first, last = int(network.network_address), int(network.broadcast_address)
+    if network.prefixlen < 31:
+        # skip network and broadcast addresses
+        first, last = first + 1, last - 1
+    return first, last
+
+
+def build_free_ranges(first: int, last: int, used: Iterable[int]) -> List[Tuple[int, int]]:
+    """
+    Compute the free ranges left in ``[first, last]`` once ``used`` addresses are taken.
+
+    :return: sorted list of inclusive ``(first, last)`` tuples.
+    """
+    ranges = []
+    start = first
+    for address in sorted(set(used)):
+        if address < start or address > last:
+            continue
+        if address > start:
+            ranges.append((start, address - 1))
+        start = address + 1
+    if start <= last:
+        ranges.append((start, last))
+    return ranges
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """Split ``iterable`` in lists of at most ``size`` items."""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
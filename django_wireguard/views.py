@@ -0,0 +1,122 @@
+"""
+Peer configuration and QR code endpoints.
+
+Mount them with ``django_wireguard.urls``. Responses are rendered once per content version, which changes
+whenever the peer or its interface is saved, and kept in the default cache for ``WIREGUARD_CONFIG_CACHE_TIMEOUT``
+seconds. Configurations holding a stored private key are rendered on every request instead, so the key never
+lands in a shared cache. Responses carry an ``ETag`` and a ``Last-Modified`` header, so clients polling a configuration get a
+``304 Not Modified`` for the cost of a single query.
+
+QR codes are rendered with `segno <https://pypi.org/project/segno/>`_, ``pip install django-wireguard[qrcode]``.
+"""
+import datetime
+import io
+from typing import Optional, Tuple
+
+from django.contrib.auth.decorators import permission_required
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404, HttpResponse
+from django.utils.text import slugify
+from django.utils.translation import get_language
+from django.views.decorators.http import condition, require_GET
+
+from django_wireguard import settings
+from django_wireguard.models import WireguardPeer
+
+try:
+    import segno
+except ImportError:
+    segno = None
+
+CONTENT_TYPES = {
+    'conf': 'text/plain; charset=utf-8',
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def get_config_version(request, pk: int) -> Optional[Tuple[str, datetime.datetime, str, bool]]:
+    """
+    Content version of the configuration of peer ``pk``, memoized on ``request``.
+
+    :return: version string, last modification time, peer name and whether the private key is stored,
+             None if the peer does not exist.
+    """
+    versions = request.__dict__.setdefault('_wireguard_config_versions', {})
+    if pk not in versions:
+        row = (WireguardPeer.objects
+               .filter(pk=pk)
+               .values_list('updated', 'interface__updated', 'name', 'private_key')
+               .first())
+        if row is not None:
+            updated, interface_updated, name, private_key = row
+            row = (f"{pk}-{updated.timestamp():.6f}-{interface_updated.timestamp():.6f}"
+                   f"-{settings.WIREGUARD_ENDPOINT}",
+                   max(updated, interface_updated),
+                   name,
+                   bool(private_key))
+        versions[pk] = row
+    return versions[pk]
+
+
+def _etag(kind: str):
+    def etag(request, pk: int) -> Optional[str]:
+        version = get_config_version(request, pk)
+        return version and f"{version[0]}-{kind}"
+    return etag
+
+
+def _last_modified(request, pk: int):
+    version = get_config_version(request, pk)
+    return version and version[1]
+
+
+def _render(kind: str, config: str):
+    if kind == 'conf':
+        return config
+    if segno is None:
+        raise ImproperlyConfigured("Install segno to render QR codes: pip install django-wireguard[qrcode].")
+    stream = io.BytesIO()
+    segno.make(config, error='l').save(stream, kind=kind, scale=4)
+    return stream.getvalue()
+
+
+def get_rendered(request, pk: int, kind: str):
+    """
+    Configuration of peer ``pk`` rendered as ``kind``, from the cache if this version was rendered already.
+
+    Configurations holding the private key of the peer are never cached.
+    """
+    version = get_config_version(request, pk)
+    if version is None:
+        raise Http404("No peer found.")
+    # the placeholder of a missing private key is translated
+    key = f"django_wireguard:config:{version[0]}:{get_language()}:{kind}"
+    content = None if version[3] else cache.get(key)
+    if content is None:
+        peer = WireguardPeer.objects.select_related('interface').get(pk=pk)
+        content = _render(kind, peer.get_config())
+        if not peer.private_key:
+            cache.set(key, content, settings.WIREGUARD_CONFIG_CACHE_TIMEOUT)
+    return content
+
+
+def _peer_view(kind: str):
+    @require_GET
+    @permission_required('django_wireguard.view_wireguardpeer', raise_exception=True)
+    @condition(etag_func=_etag(kind), last_modified_func=_last_modified)
+    def view(request, pk: int):
+        response = HttpResponse(get_rendered(request, pk, kind), content_type=CONTENT_TYPES[kind])
+        if kind == 'conf':
+            name = get_config_version(request, pk)[2]
+            response['Content-Disposition'] = f'attachment; filename="{slugify(name)}.conf"'
+        # the configurations hold private keys
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    return view
+
+
+config_view = _peer_view('conf')
+qrcode_png_view = _peer_view('png')
+qrcode_svg_view = _peer_view('svg')
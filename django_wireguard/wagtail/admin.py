@@ -1,28 +1,65 @@
-from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count
+from django.urls import reverse
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
+from django.utils.translation import ugettext_lazy as _
+from wagtail.contrib.modeladmin.helpers import PermissionHelper
 from wagtail.contrib.modeladmin.options import ModelAdmin, modeladmin_register
+from wagtail.contrib.modeladmin.views import IndexView
 
 from django_wireguard import settings
+from django_wireguard.export import ARCHIVE_FORMATS, export_response
 from django_wireguard.models import WireguardPeer, WireguardInterface
 from django_wireguard.forms import WireguardPeerForm
 
 
-class WireguardPeerInlineAdmin(admin.TabularInline):
-    model = WireguardPeer
-    show_change_link = True
-
-
 @modeladmin_register
 class WireguardInterfaceAdmin(ModelAdmin):
     model = WireguardInterface
     menu_label = 'Wireguard Interfaces'
     menu_icon = 'lock'
-    list_display = ('name', 'address', 'listen_port', 'public_key',)
+    list_display = ('name', 'address', 'listen_port', 'public_key', 'peers')
     search_fields = ('name', 'address', 'listen_port')
     add_to_settings_menu = settings.WIREGUARD_WAGTAIL_SHOW_IN_SETTINGS
 
     inspect_view_fields = ('name', 'address')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(peer_count=Count('peers'))
+
+    def peers(self, obj):
+        url = reverse('django_wireguard_wireguardpeer_modeladmin_index')
+        return format_html('<a href="{}?interface__id__exact={}">{}</a>', url, obj.pk, obj.peer_count)
+    peers.short_description = _('Peers')
+    peers.admin_order_field = 'peer_count'
+
+
+class WireguardPeerPermissionHelper(PermissionHelper):
+    """Permission helper listing the model permissions once, instead of once per row of the index."""
+
+    def user_has_any_permissions(self, user):
+        if not hasattr(self, '_codenames'):
+            self._codenames = list(self.get_all_model_permissions().values_list('codename', flat=True))
+        return any(self.user_has_specific_permission(user, codename) for codename in self._codenames)
+
+
+class WireguardPeerIndexView(IndexView):
+    """Index view also downloading the configurations of the listed peers, with ``?export=zip`` or ``tar.gz``."""
+    FORMATS = IndexView.FORMATS + tuple(ARCHIVE_FORMATS)
+
+    def get_search_results(self, request, queryset, search_term):
+        # matched with indexed lookups only
+        return queryset.search(search_term)
+
+    def as_spreadsheet(self, queryset, spreadsheet_format):
+        if spreadsheet_format not in ARCHIVE_FORMATS:
+            return super().as_spreadsheet(queryset, spreadsheet_format)
+        # the configurations hold private keys
+        if not self.permission_helper.user_has_specific_permission(self.request.user, 'change'):
+            raise PermissionDenied
+        return export_response(queryset, spreadsheet_format)
+
 
 @modeladmin_register
 class WireguardPeerAdmin(ModelAdmin):
@@ -30,11 +67,17 @@ class WireguardPeerAdmin(ModelAdmin):
     form = WireguardPeerForm
     menu_label = 'Wireguard Peers'
     menu_icon = 'lock'
-    list_display = ('name', 'address', 'public_key',)
-    list_filter = ()
-    search_fields = ('name', 'address')
+    list_display = ('name', 'interface', 'address', 'public_key',)
+    list_select_related = ('interface',)
+    list_filter = ('interface',)
+    search_fields = ('name', 'address', 'public_key')
+    ordering = ('interface', 'name')
     add_to_settings_menu = settings.WIREGUARD_WAGTAIL_SHOW_IN_SETTINGS
 
+    permission_helper_class = WireguardPeerPermissionHelper
+    index_view_class = WireguardPeerIndexView
+    index_template_name = 'django_wireguard/wireguardpeer_index.html'
+
     inspect_view_enabled = True
     inspect_template_name = 'django_wireguard/wireguardpeer_inspect.html'
     inspect_view_extra_js = ['js/qrcode.min.js', 'js/inject_qrcode.js']
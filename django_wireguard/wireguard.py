@@ -1,11 +1,21 @@
+import asyncio
 import base64
 import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Optional, List, Union
+from functools import partial
+from typing import Optional, List, Union, Iterable, Iterator, Dict, TYPE_CHECKING
 
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
-from pyroute2 import WireGuard as PyRouteWireGuard, IPRoute
+from django_wireguard import settings
+from django_wireguard.backends import BaseBackend, get_backend
+from django_wireguard.instrumentation import instrument
+
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+
+
+# cryptography is imported on first use, as it is slow to load and most processes never handle keys
 
 
 class PublicKey:
@@ -16,7 +26,9 @@ class PublicKey:
     """
     __slots__ = ('__public_key',)
 
-    def __init__(self, public_key: Union[str, X25519PublicKey]):
+    def __init__(self, public_key: Union[str, 'X25519PublicKey']):
+        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PublicKey
+
         if isinstance(public_key, X25519PublicKey):
             self.__public_key = public_key
         elif isinstance(public_key, str):
@@ -25,6 +37,8 @@ class PublicKey:
             raise TypeError("public_key must be a string or X25519PublicKey object")
 
     def __str__(self):
+        from cryptography.hazmat.primitives import serialization
+
         value = base64.b64encode(
             self.__public_key.public_bytes(serialization.Encoding.Raw,
                                            serialization.PublicFormat.Raw))
@@ -40,7 +54,9 @@ class PrivateKey:
     """
     __slots__ = ('__private_key',)
 
-    def __init__(self, private_key: Union[str, X25519PrivateKey]):
+    def __init__(self, private_key: Union[str, 'X25519PrivateKey']):
+        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
         if isinstance(private_key, X25519PrivateKey):
             self.__private_key = private_key
         elif isinstance(private_key, str):
@@ -50,9 +66,14 @@ class PrivateKey:
 
     @classmethod
     def generate(cls):
-        return cls(X25519PrivateKey.generate())
+        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+        with instrument('crypto.generate_key'):
+            return cls(X25519PrivateKey.generate())
 
     def __str__(self):
+        from cryptography.hazmat.primitives import serialization
+
         value = base64.b64encode(
             self.__private_key.private_bytes(serialization.Encoding.Raw,
                                              serialization.PrivateFormat.Raw,
@@ -62,71 +83,197 @@ class PrivateKey:
         return value
 
     def public_key(self) -> PublicKey:
-        return PublicKey(self.__private_key.public_key())
+        with instrument('crypto.derive_public_key'):
+            return PublicKey(self.__private_key.public_key())
 
 
 class WireGuardException(Exception):
     pass
 
 
+class BackendError(WireGuardException):
+    """Failed device operation, ``code`` is the errno reported by the backend."""
+
+    def __init__(self, code: int, message: str = ''):
+        super().__init__(code, message)
+        self.code = code
+
+
+def _nla_size(payload: int) -> int:
+    """Size of a netlink attribute carrying ``payload`` bytes, header and padding included."""
+    return (4 + payload + 3) & ~3
+
+
+def _allowed_ip_size(allowed_ip: str) -> int:
+    address_size = 16 if ':' in allowed_ip else 4
+    return _nla_size(_nla_size(2) + _nla_size(address_size) + _nla_size(1))
+
+
+def peer_message_size(peer: dict) -> int:
+    """
+    Estimate the bytes a peer takes inside a WG_CMD_SET_DEVICE message.
+
+    :param peer: peer dict as accepted by :meth:`WireGuard.set_peers`.
+    :return: encoded size of the peer nested attribute.
+    """
+    size = _nla_size(32) + _nla_size(4)  # public key and flags
+    if not peer.get('remove'):
+        if 'preshared_key' in peer:
+            size += _nla_size(32)
+        if 'persistent_keepalive' in peer:
+            size += _nla_size(2)
+        if 'endpoint_addr' in peer:
+            size += _nla_size(28 if ':' in peer['endpoint_addr'] else 16)
+        allowed_ips = peer.get('allowed_ips') or []
+        size += _nla_size(sum(_allowed_ip_size(ip) for ip in allowed_ips))
+    return _nla_size(size)
+
+
+def chunk_peers(peers: Iterable[dict], max_size: int) -> Iterator[List[dict]]:
+    """
+    Split ``peers`` in lists whose encoded size fits in ``max_size`` bytes.
+
+    Peers are consumed lazily, so at most one chunk is held in memory.
+    A single peer larger than ``max_size`` is yielded on its own.
+    """
+    chunk = []
+    chunk_size = 0
+    for peer in peers:
+        size = peer_message_size(peer)
+        if chunk and chunk_size + size > max_size:
+            yield chunk
+            chunk = []
+            chunk_size = 0
+        chunk.append(peer)
+        chunk_size += size
+    if chunk:
+        yield chunk
+
+
 class WireGuard:
-    __slots__ = ('__ifname', '__ifindex')
-    __wg = None
-    __ipr = None
+    """
+    Handle of a WireGuard device.
+
+    Device operations are delegated to the backend selected by ``WIREGUARD_BACKEND``.
+    Handles returned by :meth:`get_interface` and :meth:`get_or_create_interface` are kept in a
+    process wide registry keyed by interface name, together with the device index and address list,
+    so repeated accesses don't hit the backend. A handle whose device was deleted or renamed behind
+    our back is refreshed the first time an operation fails with ``ENODEV``.
+    """
+    __slots__ = ('__ifname', '__ifindex', '__addresses')
+    __registry: Dict[str, 'WireGuard'] = {}
+    __registry_lock = threading.Lock()
+
+    # Upper bound for the peers payload of a single WG_CMD_SET_DEVICE message,
+    # larger peer sets are split over several messages like `wg setconf` does.
+    MAX_MESSAGE_SIZE = 32768
 
     class ErrorCode(Enum):
         NO_SUCH_DEVICE = 19
 
-    def __init__(self, interface_name):
-        self.__connect_backend()
+    def __init__(self, interface_name, interface_index: Optional[int] = None):
         self.__ifname = interface_name
-        interface = self.__get_interface_index(interface_name)
+        self.__addresses = None
+        interface = interface_index or self.__get_interface_index(interface_name)
         if not interface:
             raise WireGuardException("Interface does not exist.")
         self.__ifindex = interface
 
+    @staticmethod
+    def __backend() -> BaseBackend:
+        return get_backend()
+
     @classmethod
-    def __connect_backend(cls):
-        if cls.__wg is None:
-            cls.__wg = PyRouteWireGuard()
-        if cls.__ipr is None:
-            cls.__ipr = IPRoute()
+    def __register(cls, handle: 'WireGuard') -> 'WireGuard':
+        with cls.__registry_lock:
+            return cls.__registry.setdefault(handle.interface_name, handle)
+
+    @classmethod
+    def invalidate(cls, interface_name: Optional[str] = None):
+        """Drop the cached handle of ``interface_name``, or of every interface if omitted."""
+        with cls.__registry_lock:
+            if interface_name is None:
+                cls.__registry.clear()
+            else:
+                cls.__registry.pop(interface_name, None)
 
     @classmethod
     def create_interface(cls, interface_name: str) -> 'WireGuard':
-        cls.__connect_backend()
-        cls.__ipr.link('add', ifname=interface_name, kind='wireguard')
-        return cls(interface_name)
+        with instrument('netlink.create_interface', interface=interface_name):
+            cls.__backend().link_create(interface_name)
+        cls.invalidate(interface_name)
+        return cls.__register(cls(interface_name))
+
+    @classmethod
+    def get_interface(cls, interface_name: str) -> 'WireGuard':
+        """
+        Get the handle of an existing interface.
+
+        :raises WireGuardException: if the interface does not exist.
+        """
+        handle = cls.__registry.get(interface_name)
+        if handle is None:
+            handle = cls.__register(cls(interface_name))
+        return handle
 
     @classmethod
     def get_or_create_interface(cls, interface_name: str) -> 'WireGuard':
-        cls.__connect_backend()
+        handle = cls.__registry.get(interface_name)
+        if handle is not None:
+            return handle
         interface = cls.__get_interface_index(interface_name)
         if not interface:
             return cls.create_interface(interface_name)
-        return cls(interface_name)
+        return cls.__register(cls(interface_name, interface))
 
     @classmethod
     def __get_interface_index(cls, interface_name: str) -> Optional[int]:
-        cls.__connect_backend()
-        interface: list = cls.__ipr.link_lookup(ifname=interface_name)
+        with instrument('netlink.link_lookup', interface=interface_name):
+            return cls.__backend().link_lookup(interface_name)
+
+    def delete_interface(self):
+        with instrument('netlink.delete_interface', interface=self.__ifname):
+            self.__backend().link_delete(self.__ifindex)
+        self.invalidate(self.__ifname)
+
+    def __relink(self):
+        """Resolve the device again after it was deleted or renamed, creating it if needed."""
+        interface = self.__get_interface_index(self.__ifname)
         if not interface:
-            return None
-        return interface[0]
+            self.__backend().link_create(self.__ifname)
+            interface = self.__get_interface_index(self.__ifname)
+        self.__ifindex = interface
+        self.__addresses = None
+
+    def __call(self, func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except BackendError as e:
+            if e.code != self.ErrorCode.NO_SUCH_DEVICE.value:
+                raise
+        self.__relink()
+        return func(*args, **kwargs)
 
     @property
     def interface_name(self):
         return self.__ifname
 
-    def get_ip_addresses(self) -> List[str]:
-        interface_data = self.__ipr.get_addr(label=self.interface_name)
-        return list(map(
-            lambda i: dict(i['attrs'])['IFA_ADDRESS'] + '/' + str(i['prefixlen']),
-            interface_data
-        ))
+    @property
+    def interface_index(self):
+        return self.__ifindex
+
+    def get_ip_addresses(self, cached: bool = True) -> List[str]:
+        """
+        Addresses of the interface.
+
+        :param cached: return the list cached by a previous call, if any.
+        """
+        if not cached or self.__addresses is None:
+            with instrument('netlink.get_addresses', interface=self.__ifname):
+                self.__addresses = self.__call(lambda: self.__backend().get_addresses(self.__ifindex))
+        return list(self.__addresses)
 
     def set_ip_addresses(self, *ip_addresses):
-        old_ip_addresses = self.get_ip_addresses()
         new_ip_addresses = []
         for address in ip_addresses:
             try:
@@ -136,33 +283,167 @@ class WireGuard:
 
             new_ip_addresses.append(str(address))
 
+        with instrument('netlink.set_addresses', interface=self.__ifname):
+            try:
+                self.__set_ip_addresses(self.get_ip_addresses(), new_ip_addresses)
+            except BackendError:
+                # the cached list was stale, retry with the live one
+                self.__set_ip_addresses(self.get_ip_addresses(cached=False), new_ip_addresses)
+        self.__addresses = new_ip_addresses
+
+    def __set_ip_addresses(self, old_ip_addresses: List[str], new_ip_addresses: List[str]):
+        backend = self.__backend()
         for address in old_ip_addresses:
             ip, mask = address.split('/')
             if address not in new_ip_addresses:
-                self.__ipr.addr('del', self.__ifindex,
-                                address=ip, mask=int(mask))
+                backend.delete_address(self.__ifindex, ip, int(mask))
 
         for address in new_ip_addresses:
             ip, mask = address.split('/')
             if address not in old_ip_addresses:
-                self.__ipr.addr('add', self.__ifindex,
-                                address=ip, mask=int(mask))
+                backend.add_address(self.__ifindex, ip, int(mask))
 
-    def set_interface(self, **kwargs):
-        self.__wg.set(self.__ifname, **kwargs)
+    def dump(self) -> dict:
+        """
+        Read the live device state with a single dump.
 
-    def set_peer(self, public_key, *allowed_ips, **kwargs):
-        self.set_interface(peer={
+        :return: dict with ``private_key``, ``listen_port`` and ``peers``,
+                 the latter mapping each public key to its kernel state.
+        """
+        with instrument('netlink.dump', interface=self.__ifname):
+            return self.__call(lambda: self.__backend().get_device(self.__ifname))
+
+    def get_peers(self) -> Dict[str, dict]:
+        return self.dump()['peers']
+
+    def set_interface(self, peer: Optional[dict] = None, **kwargs):
+        """
+        Update the device attributes.
+
+        :param peer: peer dict to configure as well, see :meth:`update_peers`.
+        :param kwargs: ``private_key``, ``listen_port`` or ``fwmark``.
+        """
+        if kwargs:
+            with instrument('netlink.set_interface', interface=self.__ifname):
+                self.__call(self.__backend().set_device, self.__ifname, **kwargs)
+        if peer is not None:
+            self.update_peers([peer])
+
+    @staticmethod
+    def build_peer(public_key, *allowed_ips, **kwargs) -> dict:
+        return {
             'public_key': str(public_key),
             'allowed_ips': [str(ipaddress.IPv4Interface(ip)) for ip in allowed_ips],
             **kwargs
-        })
+        }
+
+    def set_peer(self, public_key, *allowed_ips, **kwargs):
+        self.update_peers([self.build_peer(public_key, *allowed_ips, **kwargs)])
 
     def set_peers(self, *peers):
-        for peer in peers:
-            self.set_interface(peer=peer)
+        self.update_peers(peers)
+
+    def update_peers(self, peers: Iterable[dict]) -> int:
+        """
+        Configure many peers, packing them in as few backend requests as possible.
+
+        :param peers: iterable of peer dicts, consumed lazily.
+        :return: number of requests sent.
+        """
+        messages = 0
+        for chunk in chunk_peers(peers, self.MAX_MESSAGE_SIZE):
+            with instrument('netlink.set_peers', interface=self.__ifname, peers=len(chunk)):
+                self.__call(self.__backend().set_peers, self.__ifname, chunk)
+            messages += 1
+        return messages
+
+    def sync_config(self, path: str):
+        """
+        Replace the device configuration and the whole peer set with the ``wg(8)`` file at ``path``.
+
+        See :mod:`django_wireguard.syncconf`.
+        """
+        with instrument('netlink.syncconf', interface=self.__ifname):
+            self.__call(self.__backend().sync_config, self.__ifname, path)
 
     def remove_peers(self, *public_keys):
-        for pubkey in public_keys:
-            peer = {'public_key': str(pubkey), 'remove': True}
-            self.set_interface(peer=peer)
+        self.update_peers({'public_key': str(pubkey), 'remove': True} for pubkey in public_keys)
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def run_in_executor(func, *args, **kwargs) -> 'asyncio.Future':
+    """
+    Run the blocking ``func`` on the WireGuard thread pool, sized by ``WIREGUARD_ASYNC_WORKERS``.
+
+    Backend requests run there rather than in Django's sync thread, so they neither block the event loop
+    nor hold up ORM calls. Each pool thread has its own netlink sockets.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.WIREGUARD_ASYNC_WORKERS,
+                                               thread_name_prefix='wireguard-async')
+    return asyncio.get_running_loop().run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+class AsyncWireGuard:
+    """
+    Async counterpart of :class:`WireGuard`, running the backend requests with :func:`run_in_executor`.
+
+    Handles share the registry of :class:`WireGuard`, so the cached device index and addresses are
+    shared with sync code.
+    """
+    __slots__ = ('__wg',)
+
+    def __init__(self, wg: WireGuard):
+        self.__wg = wg
+
+    @classmethod
+    async def aget_interface(cls, interface_name: str) -> 'AsyncWireGuard':
+        """
+        :raises WireGuardException: if the interface does not exist.
+        """
+        return cls(await run_in_executor(WireGuard.get_interface, interface_name))
+
+    @classmethod
+    async def aget_or_create_interface(cls, interface_name: str) -> 'AsyncWireGuard':
+        return cls(await run_in_executor(WireGuard.get_or_create_interface, interface_name))
+
+    @property
+    def wg(self) -> WireGuard:
+        return self.__wg
+
+    @property
+    def interface_name(self):
+        return self.__wg.interface_name
+
+    async def adelete_interface(self):
+        await run_in_executor(self.__wg.delete_interface)
+
+    async def aget_ip_addresses(self, cached: bool = True) -> List[str]:
+        return await run_in_executor(self.__wg.get_ip_addresses, cached)
+
+    async def aset_ip_addresses(self, *ip_addresses):
+        await run_in_executor(self.__wg.set_ip_addresses, *ip_addresses)
+
+    async def adump(self) -> dict:
+        return await run_in_executor(self.__wg.dump)
+
+    async def aget_peers(self) -> Dict[str, dict]:
+        return (await self.adump())['peers']
+
+    async def aset_interface(self, peer: Optional[dict] = None, **kwargs):
+        await run_in_executor(self.__wg.set_interface, peer, **kwargs)
+
+    async def aset_peer(self, public_key, *allowed_ips, **kwargs):
+        await run_in_executor(self.__wg.set_peer, public_key, *allowed_ips, **kwargs)
+
+    async def aupdate_peers(self, peers: Iterable[dict]) -> int:
+        return await run_in_executor(self.__wg.update_peers, peers)
+
+    async def aremove_peers(self, *public_keys):
+        await run_in_executor(self.__wg.remove_peers, *public_keys)